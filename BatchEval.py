@@ -0,0 +1,141 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Batch static evaluation for ChessBoard, using NumPy.
+#
+# Positions are packed into an n x 64 int8 matrix of piece codes, and
+# scoring them is a gather from the piece square tables of Search plus
+# a sum per row. The middlegame scores match Search.evaluate; with
+# tapering they are blended with endgame tables by the material left.
+#
+# Usage:
+#   scores = evaluateBatch([board, "4k3/8/8/8/8/8/8/3QK3 w - - 0 1"])
+#####################################################################
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ChessBoard import ChessBoard, parseFEN
+from Search import PIECE_SQUARES, VALUES
+
+# Piece codes of the packed matrix, negative for black
+PIECE_CODES = {'.': 0, 'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+               'p': -1, 'n': -2, 'b': -3, 'r': -4, 'q': -5, 'k': -6}
+
+# Game phase: 24 with all minor and major pieces on the board, 0 with none of them
+PHASE_WEIGHTS = {'N': 1, 'B': 1, 'R': 2, 'Q': 4}
+MAX_PHASE = 24
+
+# Endgame bonuses from white's side, a8 first: pawns count more as they advance
+# and the king belongs in the centre
+_PAWN_END_SQUARES = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0)
+_KING_END_SQUARES = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+
+def _need_numpy():
+    if numpy is None:
+        raise ImportError("BatchEval needs numpy")
+
+
+def _tables():
+    # the middlegame and endgame tables as 13 x 64 arrays, row code + 6
+    middle = numpy.zeros((13, 64), numpy.int32)
+    end = numpy.zeros((13, 64), numpy.int32)
+    ends = {'p': _PAWN_END_SQUARES, 'k': _KING_END_SQUARES}
+    for p, code in PIECE_CODES.items():
+        if p == '.':
+            continue
+        middle[code + 6] = PIECE_SQUARES[p]
+        bonus = ends.get(p.lower())
+        if bonus is None:
+            # the other pieces keep their middlegame tables
+            end[code + 6] = PIECE_SQUARES[p]
+        elif p.isupper():
+            end[code + 6] = [VALUES[p.lower()] + bonus[sq] for sq in range(64)]
+        else:
+            end[code + 6] = [-VALUES[p] - bonus[(7 - (sq >> 3)) * 8 + (sq & 7)] for sq in range(64)]
+    phase = numpy.zeros(13, numpy.int32)
+    for p, weight in PHASE_WEIGHTS.items():
+        phase[PIECE_CODES[p] + 6] = weight
+        phase[PIECE_CODES[p.lower()] + 6] = weight
+    return middle, end, phase
+
+
+if numpy is not None:
+    MIDDLEGAME_TABLE, ENDGAME_TABLE, PHASE_TABLE = _tables()
+    # piece letter (as a byte) to piece code
+    _LETTER_CODES = numpy.zeros(256, numpy.int8)
+    for _p, _code in PIECE_CODES.items():
+        _LETTER_CODES[ord(_p)] = _code
+
+
+def packPositions(positions):
+    """
+    Returns (pieces, turns) for a sequence of ChessBoard instances and FEN strings: an
+    n x 64 int8 matrix of PIECE_CODES with a8 first, and an int8 array with 0 where white
+    is to move and 1 where black is.
+    """
+    _need_numpy()
+    squares = []
+    turns = []
+    for position in positions:
+        if isinstance(position, ChessBoard):
+            squares.append(position.getBoardView().toString())
+            turns.append(position.getTurn())
+        else:
+            # checked as setFEN checks it, so a bad FEN raises the same ValueError
+            board, turn = parseFEN(position)[:2]
+            squares.append("".join(board))
+            turns.append(turn)
+    letters = numpy.frombuffer("".join(squares), numpy.uint8).reshape(len(turns), 64)
+    return _LETTER_CODES[letters], numpy.array(turns, numpy.int8)
+
+
+def evaluatePacked(pieces, turns=None, tapered=True):
+    """
+    Returns the scores of a matrix of packPositions as an int32 array, in centipawns from
+    white's side, or from the side to move if turns is given. Without tapering the scores
+    are the middlegame ones of Search.evaluate, with it they slide towards the endgame
+    tables as pieces come off, by the phase in PHASE_WEIGHTS.
+    """
+    _need_numpy()
+    rows = pieces.astype(numpy.intp) + 6
+    middle = MIDDLEGAME_TABLE.take(rows * 64 + numpy.arange(64)).sum(axis=1)
+    if tapered:
+        end = ENDGAME_TABLE.take(rows * 64 + numpy.arange(64)).sum(axis=1)
+        phase = numpy.minimum(PHASE_TABLE.take(rows).sum(axis=1), MAX_PHASE)
+        scores = (middle * phase + end * (MAX_PHASE - phase)) // MAX_PHASE
+    else:
+        scores = middle
+    if turns is not None:
+        scores = numpy.where(turns == 1, -scores, scores)
+    return scores.astype(numpy.int32)
+
+
+def evaluateBatch(positions, tapered=True, relative=False):
+    """
+    Packs a sequence of ChessBoard instances and FEN strings and returns their scores as
+    evaluatePacked does, from the side to move if relative is True.
+    """
+    pieces, turns = packPositions(positions)
+    if not relative:
+        turns = None
+    return evaluatePacked(pieces, turns, tapered)
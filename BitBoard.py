@@ -0,0 +1,284 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Bitboard position core for ChessBoard.
+#
+# Squares are numbered 0-63 as y * 8 + x, so square 0 is a8 and square
+# 63 is h1. This is the same (x, y) layout ChessBoard uses for _board,
+# where y = 0 is the eighth rank.
+#####################################################################
+
+import random
+
+WHITE = 0
+BLACK = 1
+
+# Piece letters in bitboard index order, white first.
+PIECES = "PNBRQKpnbrqk"
+PIECE_INDEX = dict((p, i) for i, p in enumerate(PIECES))
+
+# Direction vectors, in the order ChessBoard has always traced them.
+DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+QUEEN_DIRECTIONS = (0, 1, 2, 3, 4, 5, 6, 7)
+
+KNIGHT_OFFSETS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, 2), (-2, 1), (-1, -2), (-2, -1)]
+
+# Square number -> (x, y) and square number -> single bit mask.
+COORDS = [(sq & 7, sq >> 3) for sq in range(64)]
+BITS = [1 << sq for sq in range(64)]
+FULL = (1 << 64) - 1
+
+# Chebyshev distance between two squares.
+DISTANCE = [[max(abs((a & 7) - (b & 7)), abs((a >> 3) - (b >> 3))) for b in range(64)] for a in range(64)]
+
+
+def _on_board(x, y):
+    return 0 <= x <= 7 and 0 <= y <= 7
+
+
+def _leaper_targets(offsets):
+    # ordered (bit, (x, y)) pairs reachable with a single step per square
+    table = []
+    for x, y in COORDS:
+        targets = []
+        for dx, dy in offsets:
+            if _on_board(x + dx, y + dy):
+                targets.append((BITS[(y + dy) * 8 + x + dx], (x + dx, y + dy)))
+        table.append(targets)
+    return table
+
+
+def _mask(targets):
+    m = 0
+    for b, c in targets:
+        m |= b
+    return m
+
+
+def _rays(dx, dy):
+    # ordered (x, y) lists and masks for one direction from every square
+    targets = []
+    masks = []
+    for x, y in COORDS:
+        ray = []
+        m = 0
+        tx, ty = x + dx, y + dy
+        while _on_board(tx, ty):
+            ray.append((tx, ty))
+            m |= BITS[ty * 8 + tx]
+            tx += dx
+            ty += dy
+        targets.append(ray)
+        masks.append(m)
+    return targets, masks
+
+
+KNIGHT_TARGETS = _leaper_targets(KNIGHT_OFFSETS)
+KNIGHT_ATTACKS = [_mask(t) for t in KNIGHT_TARGETS]
+KING_TARGETS = _leaper_targets(DIRECTIONS)
+KING_ATTACKS = [_mask(t) for t in KING_TARGETS]
+
+# Squares attacked by a pawn of each color. White pawns move towards y = 0.
+PAWN_ATTACKS = [[_mask(t) for t in _leaper_targets([(1, -1), (-1, -1)])],
+                [_mask(t) for t in _leaper_targets([(1, 1), (-1, 1)])]]
+
+RAY_TARGETS = []
+RAYS = []
+for _dx, _dy in DIRECTIONS:
+    _t, _m = _rays(_dx, _dy)
+    RAY_TARGETS.append(_t)
+    RAYS.append(_m)
+
+# True if square numbers grow along the direction, so the nearest blocker is
+# the lowest set bit of the ray rather than the highest.
+POSITIVE = [dy > 0 or (dy == 0 and dx > 0) for dx, dy in DIRECTIONS]
+
+# Squares strictly between two squares on a common line, 0 otherwise.
+BETWEEN = [[0] * 64 for sq in range(64)]
+for _d in range(8):
+    for _sq in range(64):
+        for _tx, _ty in RAY_TARGETS[_d][_sq]:
+            _t = _ty * 8 + _tx
+            BETWEEN[_sq][_t] = RAYS[_d][_sq] & ~RAYS[_d][_t] & ~BITS[_t]
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb):
+    return bb.bit_length() - 1
+
+
+def iterBits(bb):
+    """
+    Yields the square numbers of all set bits, lowest first.
+    """
+    while bb:
+        b = bb & -bb
+        bb ^= b
+        yield b.bit_length() - 1
+
+
+def firstBlocker(d, sq, occ):
+    """
+    Returns the nearest occupied square from sq in direction d, or -1.
+    """
+    blockers = RAYS[d][sq] & occ
+    if not blockers:
+        return -1
+    if POSITIVE[d]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def rayAttacks(d, sq, occ):
+    ray = RAYS[d][sq]
+    blockers = ray & occ
+    if not blockers:
+        return ray
+    if POSITIVE[d]:
+        return ray ^ RAYS[d][(blockers & -blockers).bit_length() - 1]
+    return ray ^ RAYS[d][blockers.bit_length() - 1]
+
+
+def rookAttacks(sq, occ):
+    return rayAttacks(0, sq, occ) | rayAttacks(1, sq, occ) | rayAttacks(2, sq, occ) | rayAttacks(3, sq, occ)
+
+
+def bishopAttacks(sq, occ):
+    return rayAttacks(4, sq, occ) | rayAttacks(5, sq, occ) | rayAttacks(6, sq, occ) | rayAttacks(7, sq, occ)
+
+
+def queenAttacks(sq, occ):
+    return rookAttacks(sq, occ) | bishopAttacks(sq, occ)
+
+
+# 16 bit move codes: from square | to square << 6 | flag << 12. The flag is the
+# special move type of ChessMove (0-5), or PROMOTION_FLAG plus the index of the
+# promotion piece in PROMOTION_PIECES.
+PROMOTION_FLAG = 8
+PROMOTION_PIECES = "QRNB"
+
+
+def encodeMove(fsq, tsq, flag=0):
+    return fsq | tsq << 6 | flag << 12
+
+
+def decodeMove(code):
+    """
+    Returns (from square, to square, flag) of a move code.
+    """
+    return (code & 63, (code >> 6) & 63, code >> 12)
+
+
+# Zobrist hashing keys. The generator is seeded with a constant so that
+# position keys are the same in every process and can be stored on disk.
+_zobrist = random.Random(2005)
+ZOBRIST_PIECES = [[_zobrist.getrandbits(64) for sq in range(64)] for p in PIECES]
+ZOBRIST_CASTLING = [_zobrist.getrandbits(64) for i in range(4)]  # K, Q, k, q
+ZOBRIST_EP = [_zobrist.getrandbits(64) for x in range(8)]
+ZOBRIST_TURN = _zobrist.getrandbits(64)
+del _zobrist
+
+
+class BitBoard:
+    """
+    Piece placement as one 64 bit integer per piece type and color, plus
+    occupancy masks per color and for the whole board.
+    """
+
+    def __init__(self, board=None):
+        self.pieces = [0] * 12
+        self.colors = [0, 0]
+        self.occupied = 0
+        if board is not None:
+            self.setBoard(board)
+
+    def setBoard(self, board):
+        """
+        Loads the placement from an 8x8 list of piece letters ('.' for empty).
+        """
+        pieces = [0] * 12
+        sq = 0
+        for row in board:
+            for p in row:
+                if p != '.':
+                    pieces[PIECE_INDEX[p]] |= BITS[sq]
+                sq += 1
+        self.pieces = pieces
+        self.colors = [pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5],
+                       pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]]
+        self.occupied = self.colors[WHITE] | self.colors[BLACK]
+
+    def getBoard(self):
+        """
+        Returns the placement as an 8x8 list of piece letters.
+        """
+        board = [['.'] * 8 for y in range(8)]
+        for i, p in enumerate(PIECES):
+            for sq in iterBits(self.pieces[i]):
+                board[sq >> 3][sq & 7] = p
+        return board
+
+    def putPiece(self, sq, p):
+        b = BITS[sq]
+        i = PIECE_INDEX[p]
+        self.pieces[i] |= b
+        self.colors[i >= 6] |= b
+        self.occupied |= b
+
+    def removePiece(self, sq, p):
+        b = BITS[sq]
+        i = PIECE_INDEX[p]
+        self.pieces[i] &= ~b
+        self.colors[i >= 6] &= ~b
+        self.occupied &= ~b
+
+    def movePiece(self, fsq, tsq, p):
+        b = BITS[fsq] | BITS[tsq]
+        i = PIECE_INDEX[p]
+        self.pieces[i] ^= b
+        self.colors[i >= 6] ^= b
+        self.occupied ^= b
+
+    def pieceBits(self, p):
+        return self.pieces[PIECE_INDEX[p]]
+
+    def pieceKey(self):
+        """
+        Returns the Zobrist key of the piece placement alone.
+        """
+        key = 0
+        for i in range(12):
+            table = ZOBRIST_PIECES[i]
+            for sq in iterBits(self.pieces[i]):
+                key ^= table[sq]
+        return key
+
+    def attackersTo(self, sq, color, occ=None):
+        """
+        Returns the squares of all pieces of the given color that attack sq.
+        occ replaces the occupancy mask when looking through sliding pieces.
+        """
+        if occ is None:
+            occ = self.occupied
+        p = self.pieces
+        o = 6 * color
+        attackers = (PAWN_ATTACKS[1 - color][sq] & p[o]) | (KNIGHT_ATTACKS[sq] & p[o + 1]) | \
+                    (KING_ATTACKS[sq] & p[o + 5])
+        rq = p[o + 3] | p[o + 4]
+        if rq:
+            attackers |= rookAttacks(sq, occ) & rq
+        bq = p[o + 2] | p[o + 4]
+        if bq:
+            attackers |= bishopAttacks(sq, occ) & bq
+        return attackers
+
+    def kingSquare(self, color):
+        """
+        Returns the square number of the king of the given color, or -1.
+        """
+        return lsb(self.pieces[5 + 6 * color])
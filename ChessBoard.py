@@ -6,9 +6,21 @@
 # Have fun!
 #####################################################################
 
-from copy import deepcopy
+from array import array
 from pprint import pprint
 
+from BitBoard import BitBoard, BISHOP_DIRECTIONS, BITS, COORDS, DISTANCE, KING_TARGETS, KNIGHT_TARGETS, \
+    BETWEEN, FULL, POSITIVE, QUEEN_DIRECTIONS, RAY_TARGETS, RAYS, ROOK_DIRECTIONS, ZOBRIST_CASTLING, ZOBRIST_EP, ZOBRIST_PIECES, \
+    ZOBRIST_TURN, PIECE_INDEX, PROMOTION_FLAG, PROMOTION_PIECES, KNIGHT_ATTACKS, bishopAttacks, decodeMove, \
+    encodeMove, firstBlocker, iterBits, lsb, queenAttacks, rookAttacks
+from GameHistory import GameHistory, KEYFRAME_INTERVAL, SAN_FILE, SAN_RANK, packMove, unpackMove, wordHints
+
+
+# text move tables
+FILE_INDEX = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
+RANK_INDEX = {"8": 0, "7": 1, "6": 2, "5": 3, "4": 4, "3": 5, "2": 6, "1": 7}
+SQUARE_NAMES = ["abcdefgh"[sq & 7] + "87654321"[sq >> 3] for sq in range(64)]
+
 
 class MoveType:
     def __init__(self, move_int):
@@ -47,7 +59,7 @@ class QueenCastleMove(MoveType):
         self.moveString = "0-0-0"
 
 
-class ChessMove:
+class ChessMove(object):
     EP_CAPTURE_MOVE = 2
     EP_MOVE = 1
     KING_CASTLE_MOVE = 4
@@ -55,6 +67,8 @@ class ChessMove:
     PROMOTION_MOVE = 3
     QUEEN_CASTLE_MOVE = 5
 
+    __slots__ = ('piece', 'from_pos', 'to_pos', 'take', 'promotion', 'check', 'special_move_type')
+
     def __init__(self):
         # Piece,  "K" "Q" "R" "N" "B" "P"
         self.piece = None
@@ -69,7 +83,187 @@ class ChessMove:
         # check "+" "#"
         self.check = None
         # Special move type
-        self.special_move_type = NormalMove().moveInt
+        self.special_move_type = ChessMove.NORMAL_MOVE
+
+    @classmethod
+    def fromCode(cls, code, color=0):
+        """
+        Returns a move with from_pos, to_pos, special_move_type and promotion set from a
+        16 bit move code. color is the color of the player making it, which decides the
+        case of the promotion letter.
+        """
+        fsq, tsq, flag = decodeMove(code)
+        move = cls()
+        move.from_pos = COORDS[fsq]
+        move.to_pos = COORDS[tsq]
+        if flag >= PROMOTION_FLAG:
+            move.special_move_type = ChessMove.PROMOTION_MOVE
+            move.promotion = PROMOTION_PIECES[flag - PROMOTION_FLAG]
+            if color:
+                move.promotion = move.promotion.lower()
+        else:
+            move.special_move_type = flag
+        return move
+
+    def getCode(self):
+        """
+        Returns the 16 bit code of the move, see BitBoard.encodeMove.
+        """
+        return moveCode(self.from_pos, self.to_pos, self.special_move_type, self.promotion)
+
+
+def moveCode(fromPos, toPos, special=0, promotion=None):
+    """
+    Returns the 16 bit code for a move between two (x, y) locations.
+    """
+    if promotion:
+        special = PROMOTION_FLAG + PROMOTION_PIECES.index(promotion.upper())
+    return encodeMove(fromPos[1] * 8 + fromPos[0], toPos[1] * 8 + toPos[0], special)
+
+
+def parseFEN(fen):
+    """
+    Checks a Forsyth-Edwards Notation string and returns (squares, turn, castling, ep, fifty),
+    where squares is a list of the 64 piece letters from a8 to h1, castling holds the four
+    flags in KQkq order and ep is the (x, y) location of the en passant target square or None.
+    The halfmove and fullmove counts may be left out. Raises ValueError if the FEN is invalid.
+    """
+    fparts = fen.split()
+    if not 4 <= len(fparts) <= 6:
+        raise ValueError("FEN must have 4 to 6 fields: %r" % fen)
+
+    rows = fparts[0].split("/")
+    if len(rows) != 8:
+        raise ValueError("FEN board must have 8 ranks: %r" % fparts[0])
+    squares = []
+    for row in rows:
+        n = len(squares)
+        for c in row:
+            if c in "kqrnbpKQRNBP":
+                squares.append(c)
+            elif c in "12345678":
+                squares.extend('.' * int(c))
+            else:
+                raise ValueError("invalid character %r in FEN board" % c)
+        if len(squares) - n != 8:
+            raise ValueError("FEN rank %r does not have 8 squares" % row)
+    if squares.count("K") != 1 or squares.count("k") != 1:
+        raise ValueError("FEN board must have one king of each color")
+    if "p" in squares[:8] + squares[56:] or "P" in squares[:8] + squares[56:]:
+        raise ValueError("FEN board has a pawn on the first or last rank")
+
+    if fparts[1] not in ("w", "b"):
+        raise ValueError("FEN turn must be 'w' or 'b': %r" % fparts[1])
+    turn = "wb".index(fparts[1])
+
+    kq = fparts[2]
+    if kq != "-" and (not kq or len(set(kq)) != len(kq) or kq.strip("KQkq")):
+        raise ValueError("invalid FEN castling field %r" % kq)
+    castling = ("K" in kq, "Q" in kq, "k" in kq, "q" in kq)
+
+    ep = None
+    if fparts[3] != "-":
+        target = fparts[3].lower()
+        if len(target) != 2 or target[0] not in FILE_INDEX or target[1] != "63"[turn]:
+            raise ValueError("invalid FEN en passant square %r" % fparts[3])
+        ep = (FILE_INDEX[target[0]], RANK_INDEX[target[1]])
+        if squares[(ep[1] + 1 - 2 * turn) * 8 + ep[0]] != "pP"[turn]:
+            raise ValueError("no pawn to take en passant on %r" % fparts[3])
+
+    counts = fparts[4:]
+    for c in counts:
+        if not c.isdigit():
+            raise ValueError("invalid FEN move count %r" % c)
+    if len(counts) == 2 and int(counts[1]) < 1:
+        raise ValueError("FEN fullmove number must be at least 1")
+    fifty = 0
+    if counts:
+        fifty = int(counts[0])
+
+    return squares, turn, castling, ep, fifty
+
+
+class MoveList:
+    """
+    The moves of a GameHistory as a read only sequence of ChessMove objects,
+    which are unpacked when they are looked up.
+    """
+
+    def __init__(self, history):
+        self._history = history
+
+    def __len__(self):
+        return len(self._history) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("move index out of range")
+        move = ChessMove()
+        (move.piece, move.from_pos, move.to_pos, move.take, move.promotion, move.check,
+         move.special_move_type, color) = unpackMove(self._history.word(i + 1))
+        return move
+
+
+class BoardView:
+    """
+    A read only view of the squares of a ChessBoard, see ChessBoard.getBoardView.
+    view[y] is a row as an 8 character string, so view[y][x] reads like getBoard()[y][x].
+    The view reads the live board without copying it and raises RuntimeError once the
+    board has moved to another position, so it never shows anything but the position
+    it was made for.
+    """
+
+    def __init__(self, chessboard):
+        self._chessboard = chessboard
+        self._key = chessboard._key
+        self._squares = None
+
+    def isStale(self):
+        """
+        Returns True if the board is no longer at the position of this view.
+        """
+        return self._chessboard._key != self._key
+
+    def pieceAt(self, x, y):
+        """
+        Returns the piece letter on (x, y), or a period (.) if the square is empty.
+        """
+        if self._chessboard._key != self._key:
+            raise RuntimeError("the board has moved on since this view was made")
+        return self._chessboard._board[y][x]
+
+    def toString(self):
+        """
+        Returns the 64 squares from a8 to h1 as one string, made once per view.
+        """
+        if self._chessboard._key != self._key:
+            raise RuntimeError("the board has moved on since this view was made")
+        if self._squares is None:
+            self._squares = "".join(["".join(row) for row in self._chessboard._board])
+        return self._squares
+
+    def toBytes(self):
+        """
+        Returns the squares of toString as bytes, one ASCII piece letter per square.
+        """
+        return bytes(self.toString())
+
+    def __len__(self):
+        return 8
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += 8
+        if y < 0 or y >= 8:
+            raise IndexError("row index out of range")
+        return self.toString()[y * 8:y * 8 + 8]
+
+    def __iter__(self):
+        squares = self.toString()
+        for y in range(8):
+            yield squares[y * 8:y * 8 + 8]
 
 
 class ChessBoard:
@@ -101,6 +295,12 @@ class ChessBoard:
     FIFTY_MOVES_RULE = 4
     THREE_REPETITION_RULE = 5
 
+    # Move generation modes
+    ALL_MOVES = 0
+    CAPTURE_MOVES = 1  # captures, en passant and promotions
+    QUIET_MOVES = 2  # the other moves, castling included
+    EVASION_MOVES = 3  # every move out of check, none when not in check
+
     # Text move output type
     AN = 0  # g4-e3
     SAN = 1  # Bxe3
@@ -116,24 +316,32 @@ class ChessBoard:
     _black_king_castle = True
     _black_queen_castle = True
     _board = None
+    _bits = None  # BitBoard mirror of _board, used for move generation
     _ep = [0, 0]  # none or the location of the current en pessant pawn
     _fifty = 0
+    _key = 0  # Zobrist key of the current position
+    _legal = None  # (key, _legal_info()) of the last position analysed
+    _text_lookup = None  # (key, _text_index()) of the last position a text move was looked up in
+    _view = None  # the BoardView of the last position one was asked for
+    _fen = None  # (ply, key, FEN) of the last history state getFEN was asked for
+    _move_cache = None  # optional MoveCache of getValidMoves results
 
     _black_king_location = (0, 0)
     _white_king_location = (0, 0)
 
-    # three rep stack
-    _three_rep_stack = []
-
-    # full state stack
-    _state_stack = []
+    # full state stack, packed moves and keys with a keyframe now and then
+    _state_stack = None
     _state_stack_pointer = 0
+    _loaded_ply = -1  # the state the board was last set to
 
     # all moves, stored to make it easier to build textmoves
     #[piece,from,to,takes,promotion,check/checkmate,specialmove]
     #["KQRNBP",(fx,fy),(tx,ty),True/False,"QRNB"/None,"+#"/None,0-5]
     _cur_move = ChessMove()
-    _moves = []
+    _moves = None
+
+    # undo records of the moves done with makeMove
+    _undo_stack = []
 
     # test comment
     _promotion_value = 0
@@ -164,54 +372,58 @@ class ChessBoard:
         return s
 
     def _load_cur_state(self):
-        s = self._state_stack[self._state_stack_pointer - 1]
-        b = s[:64]
-        v = s[64:72]
-        f = int(s[73:])
+        # rebuilds the current state from the nearest keyframe before it by
+        # replaying the moves in between, or from the loaded state if that is closer
+        history = self._state_stack
+        ply = self._state_stack_pointer - 1
+        start = ply - ply % KEYFRAME_INTERVAL
+        loaded = self._loaded_ply
+
+        if start <= loaded <= ply and not self._undo_stack and self._key == history.key(loaded):
+            start = loaded
+        else:
+            start, board, turn, castling, ep, fifty = history.frame(ply)
+
+            for r in range(8):
+                self._board[r][:] = board[r]
+            self._bits.setBoard(self._board)
+
+            self._turn = turn
+            self._white_king_castle, self._white_queen_castle, self._black_king_castle, self._black_queen_castle = \
+                castling
+            self._ep[0] = ep[0]
+            self._ep[1] = ep[1]
+            self._fifty = fifty
+
+        for i in range(start + 1, ply + 1):
+            piece, fromPos, toPos, take, promotion, check, special, color = unpackMove(history.word(i))
+            self._make_move(fromPos, toPos, special, promotion)
+            self._turn = 1 - self._turn
+
+        self._game_result = history.result(ply)
+        self._key = history.key(ply)
+        self._loaded_ply = ply
+        self._undo_stack = []
+        self._update_king_locations()
 
-        idx = 0
-        for r in range(8):
-            for c in range(8):
-                self._board[r][c] = b[idx]
-                idx += 1
-
-        self._turn = int(v[0])
-        self._white_king_castle = int(v[1])
-        self._white_queen_castle = int(v[2])
-        self._black_king_castle = int(v[3])
-        self._black_queen_castle = int(v[4])
-        self._ep[0] = int(v[5])
-        self._ep[1] = int(v[6])
-        self._game_result = int(v[7])
-
-        self._fifty = f
-
-    def _push_state(self):
-
-        if self._state_stack_pointer != len(self._state_stack):
-            self._state_stack = self._state_stack[:self._state_stack_pointer]
-            self._three_rep_stack = self._three_rep_stack[:self._state_stack_pointer]
-            self._moves = self._moves[:self._state_stack_pointer - 1]
-
-        three_state = [self._white_king_castle,
-                       self._white_queen_castle,
-                       self._black_king_castle,
-                       self._black_queen_castle,
-                       deepcopy(self._board),
-                       deepcopy(self._ep)]
-        self._three_rep_stack.append(three_state)
-
-        state_str = self.state2str()
-        self._state_stack.append(state_str)
+    def _push_state(self, move=None, hints=0):
+        # adds the current position as a new state, reached with move
+        history = self._state_stack
+        if self._state_stack_pointer != len(history):
+            history.truncate(self._state_stack_pointer)
+        self._fen = None
 
-        self._state_stack_pointer = len(self._state_stack)
+        castling = (self._white_king_castle, self._white_queen_castle,
+                    self._black_king_castle, self._black_queen_castle)
+        history.append(self._key, packMove(move, 1 - self._turn, self._game_result, hints),
+                       self._board, self._turn, castling, self._ep, self._fifty)
 
-    def _push_move(self):
-        self._moves.append(deepcopy(self._cur_move))
+        self._state_stack_pointer = len(history)
+        self._loaded_ply = self._state_stack_pointer - 1
 
     def _three_repetitions(self):
 
-        ts = self._three_rep_stack[:self._state_stack_pointer]
+        ts = self._state_stack.keys(self._state_stack_pointer)
 
         if not len(ts):
             return False
@@ -221,67 +433,233 @@ class ChessBoard:
             return True
         return False
 
+    def _castling_key(self):
+        key = 0
+        if self._white_king_castle:
+            key ^= ZOBRIST_CASTLING[0]
+        if self._white_queen_castle:
+            key ^= ZOBRIST_CASTLING[1]
+        if self._black_king_castle:
+            key ^= ZOBRIST_CASTLING[2]
+        if self._black_queen_castle:
+            key ^= ZOBRIST_CASTLING[3]
+        return key
+
+    def _compute_key(self):
+        # builds the position key from scratch, moves update it incrementally
+        key = self._bits.pieceKey() ^ self._castling_key()
+        if self._ep[1] != 0:
+            key ^= ZOBRIST_EP[self._ep[0]]
+        if self._turn == self.BLACK:
+            key ^= ZOBRIST_TURN
+        return key
+
 
     def _update_king_locations(self):
-        # sets the king locations
-        for y in range(0, 8):
-            for x in range(0, 8):
-                if self._board[y][x] == "K":
-                    self._white_king_location = (x, y)
-                if self._board[y][x] == "k":
-                    self._black_king_location = (x, y)
+        # sets the king locations from the bitboards, only needed when a whole
+        # position is loaded since _make_move and _unmake_move keep them up to date
+        sq = self._bits.kingSquare(self.WHITE)
+        if sq >= 0:
+            self._white_king_location = COORDS[sq]
+        sq = self._bits.kingSquare(self.BLACK)
+        if sq >= 0:
+            self._black_king_location = COORDS[sq]
+
+    def _move_piece(self, fromPos, toPos, piece=None):
+        # moves the piece on fromPos to toPos, replacing it with piece if given
+        fx, fy = fromPos
+        tx, ty = toPos
+        fp = self._board[fy][fx]
+        tp = self._board[ty][tx]
+        if piece is None:
+            piece = fp
+        fsq = fy * 8 + fx
+        tsq = ty * 8 + tx
+        if tp != '.':
+            self._bits.removePiece(tsq, tp)
+            self._key ^= ZOBRIST_PIECES[PIECE_INDEX[tp]][tsq]
+        self._bits.removePiece(fsq, fp)
+        self._bits.putPiece(tsq, piece)
+        self._key ^= ZOBRIST_PIECES[PIECE_INDEX[fp]][fsq] ^ ZOBRIST_PIECES[PIECE_INDEX[piece]][tsq]
+        self._board[ty][tx] = piece
+        self._board[fy][fx] = '.'
+
+    def _remove_piece(self, pos):
+        x, y = pos
+        p = self._board[y][x]
+        if p != '.':
+            self._bits.removePiece(y * 8 + x, p)
+            self._key ^= ZOBRIST_PIECES[PIECE_INDEX[p]][y * 8 + x]
+            self._board[y][x] = '.'
 
     def _set_ep(self, epPos):
+        self._clear_ep()
         self._ep[0], self._ep[1] = epPos
+        self._key ^= ZOBRIST_EP[epPos[0]]
 
     def _clear_ep(self):
+        if self._ep[1] != 0:
+            self._key ^= ZOBRIST_EP[self._ep[0]]
         self._ep[0] = 0
         self._ep[1] = 0
 
+    def _check_no_made_moves(self):
+        # the game history can only hold positions reached with addMove
+        if self._undo_stack:
+            raise RuntimeError("%d moves done with makeMove are not taken back" % len(self._undo_stack))
+
     def _end_game(self, reason):
         self._game_result = reason
 
-    def _check_king_guard(self, fromPos, moves, specialMoves={}):
-        result = []
+    def _move_type(self, fromPos, toPos):
+        # works out the special move type of a pawn or king move from the board
+        fx, fy = fromPos
+        tx, ty = toPos
+        p = self._board[fy][fx]
+        if p == 'P' or p == 'p':
+            if ty == 0 or ty == 7:
+                return ChessMove.PROMOTION_MOVE
+            if abs(ty - fy) == 2:
+                return ChessMove.EP_MOVE
+            if tx != fx and self._board[ty][tx] == '.':
+                return ChessMove.EP_CAPTURE_MOVE
+        elif p == 'K' or p == 'k':
+            if tx - fx == 2:
+                return ChessMove.KING_CASTLE_MOVE
+            if fx - tx == 2:
+                return ChessMove.QUEEN_CASTLE_MOVE
+        return ChessMove.NORMAL_MOVE
+
+    def _make_move(self, fromPos, toPos, special=0, promotion=None):
+        # Applies a move that is known to be valid for the player to move, without
+        # switching the turn. promotion is the piece letter to put on toPos.
+        # Returns the record _unmake_move needs to take the move back.
+        fx, fy = fromPos
+        piece = self._board[fy][fx]
+        captured = self._board[toPos[1]][toPos[0]]
 
-        if self._turn == self.WHITE:
-            kx, ky = self._white_king_location
+        record = (fromPos, toPos, special, piece, captured,
+                  self._white_king_castle, self._white_queen_castle,
+                  self._black_king_castle, self._black_queen_castle,
+                  self._ep[0], self._ep[1], self._fifty, self._key)
+
+        if special == ChessMove.EP_CAPTURE_MOVE:
+            self._remove_piece(self._ep)
+
+        if piece in "KkRr":
+            self._key ^= self._castling_key()
+            if piece == 'K':
+                self._white_king_castle = False
+                self._white_queen_castle = False
+            elif piece == 'k':
+                self._black_king_castle = False
+                self._black_queen_castle = False
+            elif piece == 'R':
+                if fx == 0:
+                    self._white_queen_castle = False
+                if fx == 7:
+                    self._white_king_castle = False
+            else:
+                if fx == 0:
+                    self._black_queen_castle = False
+                if fx == 7:
+                    self._black_king_castle = False
+            self._key ^= self._castling_key()
+
+        if piece == 'P' or piece == 'p' or captured != '.':
+            self._fifty = 0
         else:
-            kx, ky = self._black_king_location
+            self._fifty += 1
 
-        fx, fy = fromPos
+        if special == ChessMove.EP_MOVE:
+            self._set_ep(toPos)
+        else:
+            self._clear_ep()
 
-        done = False
-        fp = self._board[fy][fx]
-        self._board[fy][fx] = "."
-        if not self._is_threatened(kx, ky):
-            done = True
-        self._board[fy][fx] = fp
+        self._move_piece(fromPos, toPos, promotion)
 
-        if done:
-            return moves
+        if special == ChessMove.KING_CASTLE_MOVE:
+            self._move_piece((7, fy), (5, fy))
+        elif special == ChessMove.QUEEN_CASTLE_MOVE:
+            self._move_piece((0, fy), (3, fy))
 
-        for m in moves:
-            tx, ty = m
-            sp = None
-            fp = self._board[fy][fx]
-            tp = self._board[ty][tx]
+        if piece == 'K':
+            self._white_king_location = toPos
+        elif piece == 'k':
+            self._black_king_location = toPos
 
-            self._board[fy][fx] = "."
-            self._board[ty][tx] = fp
+        return record
+
+    def _unmake_move(self, record):
+        # restores the position from a record made by _make_move
+        (fromPos, toPos, special, piece, captured, wkc, wqc, bkc, bqc, epx, epy, fifty, key) = record
+        fx, fy = fromPos
+        tx, ty = toPos
+        board = self._board
+        bits = self._bits
+
+        bits.removePiece(ty * 8 + tx, board[ty][tx])
+        bits.putPiece(fy * 8 + fx, piece)
+        board[fy][fx] = piece
+        board[ty][tx] = captured
+        if captured != '.':
+            bits.putPiece(ty * 8 + tx, captured)
+
+        if special == ChessMove.KING_CASTLE_MOVE:
+            r = board[fy][5]
+            bits.movePiece(fy * 8 + 5, fy * 8 + 7, r)
+            board[fy][7] = r
+            board[fy][5] = '.'
+        elif special == ChessMove.QUEEN_CASTLE_MOVE:
+            r = board[fy][3]
+            bits.movePiece(fy * 8 + 3, fy * 8, r)
+            board[fy][0] = r
+            board[fy][3] = '.'
+        elif special == ChessMove.EP_CAPTURE_MOVE:
+            if piece == 'P':
+                p = 'p'
+            else:
+                p = 'P'
+            bits.putPiece(epy * 8 + epx, p)
+            board[epy][epx] = p
+
+        self._white_king_castle = wkc
+        self._white_queen_castle = wqc
+        self._black_king_castle = bkc
+        self._black_queen_castle = bqc
+        self._ep[0] = epx
+        self._ep[1] = epy
+        self._fifty = fifty
+        self._key = key
+
+        if piece == 'K':
+            self._white_king_location = fromPos
+        elif piece == 'k':
+            self._black_king_location = fromPos
 
-            if specialMoves.has_key(m) and specialMoves[m] == ChessMove.EP_CAPTURE_MOVE:
-                sp = self._board[self._ep[1]][self._ep[0]]
-                self._board[self._ep[1]][self._ep[0]] = "."
+    def _check_king_guard(self, fromPos, moves, specialMoves={}):
+        # Filters pseudo legal moves with the checkers and pins of the position:
+        # a move must land on a square of the check target mask and stay on the
+        # pin ray of a pinned piece. Only en passant is still tried out.
+        ksq, checkers, target, pins = self._legal_info()
+        if ksq < 0:
+            return moves
 
-            if not self._is_threatened(kx, ky):
-                result.append(m)
+        mask = target
+        sq = fromPos[1] * 8 + fromPos[0]
+        if sq in pins:
+            mask &= pins[sq]
 
-            if sp:
-                self._board[self._ep[1]][self._ep[0]] = sp
+        if mask == FULL and ChessMove.EP_CAPTURE_MOVE not in specialMoves.values():
+            return moves
 
-            self._board[fy][fx] = fp
-            self._board[ty][tx] = tp
+        result = []
+        for m in moves:
+            if specialMoves.get(m) == ChessMove.EP_CAPTURE_MOVE:
+                if self._ep_capture_is_safe(fromPos, m, ksq):
+                    result.append(m)
+            elif BITS[m[1] * 8 + m[0]] & mask:
+                result.append(m)
 
         return result
 
@@ -302,65 +680,214 @@ class ChessBoard:
         if player == None:
             player = self._turn
 
-        if player == self.WHITE:
-            if lx < 7 and ly > 0 and self._board[ly - 1][lx + 1] == 'p':
-                return True
-            elif lx > 0 and ly > 0 and self._board[ly - 1][lx - 1] == 'p':
-                return True
-        else:
-            if lx < 7 and ly < 7 and self._board[ly + 1][lx + 1] == 'P':
-                return True
-            elif lx > 0 and ly < 7 and self._board[ly + 1][lx - 1] == 'P':
-                return True
-
-        m = [(lx + 1, ly + 2), (lx + 2, ly + 1), (lx + 2, ly - 1), (lx + 1, ly - 2), (lx - 1, ly + 2), (lx - 2, ly + 1),
-             (lx - 1, ly - 2), (lx - 2, ly - 1)]
-        for p in m:
-            if p[0] >= 0 and p[0] <= 7 and p[1] >= 0 and p[1] <= 7:
-                if self._board[p[1]][p[0]] == "n" and player == self.WHITE:
-                    return True
-                elif self._board[p[1]][p[0]] == "N" and player == self.BLACK:
-                    return True
-
-        dirs = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
-        for d in dirs:
-            x = lx
-            y = ly
-            dx, dy = d
-            steps = 0
-            while True:
-                steps += 1
-                x += dx
-                y += dy
-                if x < 0 or x > 7 or y < 0 or y > 7:
-                    break
-                if self._is_free(x, y):
-                    continue
-                elif self._get_color(x, y) == player:
-                    break
-                else:
-                    p = self._board[y][x].upper()
-                    if p == 'K' and steps == 1:
-                        return True
-                    elif p == 'Q':
-                        return True
-                    elif p == 'R' and abs(dx) != abs(dy):
-                        return True
-                    elif p == 'B' and abs(dx) == abs(dy):
-                        return True
-                    break
-        return False
+        return self._bits.attackersTo(ly * 8 + lx, 1 - player) != 0
 
     def _has_any_valid_moves(self, player=None):
         if player == None:
             player = self._turn
 
-        for y in range(0, 8):
-            for x in range(0, 8):
-                if self._get_color(x, y) == player:
-                    if len(self.getValidMoves((x, y))):
-                        return True
-        return False
+        if player != self._turn:
+            return False
+        return self.hasLegalMoves()
+
+    def _slider_moves(self, fromPos, dirs):
+        # same result as traceValidMoves, but each ray is cut at its first
+        # blocker found in the occupancy bitboard
+        fx, fy = fromPos
+        sq = fy * 8 + fx
+        occ = self._bits.occupied
+        own = self._bits.colors[self._turn]
+        moves = []
+        for d in dirs:
+            blockers = RAYS[d][sq] & occ
+            if not blockers:
+                moves.extend(RAY_TARGETS[d][sq])
+                continue
+            if POSITIVE[d]:
+                b = (blockers & -blockers).bit_length() - 1
+            else:
+                b = blockers.bit_length() - 1
+            n = DISTANCE[sq][b]
+            if BITS[b] & own:
+                n -= 1
+            moves.extend(RAY_TARGETS[d][sq][:n])
+        return moves
+
+    def _legal_info(self):
+        # Works out once per position what limits the moves of the player to move:
+        # the king square, the checking pieces, the squares other pieces must move
+        # to (0 in double check) and a move mask for every pinned piece.
+        # The result is kept until the position key changes.
+        if self._legal is not None and self._legal[0] == self._key:
+            return self._legal[1]
+
+        bits = self._bits
+        color = self._turn
+        enemy = 1 - color
+        ksq = bits.kingSquare(color)
+        if ksq < 0:
+            info = (ksq, 0, FULL, {})
+            self._legal = (self._key, info)
+            return info
+
+        checkers = bits.attackersTo(ksq, enemy)
+        if not checkers:
+            target = FULL
+        elif checkers & (checkers - 1):
+            target = 0
+        else:
+            target = checkers | BETWEEN[ksq][lsb(checkers)]
+
+        p = bits.pieces
+        o = 6 * enemy
+        rq = p[o + 3] | p[o + 4]
+        bq = p[o + 2] | p[o + 4]
+        own = bits.colors[color]
+        occ = bits.occupied
+        pins = {}
+        for d in QUEEN_DIRECTIONS:
+            if d < 4:
+                sliders = rq
+            else:
+                sliders = bq
+            if not RAYS[d][ksq] & sliders:
+                continue
+            b = firstBlocker(d, ksq, occ)
+            if b < 0 or not BITS[b] & own:
+                continue
+            pinner = firstBlocker(d, b, occ)
+            if pinner >= 0 and BITS[pinner] & sliders:
+                pins[b] = BETWEEN[ksq][pinner] | BITS[pinner]
+
+        info = (ksq, checkers, target, pins)
+        self._legal = (self._key, info)
+        return info
+
+    def _ep_capture_is_safe(self, fromPos, toPos, ksq):
+        # en passant removes two pawns from the board, so it is checked by trial
+        if ksq < 0:
+            return True
+        bits = self._bits
+        cap = BITS[self._ep[1] * 8 + self._ep[0]]
+        occ = bits.occupied ^ BITS[fromPos[1] * 8 + fromPos[0]] ^ BITS[toPos[1] * 8 + toPos[0]] ^ cap
+        return not bits.attackersTo(ksq, 1 - self._turn, occ) & ~cap
+
+    def _king_moves(self, ksq):
+        # legal king moves and castles as (toPos, special) pairs
+        bits = self._bits
+        board = self._board
+        enemy = 1 - self._turn
+        own = bits.colors[self._turn]
+        occ = bits.occupied & ~BITS[ksq]
+        moves = []
+        for b, t in KING_TARGETS[ksq]:
+            if not b & own and not bits.attackersTo(t[1] * 8 + t[0], enemy, occ):
+                moves.append((t, ChessMove.NORMAL_MOVE))
+
+        if self._turn == self.WHITE:
+            c_row = 7
+            c_king = self._white_king_castle
+            c_queen = self._white_queen_castle
+        else:
+            c_row = 0
+            c_king = self._black_king_castle
+            c_queen = self._black_queen_castle
+        row = board[c_row]
+        r = c_row * 8
+        if c_king and row[5] == '.' and row[6] == '.' and row[7].upper() == 'R':
+            if not bits.attackersTo(r + 4, enemy, occ) and not bits.attackersTo(r + 5, enemy, occ) and \
+                    not bits.attackersTo(r + 6, enemy, occ):
+                moves.append(((6, c_row), ChessMove.KING_CASTLE_MOVE))
+        if c_queen and row[3] == '.' and row[2] == '.' and row[1] == '.' and row[0].upper() == 'R':
+            if not bits.attackersTo(r + 4, enemy, occ) and not bits.attackersTo(r + 3, enemy, occ) and \
+                    not bits.attackersTo(r + 2, enemy, occ):
+                moves.append(((2, c_row), ChessMove.QUEEN_CASTLE_MOVE))
+        return moves
+
+    def _stage_codes(self, captures=None, kings=True, others=True):
+        # Yields the legal move codes of one generation stage, a piece at a time: the
+        # captures and promotions if captures is True, the other moves if it is False and
+        # all of them if it is None. kings and others pick the pieces to move.
+        ksq, checkers, target, pins = self._legal_info()
+        board = self._board
+        bits = self._bits
+        own = bits.colors[self._turn]
+        enemy = bits.colors[1 - self._turn]
+        if captures is None:
+            allowed = FULL
+        elif captures:
+            allowed = enemy
+        else:
+            allowed = FULL & ~bits.occupied
+
+        for sq in iterBits(own):
+            fromPos = COORDS[sq]
+            if sq == ksq:
+                if kings:
+                    for toPos, t in self._king_moves(ksq):
+                        tsq = toPos[1] * 8 + toPos[0]
+                        if BITS[tsq] & allowed:
+                            yield sq | tsq << 6 | t << 12
+                continue
+            if not others:
+                continue
+
+            mask = target
+            if sq in pins:
+                mask &= pins[sq]
+            if not mask:
+                continue
+
+            p = board[fromPos[1]][fromPos[0]].upper()
+            if p == 'P':
+                moves, specialMoves = self._pawn_moves(fromPos)
+                for toPos in moves:
+                    tsq = toPos[1] * 8 + toPos[0]
+                    t = specialMoves.get(toPos, ChessMove.NORMAL_MOVE)
+                    promotion = toPos[1] == 0 or toPos[1] == 7
+                    if captures is not None and \
+                            captures != (t == ChessMove.EP_CAPTURE_MOVE or promotion or bool(BITS[tsq] & enemy)):
+                        continue
+                    if t == ChessMove.EP_CAPTURE_MOVE:
+                        if not self._ep_capture_is_safe(fromPos, toPos, ksq):
+                            continue
+                    elif not BITS[tsq] & mask:
+                        continue
+                    if promotion:
+                        for flag in (PROMOTION_FLAG, PROMOTION_FLAG + 1, PROMOTION_FLAG + 2, PROMOTION_FLAG + 3):
+                            yield sq | tsq << 6 | flag << 12
+                    else:
+                        yield sq | tsq << 6 | t << 12
+                continue
+
+            mask &= allowed
+            if not mask:
+                continue
+            if p == 'N':
+                for b, toPos in KNIGHT_TARGETS[sq]:
+                    if b & mask and not b & own:
+                        yield sq | (toPos[1] * 8 + toPos[0]) << 6
+                continue
+
+            if p == 'R':
+                moves = self._slider_moves(fromPos, ROOK_DIRECTIONS)
+            elif p == 'B':
+                moves = self._slider_moves(fromPos, BISHOP_DIRECTIONS)
+            else:
+                moves = self._slider_moves(fromPos, QUEEN_DIRECTIONS)
+            for toPos in moves:
+                tsq = toPos[1] * 8 + toPos[0]
+                if BITS[tsq] & mask:
+                    yield sq | tsq << 6
+
+    def _code_move(self, code):
+        # a ChessMove for a move code of the player to move, with piece and take set
+        move = ChessMove.fromCode(code, self._turn)
+        fx, fy = move.from_pos
+        tx, ty = move.to_pos
+        move.piece = self._board[fy][fx].upper()
+        move.take = self._board[ty][tx] != '.' or move.special_move_type == ChessMove.EP_CAPTURE_MOVE
+        return move
 
     #-----------------------------------------------------------------
 
@@ -388,36 +915,35 @@ class ChessBoard:
         return moves
 
     def getValidQueenMoves(self, fromPos):
-        moves = []
-        dirs = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
-
-        moves = self.traceValidMoves(fromPos, dirs)
+        moves = self._slider_moves(fromPos, QUEEN_DIRECTIONS)
 
         moves = self._check_king_guard(fromPos, moves)
 
         return moves
 
     def getValidRookMoves(self, fromPos):
-        moves = []
-        dirs = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-
-        moves = self.traceValidMoves(fromPos, dirs)
+        moves = self._slider_moves(fromPos, ROOK_DIRECTIONS)
 
         moves = self._check_king_guard(fromPos, moves)
 
         return moves
 
     def getValidBishopMoves(self, fromPos):
-        moves = []
-        dirs = [(1, 1), (-1, 1), (1, -1), (-1, -1)]
-
-        moves = self.traceValidMoves(fromPos, dirs)
+        moves = self._slider_moves(fromPos, BISHOP_DIRECTIONS)
 
         moves = self._check_king_guard(fromPos, moves)
 
         return moves
 
     def getValidPawnMoves(self, fromPos):
+        moves, specialMoves = self._pawn_moves(fromPos)
+
+        moves = self._check_king_guard(fromPos, moves, specialMoves)
+
+        return (moves, specialMoves)
+
+    def _pawn_moves(self, fromPos):
+        # pawn moves before the king guard check
         moves = []
         specialMoves = {}
         fx, fy = fromPos
@@ -433,16 +959,19 @@ class ChessBoard:
             ocol = self.WHITE
             eprow = 4
 
-        if self._is_free(fx, fy + movedir):
+        occ = self._bits.occupied
+        enemy = self._bits.colors[ocol]
+        sq = (fy + movedir) * 8 + fx
+
+        if not occ & BITS[sq]:
             moves.append((fx, fy + movedir))
 
-        if fy == startrow:
-            if self._is_free(fx, fy + movedir) and self._is_free(fx, fy + (movedir * 2)):
+            if fy == startrow and not occ & BITS[sq + movedir * 8]:
                 moves.append((fx, fy + (movedir * 2)))
                 specialMoves[(fx, fy + (movedir * 2))] = ChessMove.EP_MOVE
-        if fx < 7 and self._get_color(fx + 1, fy + movedir) == ocol:
+        if fx < 7 and enemy & BITS[sq + 1]:
             moves.append((fx + 1, fy + movedir))
-        if fx > 0 and self._get_color(fx - 1, fy + movedir) == ocol:
+        if fx > 0 and enemy & BITS[sq - 1]:
             moves.append((fx - 1, fy + movedir))
 
         if fy == eprow and self._ep[1] != 0:
@@ -453,19 +982,12 @@ class ChessBoard:
                 moves.append((fx - 1, fy + movedir))
                 specialMoves[(fx - 1, fy + movedir)] = ChessMove.EP_CAPTURE_MOVE
 
-        moves = self._check_king_guard(fromPos, moves, specialMoves)
-
         return (moves, specialMoves)
 
     def getValidKnightMoves(self, fromPos):
-        moves = []
         fx, fy = fromPos
-        m = [(fx + 1, fy + 2), (fx + 2, fy + 1), (fx + 2, fy - 1), (fx + 1, fy - 2), (fx - 1, fy + 2), (fx - 2, fy + 1),
-             (fx - 1, fy - 2), (fx - 2, fy - 1)]
-        for p in m:
-            if p[0] >= 0 and p[0] <= 7 and p[1] >= 0 and p[1] <= 7:
-                if self._get_color(p[0], p[1]) != self._turn:
-                    moves.append(p)
+        own = self._bits.colors[self._turn]
+        moves = [p for b, p in KNIGHT_TARGETS[fy * 8 + fx] if not b & own]
 
         moves = self._check_king_guard(fromPos, moves)
 
@@ -475,64 +997,108 @@ class ChessBoard:
         moves = []
         specialMoves = {}
 
-        if self._turn == self.WHITE:
-            c_row = 7
-            c_king = self._white_king_castle
-            c_queen = self._white_queen_castle
-            k = "K"
-        else:
-            c_row = 0
-            c_king = self._black_king_castle
-            c_queen = self._black_queen_castle
-            k = "k"
+        for toPos, t in self._king_moves(fromPos[1] * 8 + fromPos[0]):
+            moves.append(toPos)
+            if t:
+                specialMoves[toPos] = t
 
-        dirs = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+        return (moves, specialMoves)
 
-        t_moves = self.traceValidMoves(fromPos, dirs, 1)
-        moves = []
+    def isLegalMove(self, fromPos, toPos):
+        """
+        Returns True if the piece of the current player on fromPos can move to toPos.
+        Only that one move is looked at: its path on the board, then whether it leaves the
+        king in check, so validating a move costs far less than listing the moves of the piece.
+        A pawn move to the last rank is legal whatever the promotion piece.
+        The position arguments must be tuples containing x, y value Ex. (4, 6).
+        """
+        if self._game_result:
+            return False
+        fx, fy = fromPos
+        tx, ty = toPos
+        if fx < 0 or fx > 7 or fy < 0 or fy > 7 or tx < 0 or tx > 7 or ty < 0 or ty > 7:
+            return False
+        if self._get_color(fx, fy) != self._turn:
+            return False
 
-        self._board[fromPos[1]][fromPos[0]] = '.'
+        bits = self._bits
+        sq = fy * 8 + fx
+        tsq = ty * 8 + tx
+        if BITS[tsq] & bits.colors[self._turn]:
+            return False
+        occ = bits.occupied
+        p = self._board[fy][fx].upper()
+        ksq, checkers, target, pins = self._legal_info()
+
+        if p == 'K':
+            if DISTANCE[sq][tsq] == 1:
+                return not bits.attackersTo(tsq, 1 - self._turn, occ & ~BITS[sq])
+            if ty == fy and abs(tx - fx) == 2:
+                for t, special in self._king_moves(sq):
+                    if t == toPos and special:
+                        return True
+            return False
 
-        for m in t_moves:
-            if not self._is_threatened(m[0], m[1]):
-                moves.append(m)
+        mask = target
+        if sq in pins:
+            mask &= pins[sq]
+        if p != 'P' and not BITS[tsq] & mask:
+            return False
 
-        if c_king:
-            if self._is_free(5, c_row) and self._is_free(6, c_row) and self._board[c_row][7].upper() == 'R':
-                if not self._is_threatened(4, c_row) and not self._is_threatened(5, c_row) and not self._is_threatened(6,
-                                                                                                                 c_row):
-                    moves.append((6, c_row))
-                    specialMoves[(6, c_row)] = ChessMove.KING_CASTLE_MOVE
-        if c_queen:
-            if self._is_free(3, c_row) and self._is_free(2, c_row) and self._is_free(1, c_row) and self._board[c_row][
-                0].upper() == 'R':
-                if not self._is_threatened(4, c_row) and not self._is_threatened(3, c_row) and not self._is_threatened(2,
-                                                                                                                 c_row):
-                    moves.append((2, c_row))
-                    specialMoves[(2, c_row)] = ChessMove.QUEEN_CASTLE_MOVE
+        dx = tx - fx
+        dy = ty - fy
+        if p == 'P':
+            if self._turn == self.WHITE:
+                movedir = -1
+                startrow = 6
+                eprow = 3
+            else:
+                movedir = 1
+                startrow = 1
+                eprow = 4
+            if dx == 0:
+                if dy == movedir:
+                    if occ & BITS[tsq]:
+                        return False
+                elif dy == 2 * movedir and fy == startrow:
+                    if occ & (BITS[tsq] | BITS[sq + movedir * 8]):
+                        return False
+                else:
+                    return False
+            elif (dx == 1 or dx == -1) and dy == movedir:
+                if not BITS[tsq] & occ:
+                    # en passant takes a pawn that is not on the target square
+                    if fy == eprow and self._ep[1] != 0 and self._ep[0] == tx:
+                        return self._ep_capture_is_safe(fromPos, toPos, ksq)
+                    return False
+            else:
+                return False
+            return bool(BITS[tsq] & mask)
 
-        self._board[fromPos[1]][fromPos[0]] = k
+        if p == 'N':
+            return bool(KNIGHT_ATTACKS[sq] & BITS[tsq])
 
-        return (moves, specialMoves)
+        if dx == 0 or dy == 0:
+            if p == 'B':
+                return False
+        elif dx == dy or dx == -dy:
+            if p == 'R':
+                return False
+        else:
+            return False
+        return not BETWEEN[sq][tsq] & occ
 
     # -----------------------------------------------------------------------------------
 
     def movePawn(self, fromPos, toPos):
-        moves, specialMoves = self.getValidPawnMoves(fromPos)
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        if specialMoves.has_key(toPos):
-            t = specialMoves[toPos]
-        else:
-            t = 0
+        t = self._move_type(fromPos, toPos)
 
         if t == ChessMove.EP_CAPTURE_MOVE:
-            self._board[self._ep[1]][self._ep[0]] = '.'
             self._cur_move.take = True
-            #   self._cur_move.special_move_type = ChessMove.EP_CAPTURE_MOVE
-            self._cur_move.special_move_type = EPCaptureMove().moveInt
+            self._cur_move.special_move_type = ChessMove.EP_CAPTURE_MOVE
 
         pv = self._promotion_value
         if self._turn == self.WHITE and toPos[1] == 0:
@@ -542,8 +1108,8 @@ class ChessBoard:
             pc = ['Q', 'R', 'N', 'B']
             p = pc[pv - 1]
             self._cur_move.promotion = p
-            # self._cur_move.special_move_type = ChessMove.PROMOTION_MOVE
-            self._cur_move.special_move_type = PromotionMove().moveInt
+            self._cur_move.special_move_type = ChessMove.PROMOTION_MOVE
+            t = ChessMove.PROMOTION_MOVE
         elif self._turn == self.BLACK and toPos[1] == 7:
             if pv == 0:
                 self._reason = self.MUST_SET_PROMOTION
@@ -551,170 +1117,74 @@ class ChessBoard:
             pc = ['q', 'r', 'n', 'b']
             p = pc[pv - 1]
             self._cur_move.promotion = p
-            # self._cur_move.special_move_type = ChessMove.PROMOTION_MOVE
-            self._cur_move.special_move_type = PromotionMove().moveInt
+            self._cur_move.special_move_type = ChessMove.PROMOTION_MOVE
+            t = ChessMove.PROMOTION_MOVE
         else:
-            p = self._board[fromPos[1]][fromPos[0]]
+            p = None
 
         if t == ChessMove.EP_MOVE:
-            self._set_ep(toPos)
-            # self._cur_move.special_move_type = ChessMove.EP_MOVE
-            self._cur_move.special_move_type = EPMove().moveInt
-        else:
-            self._clear_ep()
+            self._cur_move.special_move_type = ChessMove.EP_MOVE
 
         if self._board[toPos[1]][toPos[0]] != '.':
             self._cur_move.take = True
 
-        self._board[toPos[1]][toPos[0]] = p
-        self._board[fromPos[1]][fromPos[0]] = "."
-
-        self._fifty = 0
+        self._make_move(fromPos, toPos, t, p)
         return True
 
     def moveKnight(self, fromPos, toPos):
-        moves = self.getValidKnightMoves(fromPos)
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        self._clear_ep()
-
-        if self._board[toPos[1]][toPos[0]] == ".":
-            self._fifty += 1
-        else:
-            self._fifty = 0
+        if self._board[toPos[1]][toPos[0]] != ".":
             self._cur_move.take = True
 
-        self._board[toPos[1]][toPos[0]] = self._board[fromPos[1]][fromPos[0]]
-        self._board[fromPos[1]][fromPos[0]] = "."
+        self._make_move(fromPos, toPos)
         return True
 
     def moveKing(self, fromPos, toPos):
-        if self._turn == self.WHITE:
-            c_row = 7
-            k = "K"
-            r = "R"
-        else:
-            c_row = 0
-            k = "k"
-            r = "r"
-
-        moves, specialMoves = self.getValidKingMoves(fromPos)
-
-        if specialMoves.has_key(toPos):
-            t = specialMoves[toPos]
-        else:
-            t = 0
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        self._clear_ep()
-
-        if self._turn == self.WHITE:
-            self._white_king_castle = False
-            self._white_queen_castle = False
-        else:
-            self._black_king_castle = False
-            self._black_queen_castle = False
+        t = self._move_type(fromPos, toPos)
 
         if t == ChessMove.KING_CASTLE_MOVE:
-            self._fifty += 1
-            self._board[c_row][4] = "."
-            self._board[c_row][6] = k
-            self._board[c_row][7] = "."
-            self._board[c_row][5] = r
-            # self._cur_move.special_move_type = ChessMove.KING_CASTLE_MOVE
-            self._cur_move.special_move_type = KingCastleMove.get_id()
+            self._cur_move.special_move_type = ChessMove.KING_CASTLE_MOVE
         elif t == ChessMove.QUEEN_CASTLE_MOVE:
-            self._fifty += 1
-            self._board[c_row][4] = "."
-            self._board[c_row][2] = k
-            self._board[c_row][0] = "."
-            self._board[c_row][3] = r
-            #self._cur_move.special_move_type = ChessMove.QUEEN_CASTLE_MOVE
-            self._cur_move.special_move_type = QueenCastleMove.get_id(
-            )
-        else:
-            if self._board[toPos[1]][toPos[0]] == ".":
-                self._fifty += 1
-            else:
-                self._fifty = 0
-                self._cur_move.take = True
-
-            self._board[toPos[1]][toPos[0]] = self._board[fromPos[1]][fromPos[0]]
-            self._board[fromPos[1]][fromPos[0]] = "."
+            self._cur_move.special_move_type = ChessMove.QUEEN_CASTLE_MOVE
+        elif self._board[toPos[1]][toPos[0]] != ".":
+            self._cur_move.take = True
 
-        self._update_king_locations()
+        self._make_move(fromPos, toPos, t)
         return True
 
     def moveQueen(self, fromPos, toPos):
-
-        moves = self.getValidQueenMoves(fromPos)
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        self._clear_ep()
-
-        if self._board[toPos[1]][toPos[0]] == ".":
-            self._fifty += 1
-        else:
-            self._fifty = 0
+        if self._board[toPos[1]][toPos[0]] != ".":
             self._cur_move.take = True
 
-        self._board[toPos[1]][toPos[0]] = self._board[fromPos[1]][fromPos[0]]
-        self._board[fromPos[1]][fromPos[0]] = "."
+        self._make_move(fromPos, toPos)
         return True
 
     def moveBishop(self, fromPos, toPos):
-        moves = self.getValidBishopMoves(fromPos)
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        self._clear_ep()
-
-        if self._board[toPos[1]][toPos[0]] == ".":
-            self._fifty += 1
-        else:
-            self._fifty = 0
+        if self._board[toPos[1]][toPos[0]] != ".":
             self._cur_move.take = True
 
-        self._board[toPos[1]][toPos[0]] = self._board[fromPos[1]][fromPos[0]]
-        self._board[fromPos[1]][fromPos[0]] = "."
+        self._make_move(fromPos, toPos)
         return True
 
     def moveRook(self, fromPos, toPos):
-
-        moves = self.getValidRookMoves(fromPos)
-
-        if not toPos in moves:
+        if not self.isLegalMove(fromPos, toPos):
             return False
 
-        fx, fy = fromPos
-        if self._turn == self.WHITE:
-            if fx == 0:
-                self._white_queen_castle = False
-            if fx == 7:
-                self._white_king_castle = False
-        if self._turn == self.BLACK:
-            if fx == 0:
-                self._black_queen_castle = False
-            if fx == 7:
-                self._black_king_castle = False
-
-        self._clear_ep()
-
-        if self._board[toPos[1]][toPos[0]] == ".":
-            self._fifty += 1
-        else:
-            self._fifty = 0
+        if self._board[toPos[1]][toPos[0]] != ".":
             self._cur_move.take = True
 
-        self._board[toPos[1]][toPos[0]] = self._board[fromPos[1]][fromPos[0]]
-        self._board[fromPos[1]][fromPos[0]] = "."
+        self._make_move(fromPos, toPos)
         return True
 
     def _parseTextMove(self, txt):
@@ -728,6 +1198,8 @@ class ChessBoard:
         h_file = -1
 
         # handle the special
+        if txt.rstrip("+#!?") in ("O-O", "O-O-O"):
+            txt = txt.rstrip("+#!?")
         if txt == "O-O":
             if self._turn == 0:
                 return (None, 4, 7, 6, 7, None)
@@ -739,8 +1211,8 @@ class ChessBoard:
             if self._turn == 1:
                 return (None, 4, 0, 2, 0, None)
 
-        files = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
-        ranks = {"8": 0, "7": 1, "6": 2, "5": 3, "4": 4, "3": 5, "2": 6, "1": 7}
+        files = FILE_INDEX
+        ranks = RANK_INDEX
 
         # Clean up the textmove
         "".join(txt.split("e.p."))
@@ -784,8 +1256,9 @@ class ChessBoard:
 
         return (h_piece, h_file, h_rank, dest_x, dest_y, promotion)
 
-    def _formatTextMove(self, move, format):
+    def _formatTextMove(self, move, format, hints=None):
         #piece, from, to, take, promotion, check
+        #hints are the SAN_FILE and SAN_RANK flags, found from the valid moves if not given
 
         piece = move.piece
         fpos = move.from_pos
@@ -835,9 +1308,6 @@ class ChessBoard:
             pt = ""
             if promo:
                 pt = "=%s" % promo.upper()
-            p = piece
-            if self._turn == self.BLACK:
-                p = p.lower()
             if piece == "P":
                 piece = ""
             if not check:
@@ -845,22 +1315,141 @@ class ChessBoard:
             fx, fy = fpos
             hint_f = ""
             hint_r = ""
-            for y in range(8):
-                for x in range(8):
-                    if self._board[y][x] == p:
-                        if x == fx and y == fy:
-                            continue
-                        vm = self.getValidMoves((x, y))
-                        if tpos in vm:
-                            if fx == x:
-                                hint_r = ranks[fy]
-                            else:
-                                hint_f = files[fx]
+            if hints is None:
+                for m in self.generateLegalMoves():
+                    if m.to_pos == tpos and m.piece == move.piece and m.from_pos != fpos:
+                        if fx == m.from_pos[0]:
+                            hint_r = ranks[fy]
+                        else:
+                            hint_f = files[fx]
+            else:
+                if hints & SAN_RANK:
+                    hint_r = ranks[fy]
+                if hints & SAN_FILE:
+                    hint_f = files[fx]
             if piece == "" and take:
                 hint_f = files[fx]
             res = "%s%s%s%s%s%s%s%s" % (piece, hint_f, hint_r, tc, files[tpos[0]], ranks[tpos[1]], pt, check)
         return res
 
+    def _san_hints(self, piece, fromPos, toPos):
+        # Finds the SAN_FILE and SAN_RANK flags for a move of the player to move,
+        # the same way _formatTextMove does from the valid moves: other pieces of
+        # the same kind that can also go to toPos. Kings and pawns never need them.
+        if piece not in "NBRQ":
+            return 0
+        bits = self._bits
+        if self._turn == self.BLACK:
+            piece = piece.lower()
+        tsq = toPos[1] * 8 + toPos[0]
+        others = bits.pieceBits(piece) & ~BITS[fromPos[1] * 8 + fromPos[0]]
+        if not others:
+            return 0
+
+        p = piece.upper()
+        if p == 'N':
+            others &= KNIGHT_ATTACKS[tsq]
+        elif p == 'B':
+            others &= bishopAttacks(tsq, bits.occupied)
+        elif p == 'R':
+            others &= rookAttacks(tsq, bits.occupied)
+        else:
+            others &= queenAttacks(tsq, bits.occupied)
+        if not others:
+            return 0
+
+        ksq, checkers, target, pins = self._legal_info()
+        if not BITS[tsq] & target:
+            return 0
+        hints = 0
+        for sq in iterBits(others):
+            if sq in pins and not pins[sq] & BITS[tsq]:
+                continue
+            if sq & 7 == fromPos[0]:
+                hints |= SAN_RANK
+            else:
+                hints |= SAN_FILE
+        return hints
+
+    def _text_move(self, ply, format):
+        # the text of the move leading to state ply, formatted once and then cached
+        history = self._state_stack
+        text = history.text(ply, format)
+        if text is None:
+            text = self._formatTextMove(self._moves[ply - 1], format, wordHints(history.word(ply)))
+            history.setText(ply, format, text)
+        return text
+
+    def _text_index(self):
+        # Maps the AN, LAN and SAN text of every valid move, without check marks,
+        # to (fromPos, toPos, promotion value). The texts are the ones _formatTextMove
+        # makes, and the index is kept until the position key changes.
+        if self._text_lookup is not None and self._text_lookup[0] == self._key:
+            return self._text_lookup[1]
+
+        board = self._board
+        codes = self.generateLegalMoveCodes()
+
+        # where every kind of piece can reach each square from, for SAN hints
+        sources = {}
+        for code in codes:
+            fsq = code & 63
+            entry = (board[fsq >> 3][fsq & 7], (code >> 6) & 63)
+            if entry in sources:
+                sources[entry].append(fsq)
+            else:
+                sources[entry] = [fsq]
+
+        index = {}
+        for code in codes:
+            fsq, tsq, flag = decodeMove(code)
+            fromPos = COORDS[fsq]
+            toPos = COORDS[tsq]
+            fname = SQUARE_NAMES[fsq]
+            tname = SQUARE_NAMES[tsq]
+            index[fname + tname] = (fromPos, toPos, 0)
+            if flag == ChessMove.KING_CASTLE_MOVE:
+                index["O-O"] = (fromPos, toPos, 0)
+                continue
+            if flag == ChessMove.QUEEN_CASTLE_MOVE:
+                index["O-O-O"] = (fromPos, toPos, 0)
+                continue
+
+            piece = board[fromPos[1]][fromPos[0]]
+            take = board[toPos[1]][toPos[0]] != '.' or flag == ChessMove.EP_CAPTURE_MOVE
+            promotion = 0
+            pt = ""
+            if flag >= PROMOTION_FLAG:
+                promotion = flag - PROMOTION_FLAG + 1
+                pt = "=" + PROMOTION_PIECES[flag - PROMOTION_FLAG]
+
+            if piece in "Pp":
+                p = ""
+                hint = ""
+                if take:
+                    hint = fname[0]
+            else:
+                p = piece.upper()
+                hint_f = ""
+                hint_r = ""
+                for other in sources[(piece, tsq)]:
+                    if other != fsq:
+                        if other & 7 == fsq & 7:
+                            hint_r = fname[1]
+                        else:
+                            hint_f = fname[0]
+                hint = hint_f + hint_r
+
+            if take:
+                index[p + fname + "x" + tname + pt] = (fromPos, toPos, promotion)
+                index[p + hint + "x" + tname + pt] = (fromPos, toPos, promotion)
+            else:
+                index[p + fname + "-" + tname + pt] = (fromPos, toPos, promotion)
+                index[p + hint + tname + pt] = (fromPos, toPos, promotion)
+
+        self._text_lookup = (self._key, index)
+        return index
+
     def _get_last_move(self):
         if self._state_stack_pointer <= 1:  # No move has been done at thos pointer
             return None
@@ -891,11 +1480,13 @@ class ChessBoard:
         self._black_queen_castle = True
         self._ep = [0, 0]
         self._fifty = 0
-        self._three_rep_stack = []
-        self._state_stack = []
-        self._moves = []
+        self._state_stack = GameHistory()
+        self._moves = MoveList(self._state_stack)
+        self._undo_stack = []
         self._reason = 0
         self._game_result = 0
+        self._bits = BitBoard(self._board)
+        self._key = self._compute_key()
         self._push_state()
         self._update_king_locations()
 
@@ -903,111 +1494,92 @@ class ChessBoard:
         """
         Sets the board and states according to a Forsyth-Edwards Notation string.
         Ex. 'rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2'
+        Raises ValueError and leaves the board as it was if the FEN is invalid.
         """
-        self._three_rep_stack = []
-        self._state_stack = []
-        self._moves = []
+        squares, turn, castling, ep, fifty = parseFEN(fen)
+
         self._reason = 0
         self._game_result = 0
 
-        fparts = fen.split()
-        newstate = ""
+        for r in range(8):
+            self._board[r][:] = squares[r * 8:(r + 1) * 8]
+        self._bits.setBoard(self._board)
 
-        #BOARD
-        for c in fparts[0]:
-            if c in "kqrnbpKQRNBP":
-                newstate += c
-            elif c in "12345678":
-                newstate += '.' * int(c)
-        #TURN
-        newstate += str("wb".index(fparts[1]))
-
-        #CASTLING
-        kq = "KQkq"
-        for p in kq:
-            if p in fparts[2]:
-                newstate += "1"
-            else:
-                newstate += "0"
+        self._turn = turn
+        self._white_king_castle, self._white_queen_castle, self._black_king_castle, self._black_queen_castle = \
+            castling
 
-        #EN PASSANT
-        if len(fparts[3]) == 2:
-            newstate += str("abcdefgh".index(fparts[3][0].lower()))
-            newstate += str("87654321".index(fparts[3][1]))
+        #EN PASSANT (stored as the location of the pawn that can be taken)
+        if ep is not None:
+            self._ep[0] = ep[0]
+            self._ep[1] = ep[1] + 1 - 2 * turn
         else:
-            newstate += "00"
-
-        #GAME RESULT
-        newstate += "0"
-
-        #HALF COUNT
-        newstate += ":%s" % fparts[4]
-
-        self._state_stack.append(newstate)
-        self._state_stack_pointer = 1
-        self._load_cur_state()
+            self._ep[0] = 0
+            self._ep[1] = 0
 
-        three_state = [self._white_king_castle,
-                       self._white_queen_castle,
-                       self._black_king_castle,
-                       self._black_queen_castle,
-                       deepcopy(self._board),
-                       deepcopy(self._ep)]
-
-        self._three_rep_stack.append(three_state)
+        self._fifty = fifty
 
+        self._key = self._compute_key()
+        self._undo_stack = []
         self._update_king_locations()
 
+        self._state_stack = GameHistory()
+        self._moves = MoveList(self._state_stack)
+        self._state_stack_pointer = 0
+        self._push_state()
+
     def getFEN(self):
         """
         Returns the current state as Forsyth-Edwards Notation string.
         """
-        s = self._state_stack[self._state_stack_pointer - 1]
-
-        b = s[:64]
-        v = s[64:72]
-        fifty = s[73:]
+        if self._undo_stack:
+            return self._format_fen()
+        # the board is at a state of the history, the FEN of the last one asked for is kept
+        ply = self._state_stack_pointer - 1
+        cached = self._fen
+        if cached is not None and cached[0] == ply and cached[1] == self._key:
+            return cached[2]
+        fen = self._format_fen()
+        self._fen = (ply, self._key, fen)
+        return fen
+
+    def fensFromGame(self):
+        """
+        Returns a list with the FEN of every state of the game, from the first position
+        to the last, made in one pass over the moves. The board is back at the current
+        state afterwards, but like gotoMove this drops moves made with makeMove.
+        """
+        pointer = self._state_stack_pointer
+        self.gotoFirst()
+        fens = [self.getFEN()]
+        while self.redo():
+            fens.append(self.getFEN())
+        self.gotoMove(pointer - 1)
+        return fens
 
-        rows = []
-        for i in range(8):
-            row = b[i * 8:(i + 1) * 8]
-            cnt = 0;
-            res = ""
-            for c in row:
-                if c == ".":
-                    cnt += 1
-                else:
-                    if cnt:
-                        res += str(cnt);
-                        cnt = 0
-                    res += c
-            if cnt:
-                res += str(cnt)
-            rows.append(res)
-        board = "/".join(rows)
+    def _format_fen(self):
+        board = "/".join(["".join(row) for row in self._board])
+        for n in range(8, 0, -1):
+            board = board.replace("." * n, str(n))
 
-        turn = (["w", "b"])[int(v[0])]
+        turn = (["w", "b"])[self._turn]
 
         kq = ""
-        if int(v[1]): kq += "K"
-        if int(v[2]): kq += "Q"
-        if int(v[3]): kq += "k"
-        if int(v[4]): kq += "q"
+        if self._white_king_castle: kq += "K"
+        if self._white_queen_castle: kq += "Q"
+        if self._black_king_castle: kq += "k"
+        if self._black_queen_castle: kq += "q"
         if not kq:
             kq = "-"
 
-        x = int(v[5])
-        y = int(v[6])
         ep = "-"
-        if not (x == 0 and y == 0):
-            if turn == "b" and (self._board[y][x - 1] == 'p' or self._board[y][x + 1] == 'p'):
-                ep = "%s%s" % ( ("abcdefgh")[x], ("87654321")[y + 1])
-            elif turn == "w" and (self._board[y][x - 1] == 'P' or self._board[y][x + 1] == 'P'):
-                ep = "%s%s" % ( ("abcdefgh")[x], ("87654321")[y - 1])
+        target = self.getEnPassantSquare()
+        if target is not None:
+            ep = "%s%s" % ( ("abcdefgh")[target[0]], ("87654321")[target[1]])
 
         move = (self._state_stack_pointer + 1) / 2
 
-        return "%s %s %s %s %s %d" % (board, turn, kq, ep, fifty, move)
+        return "%s %s %s %s %d %d" % (board, turn, kq, ep, self._fifty, move)
 
     def getMoveCount(self):
         """
@@ -1080,6 +1652,23 @@ class ChessBoard:
         """
         self._promotion_value = promotion
 
+    def getPositionKey(self):
+        """
+        Returns a 64 bit Zobrist key for the current position. It covers the pieces, the player to move,
+        the castling rights and the en passant file, and is the same for equal positions in any game.
+        """
+        return self._key
+
+    def getNormalizedKey(self):
+        """
+        Returns the key of getPositionKey with the en passant file only counted when a pawn can
+        take en passant, like getFEN does. A position then has the same key whether it was reached
+        by a double pawn push, by other moves or loaded with setFEN.
+        """
+        if self._ep[1] != 0 and self.getEnPassantSquare() is None:
+            return self._key ^ ZOBRIST_EP[self._ep[0]]
+        return self._key
+
     def getPromotion(self):
         """
         Returns the current promotion value.
@@ -1091,12 +1680,18 @@ class ChessBoard:
         """
         Returns True if the current players king is checked.
         """
-        if self._turn == self.WHITE:
-            kx, ky = self._white_king_location
-        else:
-            kx, ky = self._black_king_location
+        ksq = self._bits.kingSquare(self._turn)
+        if ksq < 0:
+            return False
+        return self._bits.attackersTo(ksq, 1 - self._turn) != 0
 
-        return self._is_threatened(kx, ky, self._turn)
+    def attackersOf(self, square, color):
+        """
+        Returns a list with the locations of all pieces of the given color (0=WHITE, 1=BLACK) that attack
+        the square. The square argument must be a tuple containing an x, y value Ex. (4, 4)
+        """
+        x, y = square
+        return [COORDS[sq] for sq in iterBits(self._bits.attackersTo(y * 8 + x, color))]
 
     def isGameOver(self):
         """
@@ -1120,7 +1715,17 @@ class ChessBoard:
         K=King, Q=Queen, B=Bishop, N=Night, R=Rook, P=Pawn.
         Empty squares are markt with a period (.)
         """
-        return deepcopy(self._board)
+        return [row[:] for row in self._board]
+
+    def getBoardView(self):
+        """
+        Returns a read only BoardView of the current board layout, which is not copied.
+        Use it instead of getBoard when the layout is only read. The same view is returned
+        until the board moves to another position.
+        """
+        if self._view is None or self._view._key != self._key:
+            self._view = BoardView(self)
+        return self._view
 
     def getTurn(self):
         """
@@ -1128,6 +1733,35 @@ class ChessBoard:
         """
         return self._turn
 
+    def getCastlingRights(self):
+        """
+        Returns the castling rights as four booleans in the order white king side, white queen side,
+        black king side and black queen side.
+        """
+        return (self._white_king_castle, self._white_queen_castle, self._black_king_castle, self._black_queen_castle)
+
+    def getEnPassantSquare(self):
+        """
+        Returns the (x, y) location a pawn can take en passant on, or None.
+        Like in getFEN the square is only given when a pawn is next to the one that moved.
+        """
+        x, y = self._ep
+        if x == 0 and y == 0:
+            return None
+        row = self._board[y]
+        if self._turn == self.BLACK:
+            if x > 0 and row[x - 1] == 'p' or x < 7 and row[x + 1] == 'p':
+                return (x, y + 1)
+        elif x > 0 and row[x - 1] == 'P' or x < 7 and row[x + 1] == 'P':
+            return (x, y - 1)
+        return None
+
+    def getHalfmoveClock(self):
+        """
+        Returns the number of halfmoves since the last capture or pawn move, for the fifty moves rule.
+        """
+        return self._fifty
+
     def getReason(self):
         """
         Returns the reason to why addMove returned False.
@@ -1149,29 +1783,172 @@ class ChessBoard:
         if x < 0 or x > 7 or y < 0 or y > 7:
             return False
 
-        self._update_king_locations()
-
         if self._get_color(x, y) != self._turn:
             return []
 
+        cache = self._move_cache
+        if cache is not None:
+            entry = (self._key, y * 8 + x)
+            moves = cache.get(entry)
+            if moves is not None:
+                return list(moves)
+
         p = self._board[y][x].upper()
         if p == 'P':
-            m, s = self.getValidPawnMoves(location)
-            return m
+            moves, s = self.getValidPawnMoves(location)
         elif p == 'R':
-            return self.getValidRookMoves(location)
+            moves = self.getValidRookMoves(location)
         elif p == 'B':
-            return self.getValidBishopMoves(location)
+            moves = self.getValidBishopMoves(location)
         elif p == 'Q':
-            return self.getValidQueenMoves(location)
+            moves = self.getValidQueenMoves(location)
         elif p == 'K':
-            m, s = self.getValidKingMoves(location)
-            return m
+            moves, s = self.getValidKingMoves(location)
         elif p == 'N':
-            return self.getValidKnightMoves(location)
+            moves = self.getValidKnightMoves(location)
         else:
             return []
 
+        if cache is not None:
+            cache.put(entry, tuple(moves))
+        return moves
+
+    def setMoveCache(self, cache):
+        """
+        Sets a MoveCache that getValidMoves keeps its results in, or None to stop caching.
+        The cache is keyed by position, so moves and history navigation never find stale
+        results, and one cache can be shared by several boards.
+        """
+        self._move_cache = cache
+
+    def getMoveCache(self):
+        """
+        Returns the MoveCache set with setMoveCache, or None.
+        """
+        return self._move_cache
+
+    def generateLegalMoves(self):
+        """
+        Returns a list of all valid moves for the current player as ChessMove objects, with the piece,
+        from_pos, to_pos, take, promotion and special_move_type set. A pawn promotion gives one move
+        for each promotion piece. The moves come in the same order as calling getValidMoves for every
+        square row by row. An empty list is returned if the game is over.
+        """
+        code_move = self._code_move
+        return [code_move(code) for code in self.generateLegalMoveCodes()]
+
+    def generateLegalMoveCodes(self, mode=ALL_MOVES):
+        """
+        Returns the moves of generateLegalMoves as an array('H') of 16 bit move codes
+        (from square | to square << 6 | flag << 12, see BitBoard.encodeMove).
+        This is the allocation free way to walk the moves, they can be passed to makeMove as they are.
+        With a mode other than ALL_MOVES only the moves of iterLegalMoveCodes for that mode are
+        returned, in its order.
+        """
+        codes = array('H')
+        if self._game_result:
+            return codes
+        if mode != self.ALL_MOVES:
+            codes.extend(self.iterLegalMoveCodes(mode))
+            return codes
+
+        ksq, checkers, target, pins = self._legal_info()
+        board = self._board
+        own = self._bits.colors[self._turn]
+        append = codes.append
+
+        for sq in iterBits(own):
+            fromPos = COORDS[sq]
+            p = board[fromPos[1]][fromPos[0]].upper()
+            if sq == ksq:
+                for toPos, t in self._king_moves(ksq):
+                    append(sq | (toPos[1] * 8 + toPos[0]) << 6 | t << 12)
+                continue
+
+            mask = target
+            if sq in pins:
+                mask &= pins[sq]
+            if not mask:
+                continue
+
+            if p == 'P':
+                moves, specialMoves = self._pawn_moves(fromPos)
+                for toPos in moves:
+                    tsq = toPos[1] * 8 + toPos[0]
+                    t = specialMoves.get(toPos, ChessMove.NORMAL_MOVE)
+                    if t == ChessMove.EP_CAPTURE_MOVE:
+                        if not self._ep_capture_is_safe(fromPos, toPos, ksq):
+                            continue
+                    elif not BITS[tsq] & mask:
+                        continue
+                    if toPos[1] == 0 or toPos[1] == 7:
+                        for flag in (PROMOTION_FLAG, PROMOTION_FLAG + 1, PROMOTION_FLAG + 2, PROMOTION_FLAG + 3):
+                            append(sq | tsq << 6 | flag << 12)
+                    else:
+                        append(sq | tsq << 6 | t << 12)
+                continue
+
+            if p == 'N':
+                for b, toPos in KNIGHT_TARGETS[sq]:
+                    if b & mask and not b & own:
+                        append(sq | (toPos[1] * 8 + toPos[0]) << 6)
+                continue
+
+            if p == 'R':
+                moves = self._slider_moves(fromPos, ROOK_DIRECTIONS)
+            elif p == 'B':
+                moves = self._slider_moves(fromPos, BISHOP_DIRECTIONS)
+            else:
+                moves = self._slider_moves(fromPos, QUEEN_DIRECTIONS)
+            for toPos in moves:
+                tsq = toPos[1] * 8 + toPos[0]
+                if BITS[tsq] & mask:
+                    append(sq | tsq << 6)
+
+        return codes
+
+    def iterLegalMoveCodes(self, mode=ALL_MOVES):
+        """
+        Yields legal move codes one at a time and a stage at a time, so a caller that has found
+        what it needs can stop without the rest being generated. The mode picks the moves:
+        ALL_MOVES gives the captures and promotions first, then the quiet moves.
+        CAPTURE_MOVES gives captures, en passant captures and promotions only, QUIET_MOVES the
+        other moves, castling included.
+        EVASION_MOVES gives the moves out of check, king moves first, then captures of the
+        checking piece and then moves in between, and nothing if the player is not in check.
+        The board must not be changed until the iteration is done.
+        """
+        if self._game_result:
+            return
+        stage = self._stage_codes
+        if mode == self.ALL_MOVES:
+            stages = (stage(True), stage(False))
+        elif mode == self.CAPTURE_MOVES:
+            stages = (stage(True),)
+        elif mode == self.QUIET_MOVES:
+            stages = (stage(False),)
+        elif mode == self.EVASION_MOVES:
+            if not self._legal_info()[1]:
+                return
+            stages = (stage(None, True, False), stage(True, False, True), stage(False, False, True))
+        else:
+            raise ValueError("unknown move generation mode %r" % (mode,))
+        for codes in stages:
+            for code in codes:
+                yield code
+
+    def hasLegalMoves(self):
+        """
+        Returns True if the current player has a legal move. Moves are generated a piece at a
+        time and only until the first one is found, so this is much cheaper than asking for
+        all of them, which is what detecting mate and stalemate needs.
+        """
+        if self._game_result:
+            return False
+        for code in self._stage_codes():
+            return True
+        return False
+
     def addMove(self, fromPos, toPos):
         """
         Tries to move the piece located om fromPos to toPos. Returns True if that was a valid move.
@@ -1179,7 +1956,10 @@ class ChessBoard:
         This method also detects game over.
 
         If this method returns False you can use the getReason method to determin why.
+        Raises RuntimeError if moves done with makeMove have not been taken back with unmakeMove,
+        the game history can only hold positions reached with addMove.
         """
+        self._check_no_made_moves()
         self._reason = 0
         #                piece,from,to,take,promotion,check,specialmove
         self._cur_move = ChessMove()
@@ -1188,8 +1968,6 @@ class ChessBoard:
             self._result = self.GAME_IS_OVER
             return False
 
-        self._update_king_locations()
-
         fx, fy = fromPos
         tx, ty = toPos
 
@@ -1224,6 +2002,7 @@ class ChessBoard:
         # Call the correct handler
         p = self._board[fy][fx].upper()
         self._cur_move.piece = p
+        hints = self._san_hints(p, fromPos, toPos)
         if p == 'P':
             if not self.movePawn((fx, fy), (tx, ty)):
                 if not self._reason:
@@ -1256,6 +2035,7 @@ class ChessBoard:
             self._turn = self.BLACK
         else:
             self._turn = self.WHITE
+        self._key ^= ZOBRIST_TURN
 
         if self.isCheck():
             self._cur_move.check = "+"
@@ -1275,11 +2055,64 @@ class ChessBoard:
             elif self._three_repetitions():
                 self._end_game(self.THREE_REPETITION_RULE)
 
-        self._push_state()
-        self._push_move()
+        self._push_state(self._cur_move, hints)
 
         return True
 
+    def makeMove(self, move):
+        """
+        Makes a move and switches the turn, remembering just enough to take it back with unmakeMove.
+        The move is a ChessMove (only from_pos, to_pos and promotion are used) or a 16 bit move code
+        from generateLegalMoveCodes, and must be valid, it is not checked. If no promotion piece is
+        given a pawn is promoted to a queen.
+        Unlike addMove this does not detect game over or add the move to the game history,
+        which makes it the fast path for search and analysis code. Take the moves back before
+        calling addMove again, history navigation (undo, redo, gotoMove) drops them.
+        """
+        if isinstance(move, ChessMove):
+            fromPos = move.from_pos
+            toPos = move.to_pos
+            promotion = move.promotion
+        else:
+            fromPos = COORDS[move & 63]
+            toPos = COORDS[(move >> 6) & 63]
+            promotion = None
+            if move >> 12 >= PROMOTION_FLAG:
+                promotion = PROMOTION_PIECES[(move >> 12) - PROMOTION_FLAG]
+        special = self._move_type(fromPos, toPos)
+
+        if special == ChessMove.PROMOTION_MOVE:
+            promotion = (promotion or 'Q').upper()
+            if self._turn == self.BLACK:
+                promotion = promotion.lower()
+        else:
+            promotion = None
+
+        self._undo_stack.append(self._make_move(fromPos, toPos, special, promotion))
+
+        self._turn = 1 - self._turn
+        self._key ^= ZOBRIST_TURN
+
+    def unmakeMove(self):
+        """
+        Takes back the latest move done with makeMove.
+        Returns True or False if there is no such move.
+        """
+        if not self._undo_stack:
+            return False
+        self._unmake_move(self._undo_stack.pop())
+        self._turn = 1 - self._turn
+        return True
+
+    def getLastMoveCode(self):
+        """
+        Returns the 16 bit move code of the latest move, as generateLegalMoveCodes gives it.
+        Returns None if no move has been done.
+        """
+        if self._state_stack_pointer <= 1:
+            return None
+        return self._state_stack.word(self._state_stack_pointer - 1) & 0xffff
+
     def getLastMoveType(self):
         """
         Returns a value that indicates if the last move was a "special move".
@@ -1312,7 +2145,17 @@ class ChessBoard:
         AN Examples: 'e2e4' 'f1d1' 'd7-d8' 'g1-f3'
         SAN Examples: 'e4' 'Rfxd1' 'd8=Q' 'Nxf3+'
         LAN Examples: 'Pe2e4' 'Rf1xd1' 'Pd7d8=Q' 'Ng1xf3+'
+        Raises RuntimeError like addMove.
         """
+        self._check_no_made_moves()
+        # the texts this board writes itself are looked up directly
+        move = self._text_index().get(txt.strip().rstrip("+#!?"))
+        if move is not None:
+            fromPos, toPos, promo = move
+            if promo:
+                self.setPromotion(promo)
+            return self.addMove(fromPos, toPos)
+
         res = self._parseTextMove(txt)
         if not res:
             self._reason = self.INVALID_MOVE
@@ -1326,28 +2169,25 @@ class ChessBoard:
         if not piece:
             return self.addMove((fx, fy), (tx, ty))
 
-        if self._turn == self.BLACK:
-            piece = piece.lower()
-
         move_to = None
         move_from = None
         found_move = False
-        for y in range(8):
-            for x in range(8):
-                if self._board[y][x] == piece:
-                    if fx > -1 and fx != x:
-                        continue
-                    if fy > -1 and fy != y:
-                        continue
-                    vm = self.getValidMoves((x, y))
-                    for m in vm:
-                        if m[0] == tx and m[1] == ty:
-                            if found_move:
-                                self._reason = self.AMBIGUOUS_MOVE
-                                return False
-                            found_move = True
-                            move_from = (x, y)
-                            move_to = (tx, ty)
+        for m in self.generateLegalMoves():
+            if m.piece != piece or m.to_pos[0] != tx or m.to_pos[1] != ty:
+                continue
+            x, y = m.from_pos
+            if fx > -1 and fx != x:
+                continue
+            if fy > -1 and fy != y:
+                continue
+            if found_move:
+                if m.from_pos == move_from:
+                    continue  # the same pawn promoting to another piece
+                self._reason = self.AMBIGUOUS_MOVE
+                return False
+            found_move = True
+            move_from = (x, y)
+            move_to = (tx, ty)
 
         if found_move:
             return self.addMove(move_from, move_to)
@@ -1363,22 +2203,7 @@ class ChessBoard:
         if self._state_stack_pointer <= 1:  # No move has been done at this pointer
             return None
 
-        res = []
-
-        point = self._state_stack_pointer
-
-        self.gotoFirst()
-        while True:
-            move = self._moves[self._state_stack_pointer - 1]
-            res.append(self._formatTextMove(move, format))
-            if self._state_stack_pointer >= len(self._state_stack) - 1:
-                break
-            self.redo()
-
-        self._state_stack_pointer = point
-        self._load_cur_state()
-
-        return res
+        return [self._text_move(ply, format) for ply in range(1, len(self._state_stack))]
 
     def getLastTextMove(self, format=1):
         """
@@ -1388,11 +2213,7 @@ class ChessBoard:
         if self._state_stack_pointer <= 1:  # No move has been done at this pointer
             return None
 
-        self.undo()
-        move = self._moves[self._state_stack_pointer - 1]
-        res = self._formatTextMove(move, format)
-        self.redo()
-        return res
+        return self._text_move(self._state_stack_pointer - 1, format)
 
     def printBoard(self):
         """
@@ -1411,14 +2232,7 @@ class ChessBoard:
         Prints the latest move as Algebraic chess notation.
         Print None if no moves has been made.
         """
-        if self._state_stack_pointer <= 1:  # No move has been done at this pointer
-            print 'Changed item'
-
-        self.undo()
-        move = self._moves[self._state_stack_pointer - 1]
-        res = self._formatTextMove(move, format)
-        self.redo()
-        print res
+        print self.getLastTextMove(format)
 
 
 if __name__ == "__main__":
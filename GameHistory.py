@@ -0,0 +1,204 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Packed game history for ChessBoard.
+#
+# Every state of a game (the start position and the position after each
+# halfmove) takes a 4 byte move word and an 8 byte position key. Every
+# KEYFRAME_INTERVAL states a full 36 byte snapshot of the position is
+# stored as well, and any other state is rebuilt by replaying the moves
+# since the nearest keyframe before it. That is 12 + 36 / 16 = 14.25
+# bytes per halfmove, see BYTES_PER_PLY.
+#####################################################################
+
+import struct
+import sys
+
+from BitBoard import COORDS, PIECES, PROMOTION_FLAG, PROMOTION_PIECES, decodeMove
+
+# ChessMove.PROMOTION_MOVE
+PROMOTION_MOVE = 3
+
+KEYFRAME_INTERVAL = 16
+
+KEY_SIZE = 8
+WORD_SIZE = 4
+FRAME_SIZE = 36
+BYTES_PER_PLY = KEY_SIZE + WORD_SIZE + float(FRAME_SIZE) / KEYFRAME_INTERVAL
+
+_KEY = struct.Struct("<Q")
+_WORD = struct.Struct("<I")
+# 32 bytes of board nibbles, turn and castling flags, en passant x | y << 3, fifty
+_FRAME = struct.Struct("<32sBBH")
+
+# Move word layout, from the lowest bit:
+#   0-15  the 16 bit move code, see BitBoard.encodeMove
+#   16-18 piece (1-6)       19    take               20-21 check (1 +, 2 #)
+#   22    black moved       23-25 game result      26-27 SAN hints
+_MOVED_PIECES = " PNBRQK"
+_CHECKS = (None, "+", "#")
+
+# SAN hints, set when SAN has to give the file or rank the piece moved from
+SAN_FILE = 1
+SAN_RANK = 2
+
+
+def packMove(move, color, result, hints=0):
+    """
+    Returns the move word for a ChessMove made by the given color, that led to a
+    state with the given game result. move may be None for the first state.
+    """
+    word = result << 23
+    if move is None:
+        return word
+    word |= move.getCode() | _MOVED_PIECES.index(move.piece) << 16 | color << 22 | hints << 26
+    if move.take:
+        word |= 1 << 19
+    if move.check:
+        word |= _CHECKS.index(move.check) << 20
+    return word
+
+
+def unpackMove(word):
+    """
+    Returns (piece, from_pos, to_pos, take, promotion, check, special_move_type, color)
+    for a move word. The promotion letter is lower case for black.
+    """
+    fsq, tsq, flag = decodeMove(word & 0xffff)
+    color = (word >> 22) & 1
+    promotion = None
+    special = flag
+    if flag >= PROMOTION_FLAG:
+        special = PROMOTION_MOVE
+        promotion = PROMOTION_PIECES[flag - PROMOTION_FLAG]
+        if color:
+            promotion = promotion.lower()
+    return (_MOVED_PIECES[(word >> 16) & 7], COORDS[fsq], COORDS[tsq], bool(word & (1 << 19)),
+            promotion, _CHECKS[(word >> 20) & 3], special, color)
+
+
+def wordResult(word):
+    return (word >> 23) & 7
+
+
+def wordHints(word):
+    return (word >> 26) & 3
+
+
+class GameHistory:
+    """
+    The states of one game in three bytearrays: position keys, move words and
+    keyframes. len() is the number of states, so a game without moves has length 1.
+    Move texts are cached per state once they have been asked for.
+    """
+
+    def __init__(self):
+        self._keys = bytearray()
+        self._words = bytearray()
+        self._frames = bytearray()
+        self._texts = {}
+
+    def __len__(self):
+        return len(self._words) // WORD_SIZE
+
+    def append(self, key, word, board, turn, castling, ep, fifty):
+        """
+        Adds a state. board, turn, castling (four flags in KQkq order), ep and fifty
+        describe the position and are only stored when the state needs a keyframe.
+        """
+        n = len(self)
+        self._keys += _KEY.pack(key)
+        self._words += _WORD.pack(word)
+        if n % KEYFRAME_INTERVAL == 0:
+            self._frames += _pack_frame(board, turn, castling, ep, fifty)
+
+    def truncate(self, n):
+        """
+        Drops every state from index n on.
+        """
+        del self._keys[n * KEY_SIZE:]
+        del self._words[n * WORD_SIZE:]
+        del self._frames[((n + KEYFRAME_INTERVAL - 1) // KEYFRAME_INTERVAL) * FRAME_SIZE:]
+        for i in [i for i in self._texts if i >= n]:
+            del self._texts[i]
+
+    def key(self, i):
+        return _KEY.unpack_from(self._keys, i * KEY_SIZE)[0]
+
+    def keys(self, n):
+        """
+        Returns a tuple with the keys of the first n states.
+        """
+        return struct.unpack_from("<%dQ" % n, self._keys)
+
+    def word(self, i):
+        return _WORD.unpack_from(self._words, i * WORD_SIZE)[0]
+
+    def result(self, i):
+        return wordResult(self.word(i))
+
+    def text(self, i, format):
+        """
+        Returns the cached text of the move leading to state i in the given format, or None.
+        """
+        texts = self._texts.get(i)
+        if texts is None:
+            return None
+        return texts[format]
+
+    def setText(self, i, format, text):
+        texts = self._texts.get(i)
+        if texts is None:
+            texts = self._texts[i] = [None, None, None]
+        texts[format] = text
+
+    def frame(self, i):
+        """
+        Returns (index, board, turn, castling, ep, fifty) of the nearest keyframe at or
+        before state i, where board is a new 8x8 list of piece letters.
+        """
+        f = i // KEYFRAME_INTERVAL
+        nibbles, flags, ep, fifty = _FRAME.unpack_from(self._frames, f * FRAME_SIZE)
+        squares = []
+        for c in bytearray(nibbles):
+            squares.append(_SQUARES[c & 15])
+            squares.append(_SQUARES[c >> 4])
+        board = [squares[y * 8:y * 8 + 8] for y in range(8)]
+        castling = (flags >> 1 & 1, flags >> 2 & 1, flags >> 3 & 1, flags >> 4 & 1)
+        return (f * KEYFRAME_INTERVAL, board, flags & 1, castling, [ep & 7, ep >> 3], fifty)
+
+    def nbytes(self):
+        """
+        Returns the number of bytes used by the packed records and by the move texts cached
+        for the states, which are only there once texts have been asked for.
+        """
+        n = len(self._keys) + len(self._words) + len(self._frames)
+        if self._texts:
+            n += sys.getsizeof(self._texts)
+            for texts in self._texts.itervalues():
+                n += sys.getsizeof(texts) + sum(sys.getsizeof(t) for t in texts if t is not None)
+        return n
+
+    def recordBytes(self):
+        """
+        Returns the number of bytes used by the packed records alone.
+        """
+        return len(self._keys) + len(self._words) + len(self._frames)
+
+
+_SQUARES = "." + PIECES + "..."
+_NIBBLES = dict((p, i) for i, p in enumerate("." + PIECES))
+
+
+def _pack_frame(board, turn, castling, ep, fifty):
+    nibbles = bytearray(32)
+    i = 0
+    for row in board:
+        for x in range(0, 8, 2):
+            nibbles[i] = _NIBBLES[row[x]] | _NIBBLES[row[x + 1]] << 4
+            i += 1
+    flags = turn
+    for n, c in enumerate(castling):
+        if c:
+            flags |= 2 << n
+    return _FRAME.pack(bytes(nibbles), flags, ep[0] | ep[1] << 3, fifty)
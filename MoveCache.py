@@ -0,0 +1,92 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Least recently used cache for ChessBoard.getValidMoves.
+#
+# Entries are keyed by (position key, square), so a position reached
+# again through undo, redo, gotoMove or another move order finds its
+# moves, and a changed position can never find stale ones. The cache
+# is bounded by a number of entries, an estimated number of bytes, or
+# both, and the least recently used entries are dropped first.
+#
+# Usage:
+#   cache = MoveCache(maxEntries=10000)
+#   board.setMoveCache(cache)
+#   ...
+#   print cache.hits, cache.misses
+#####################################################################
+
+import sys
+from collections import OrderedDict
+
+# Estimated bytes an entry takes besides its value: the dict slot, the
+# OrderedDict link and the (key, square) tuple
+ENTRY_OVERHEAD = 200
+
+
+class MoveCache:
+    """
+    Maps (position key, square) to a tuple of moves. maxEntries and maxBytes bound the
+    number of entries and the estimated size of the cache, None leaves a bound out.
+    hits, misses and evictions count what happened since the cache was made or cleared.
+    """
+
+    def __init__(self, maxEntries=4096, maxBytes=None):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self._entries = OrderedDict()
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns the moves stored for key and marks them as recently used, or None.
+        """
+        entries = self._entries
+        value = entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        entries[key] = value
+        self.hits += 1
+        return value[0]
+
+    def put(self, key, moves):
+        """
+        Stores a tuple of moves for key, dropping the least recently used entries
+        while the cache is over one of its bounds.
+        """
+        entries = self._entries
+        old = entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        size = sys.getsizeof(moves) + ENTRY_OVERHEAD
+        entries[key] = (moves, size)
+        self.nbytes += size
+
+        while entries and ((self.maxEntries is not None and len(entries) > self.maxEntries) or
+                           (self.maxBytes is not None and self.nbytes > self.maxBytes)):
+            key, (moves, size) = entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def hitRate(self):
+        """
+        Returns the share of get calls that found their moves, 0.0 before the first one.
+        """
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return float(self.hits) / total
@@ -0,0 +1,240 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Opening book builder and memory mapped book reader for ChessBoard.
+#
+# The builder plays the first plies of every finished game of a corpus
+# and counts the wins, draws and losses of every move from every
+# position, for the side that made it. The book file is an 8 byte
+# header followed by 16 byte records of position key, move code, wins,
+# draws and losses, sorted by key and move. BookReader maps the file
+# and finds the records of a position by binary search, so a book is
+# shared between processes through the page cache instead of being
+# loaded into each of them.
+#
+# Usage:
+#   python OpeningBook.py games/ book.bin [--plies N] [--min-games N]
+#   python OpeningBook.py --probe book.bin [--fen "<fen>"]
+#####################################################################
+
+import argparse
+import mmap
+import os
+import struct
+
+from ChessBoard import ChessBoard
+from PGNReader import tokenize
+from Perft import moveName
+from Validate import findFiles, readJobs
+
+MAGIC = "CBBOOK1\0"
+RECORD = struct.Struct("<QHHHH")
+
+# result of a game from white's side: (white wins, draws, black wins)
+_RESULTS = {"1-0": (1, 0, 0), "1/2-1/2": (0, 1, 0), "0-1": (0, 0, 1)}
+_MAX_COUNT = 0xffff
+
+
+def gameResult(movetext):
+    """
+    Returns the result token that ends a PGN movetext, or None if it has none.
+    """
+    tokens = movetext.rsplit(None, 1)
+    if tokens and tokens[-1] in _RESULTS:
+        return tokens[-1]
+    return None
+
+
+def buildBook(jobs, path, plies=20, minGames=1, errors=None):
+    """
+    Plays the first plies of the (game_id, fen, movetext) jobs of Validate.readJobs that end
+    with a result, up to their first illegal move, and writes the moves played in at least
+    minGames of them to a book file. Games whose FEN setFEN rejects are skipped and added to
+    the errors list as (game_id, reason) if one is given. Returns (games, records).
+    """
+    counts = {}
+    board = ChessBoard()
+    games = 0
+    for gameId, fen, movetext in jobs:
+        result = gameResult(movetext)
+        if result is None:
+            continue
+        board.resetBoard()
+        if fen:
+            try:
+                board.setFEN(fen)
+            except ValueError, e:
+                if errors is not None:
+                    errors.append((gameId, str(e)))
+                continue
+        games += 1
+        white = _RESULTS[result]
+        black = (white[2], white[1], white[0])
+        ply = 0
+        for move in tokenize(movetext):
+            if ply >= plies:
+                break
+            key = board.getNormalizedKey()
+            turn = board.getTurn()
+            if not board.addTextMove(move):
+                break
+            entry = (key, board.getLastMoveCode())
+            wdl = counts.get(entry)
+            if wdl is None:
+                wdl = counts[entry] = [0, 0, 0]
+            for i, n in enumerate(black if turn else white):
+                wdl[i] += n
+            ply += 1
+
+    records = 0
+    f = open(path + ".part", "wb")
+    try:
+        f.write(MAGIC)
+        for key, code in sorted(counts):
+            wdl = counts[(key, code)]
+            if sum(wdl) < minGames:
+                continue
+            f.write(RECORD.pack(key, code, *_fit(wdl)))
+            records += 1
+    finally:
+        f.close()
+    os.rename(path + ".part", path)
+    return games, records
+
+
+def _fit(wdl):
+    # scales counts down to 16 bits, keeping their ratios
+    top = max(wdl)
+    if top <= _MAX_COUNT:
+        return wdl
+    return [n * _MAX_COUNT // top for n in wdl]
+
+
+class BookMove:
+    """
+    A book move: the 16 bit move code and the wins, draws and losses of the side making it.
+    """
+
+    def __init__(self, code, wins, draws, losses):
+        self.code = code
+        self.wins = wins
+        self.draws = draws
+        self.losses = losses
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        """
+        Returns the share of the points the side making the move got, from 0.0 to 1.0.
+        """
+        games = self.games()
+        if not games:
+            return 0.0
+        return (self.wins + self.draws / 2.0) / games
+
+
+class BookReader:
+    """
+    Looks up moves in a book file made by buildBook, which is memory mapped, not read.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(MAGIC) or (size - len(MAGIC)) % RECORD.size:
+            self._file.close()
+            raise ValueError("not a book file: %r" % path)
+        self._map = None
+        self.records = (size - len(MAGIC)) // RECORD.size
+        if self.records:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._map[:len(MAGIC)] != MAGIC:
+                self.close()
+                raise ValueError("not a book file: %r" % path)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _key(self, i):
+        return struct.unpack_from("<Q", self._map, len(MAGIC) + i * RECORD.size)[0]
+
+    def moves(self, board):
+        """
+        Returns the BookMove list of a ChessBoard's current position, or of a position key from
+        getNormalizedKey, most played first. The list is empty for positions the book does not know.
+        """
+        if isinstance(board, ChessBoard):
+            key = board.getNormalizedKey()
+        else:
+            key = board
+        if not self.records:
+            return []
+
+        # the first record with the key
+        lo = 0
+        hi = self.records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        moves = []
+        while lo < self.records:
+            k, code, wins, draws, losses = RECORD.unpack_from(self._map, len(MAGIC) + lo * RECORD.size)
+            if k != key:
+                break
+            moves.append(BookMove(code, wins, draws, losses))
+            lo += 1
+        moves.sort(key=lambda m: -m.games())
+        return moves
+
+    def bestMove(self, board):
+        """
+        Returns the move code of the most played book move, or None.
+        """
+        moves = self.moves(board)
+        if not moves:
+            return None
+        return moves[0].code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds or probes an opening book.")
+    parser.add_argument("path", help="games to build from, or the book file with --probe")
+    parser.add_argument("book", nargs="?", default=None, help="book file to write")
+    parser.add_argument("--plies", type=int, default=20, help="plies of every game to use")
+    parser.add_argument("--min-games", type=int, default=1, help="games a move must be played in")
+    parser.add_argument("--probe", action="store_true", help="list the book moves of a position")
+    parser.add_argument("--fen", default=None, help="position to probe, the start position by default")
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        board = ChessBoard()
+        if args.fen:
+            board.setFEN(args.fen)
+        reader = BookReader(args.path)
+        try:
+            for m in reader.moves(board):
+                print "%s games %d score %.3f" % (moveName(m.code), m.games(), m.score())
+        finally:
+            reader.close()
+        return 0
+
+    if args.book is None:
+        parser.error("a book file to write is needed")
+    errors = []
+    games, records = buildBook(readJobs(findFiles(args.path)), args.book, args.plies, args.min_games, errors)
+    for gameId, reason in errors:
+        print "%s skipped: %s" % (gameId, reason)
+    print "%d games %d records" % (games, records)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
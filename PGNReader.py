@@ -0,0 +1,207 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Streaming PGN reader for ChessBoard.
+#
+# Games are read one at a time, so a file of any size is read in
+# constant memory. Gzip compressed files are read the same way. The
+# tag pairs of a game are parsed when the game is read, the movetext
+# is only kept as text until the moves are asked for.
+#
+# Usage:
+#   for game in PGNReader("games.pgn.gz"):
+#       if game.headers.get("Result") == "1-0":
+#           board = game.replay()
+#####################################################################
+
+import gzip
+import re
+from collections import OrderedDict
+
+from ChessBoard import ChessBoard
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|[^\s(){};$]+')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+
+
+def tokenize(movetext, comments=False, variations=False):
+    """
+    Yields the moves of a PGN movetext, without move numbers, annotations and the result.
+    Comments ('{...}' and ';...') are yielded as they are when comments is True, and
+    variations are yielded as '(' and ')' tokens around their moves when variations is True.
+    Otherwise both are skipped.
+    """
+    depth = 0
+    for m in _TOKEN.finditer(movetext):
+        token = m.group()
+        c = token[0]
+        if c == '{' or c == ';':
+            if comments and (depth == 0 or variations):
+                yield token
+            continue
+        if c == '(':
+            depth += 1
+            if variations:
+                yield token
+            continue
+        if c == ')':
+            if depth:
+                depth -= 1
+            if variations:
+                yield token
+            continue
+        if depth and not variations:
+            continue
+        if c == '$':
+            continue
+        if c.isdigit():
+            if token in RESULTS:
+                continue
+            token = _MOVE_NUMBER.sub("", token)
+            if not token:
+                continue
+        elif token == '*':
+            continue
+        token = token.rstrip("!?")
+        if token.startswith("0-0"):
+            token = token.replace("0", "O")
+        if token:
+            yield token
+
+
+class PGNGame:
+    """
+    One game of a PGN file: the tag pairs in the headers OrderedDict, the movetext
+    and the line number the game starts at.
+    """
+
+    def __init__(self, headers, movetext, line=0):
+        self.headers = headers
+        self.movetext = movetext
+        self.line = line
+        # (ply, reason) of the first move replay could not make, see replay()
+        self.error = None
+
+    def moves(self):
+        """
+        Returns the list of moves of the main line as text.
+        """
+        return list(tokenize(self.movetext))
+
+    def replay(self, board=None):
+        """
+        Plays the main line on a ChessBoard, starting from the FEN tag if there is one.
+        Stops at the first move addTextMove rejects and records it in error as
+        (ply, reason), where ply counts from 0. Returns the board.
+        """
+        if board is None:
+            board = ChessBoard()
+        else:
+            board.resetBoard()
+        fen = self.headers.get("FEN")
+        if fen:
+            board.setFEN(fen)
+
+        self.error = None
+        for ply, move in enumerate(tokenize(self.movetext)):
+            if not board.addTextMove(move):
+                self.error = (ply, board.getReason())
+                break
+        return board
+
+
+class PGNReader:
+    """
+    Iterates over the games of a PGN file. source is a path, a path ending in .gz,
+    or an open file object.
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def __iter__(self):
+        if not isinstance(self.source, basestring):
+            for game in readGames(self.source):
+                yield game
+            return
+
+        f = openFile(self.source)
+        try:
+            for game in readGames(f):
+                yield game
+        finally:
+            f.close()
+
+
+def openFile(path):
+    """
+    Opens a PGN file for reading, decompressing it if it is gzipped.
+    """
+    f = open(path, "rb")
+    magic = f.read(2)
+    f.seek(0)
+    if magic == "\x1f\x8b":
+        f.close()
+        return gzip.open(path, "rb")
+    return f
+
+
+def readGames(f):
+    """
+    Yields a PGNGame for every game in an open file, reading it line by line.
+    A tag block followed by a blank line and another tag block is a game without moves.
+    """
+    headers = OrderedDict()
+    movetext = []
+    start = 0
+    in_comment = False
+    after_tags = False  # a blank line ended a tag block with no movetext yet
+    line_no = 0
+    for line in f:
+        line_no += 1
+        s = line.strip()
+        if not s:
+            if headers and not movetext:
+                after_tags = True
+            continue
+        if in_comment:
+            movetext.append(s)
+            in_comment = _ends_in_comment(s, True)
+            continue
+        if s[0] == '%':
+            continue
+        if s[0] == '[':
+            if movetext or after_tags:
+                yield PGNGame(headers, "\n".join(movetext), start)
+                headers = OrderedDict()
+                movetext = []
+                after_tags = False
+            if not headers:
+                start = line_no
+            m = _TAG.match(s)
+            if m:
+                headers[m.group(1)] = m.group(2).replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        if not headers and not movetext:
+            start = line_no
+        movetext.append(s)
+        if '{' in s:
+            in_comment = _ends_in_comment(s, False)
+    if headers or movetext:
+        yield PGNGame(headers, "\n".join(movetext), start)
+
+
+def _ends_in_comment(line, inside):
+    # True if a brace comment is still open at the end of the line
+    for c in line:
+        if inside:
+            if c == '}':
+                inside = False
+        elif c == '{':
+            inside = True
+        elif c == ';':
+            break
+    return inside
@@ -0,0 +1,172 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Perft move generation benchmark and correctness suite for ChessBoard.
+#
+# Usage:
+#   python Perft.py --suite [--depth N]
+#   python Perft.py --fen "<fen>" --depth N [--divide] [--hash]
+#####################################################################
+
+import argparse
+import time
+
+from ChessBoard import ChessBoard, ChessMove
+
+# name, FEN and the known node counts for depth 1, 2, 3, ...
+SUITE = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+    ("en passant pinned", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", [18, 92, 1670, 10138]),
+    ("en passant discovered", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", [13, 102, 1266, 10276]),
+    ("en passant takes checker", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [15, 126, 1928, 13931]),
+    ("short castle gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", [15, 66, 1198, 6399]),
+    ("long castle gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [16, 71, 1286, 7418]),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [26, 1141, 27826, 1274206]),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [44, 1494, 50509, 1720476]),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", [11, 133, 1442, 19174]),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", [29, 165, 5160, 31961]),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", [9, 40, 472, 2661]),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", [6, 27, 273, 1329]),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", [2, 6, 13, 63]),
+    ("stalemate and checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", [10, 25, 268, 926]),
+    ("double check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", [37, 183, 6559, 23527]),
+]
+
+
+def perft(board, depth, cache=None):
+    """
+    Returns the number of leaf nodes of the legal move tree of the given depth.
+    cache is an optional dict that remembers the count of every (position key, depth)
+    seen, so repeated subtrees reached through transpositions are only walked once.
+    """
+    moves = board.generateLegalMoveCodes()
+    if depth <= 1:
+        if depth <= 0:
+            return 1
+        return len(moves)
+
+    if cache is not None:
+        entry = (board.getPositionKey(), depth)
+        if entry in cache:
+            return cache[entry]
+
+    nodes = 0
+    for m in moves:
+        board.makeMove(m)
+        nodes += perft(board, depth - 1, cache)
+        board.unmakeMove()
+
+    if cache is not None:
+        cache[entry] = nodes
+    return nodes
+
+
+def divide(board, depth, cache=None):
+    """
+    Returns a list of (move, nodes) pairs with the perft count below every root move,
+    where move is in long algebraic notation like 'e2e4' or 'a7a8q'.
+    """
+    result = []
+    for m in board.generateLegalMoveCodes():
+        board.makeMove(m)
+        nodes = perft(board, depth - 1, cache)
+        board.unmakeMove()
+        result.append((moveName(m), nodes))
+    return result
+
+
+def moveName(move):
+    """
+    Returns a ChessMove or a 16 bit move code in long algebraic notation.
+    """
+    if not isinstance(move, ChessMove):
+        move = ChessMove.fromCode(move)
+    files = "abcdefgh"
+    ranks = "87654321"
+    fx, fy = move.from_pos
+    tx, ty = move.to_pos
+    res = "%s%s%s%s" % (files[fx], ranks[fy], files[tx], ranks[ty])
+    if move.promotion:
+        res += move.promotion.lower()
+    return res
+
+
+def runSuite(maxDepth=3, maxNodes=None, useHash=False, out=None):
+    """
+    Runs perft on every position in SUITE up to maxDepth, skipping depths with more than
+    maxNodes known nodes. Returns a list of (name, depth, expected, found) for every mismatch.
+    """
+    failures = []
+    board = ChessBoard()
+    for name, fen, counts in SUITE:
+        for depth in range(1, min(maxDepth, len(counts)) + 1):
+            expected = counts[depth - 1]
+            if maxNodes is not None and expected > maxNodes:
+                break
+            board.setFEN(fen)
+            cache = None
+            if useHash:
+                cache = {}
+            start = time.time()
+            found = perft(board, depth, cache)
+            elapsed = time.time() - start
+            if found != expected:
+                failures.append((name, depth, expected, found))
+            if out is not None:
+                status = "ok" if found == expected else "FAILED (expected %d)" % expected
+                out.write("%-26s depth %d %10d nodes %8.2fs %10.0f nps %s\n" % (
+                    name, depth, found, elapsed, nodesPerSecond(found, elapsed), status))
+    return failures
+
+
+def nodesPerSecond(nodes, elapsed):
+    if elapsed <= 0:
+        return 0.0
+    return nodes / elapsed
+
+
+def main(argv=None):
+    import sys
+
+    parser = argparse.ArgumentParser(description="Perft for the ChessBoard move generator.")
+    parser.add_argument("--fen", default=SUITE[0][1], help="position to start from")
+    parser.add_argument("--depth", type=int, default=3, help="search depth in plies")
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--hash", action="store_true", help="cache the counts of repeated subtrees")
+    parser.add_argument("--suite", action="store_true", help="run the built in suite of positions")
+    parser.add_argument("--max-nodes", type=int, default=None, help="skip suite depths with more nodes")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        failures = runSuite(args.depth, args.max_nodes, args.hash, sys.stdout)
+        print "%d failures" % len(failures)
+        return 1 if failures else 0
+
+    board = ChessBoard()
+    board.setFEN(args.fen)
+    cache = None
+    if args.hash:
+        cache = {}
+
+    start = time.time()
+    if args.divide:
+        nodes = 0
+        for name, count in divide(board, args.depth, cache):
+            print "%s: %d" % (name, count)
+            nodes += count
+    else:
+        nodes = perft(board, args.depth, cache)
+    elapsed = time.time() - start
+
+    print "nodes %d time %.2fs nps %.0f" % (nodes, elapsed, nodesPerSecond(nodes, elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,232 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Feature plane export of ChessBoard positions, using NumPy.
+#
+# Every position becomes PLANES 8x8 uint8 planes: one per piece type
+# and color, then side to move, the four castling rights, the en
+# passant square and the fifty moves counter. Positions are encoded a
+# chunk at a time and written to memory mapped .npy shards, next to an
+# index of the game number and ply of every row and a list of game ids.
+#
+# Usage:
+#   python PlaneEncoder.py games.pgn out/ [--shard-size N]
+#####################################################################
+
+import argparse
+import os
+import time
+
+try:
+    import numpy
+    from numpy.lib.format import open_memmap
+except ImportError:
+    numpy = None
+
+from ChessBoard import ChessBoard
+from PGNReader import tokenize
+from Validate import findFiles, readJobs
+
+# Plane layout
+PIECE_PLANES = "PNBRQKpnbrqk"
+TURN_PLANE = 12  # ones when white is to move
+CASTLING_PLANES = 13  # 13-16, ones for each of KQkq that is still allowed
+EP_PLANE = 17  # a one on the en passant target square
+FIFTY_PLANE = 18  # the fifty moves counter on every square, at most 255
+PLANES = 19
+
+INDEX_DTYPE = [("game", "<i8"), ("ply", "<i4")]
+
+
+def _need_numpy():
+    if numpy is None:
+        raise ImportError("PlaneEncoder needs numpy")
+
+
+if numpy is not None:
+    # piece letter (as a byte) to piece plane, 255 for an empty square
+    _LETTER_PLANES = numpy.full(256, 255, numpy.uint8)
+    for _i, _p in enumerate(PIECE_PLANES):
+        _LETTER_PLANES[ord(_p)] = _i
+
+
+def _state(board):
+    # the parts of a position the planes are made of, read straight from the board
+    ep = board.getEnPassantSquare()
+    epsq = -1
+    if ep is not None:
+        epsq = ep[1] * 8 + ep[0]
+    return (board.getBoardView().toString(), board.getTurn(), board.getCastlingRights(), epsq,
+            board.getHalfmoveClock())
+
+
+def _encode(states):
+    # an n x PLANES x 8 x 8 array for a list of _state tuples
+    n = len(states)
+    squares, turns, castling, eps, fifties = zip(*states)
+    planes = numpy.zeros((n, PLANES, 64), numpy.uint8)
+
+    pieces = _LETTER_PLANES[numpy.frombuffer("".join(squares), numpy.uint8).reshape(n, 64)]
+    rows, sqs = numpy.nonzero(pieces != 255)
+    planes[rows, pieces[rows, sqs], sqs] = 1
+
+    planes[:, TURN_PLANE, :] = (numpy.array(turns, numpy.uint8) == 0)[:, None]
+    planes[:, CASTLING_PLANES:CASTLING_PLANES + 4, :] = numpy.array(castling, numpy.uint8)[:, :, None]
+    eps = numpy.array(eps)
+    rows = numpy.nonzero(eps >= 0)[0]
+    planes[rows, EP_PLANE, eps[rows]] = 1
+    planes[:, FIFTY_PLANE, :] = numpy.minimum(fifties, 255).astype(numpy.uint8)[:, None]
+    return planes.reshape(n, PLANES, 8, 8)
+
+
+def encodeBoard(board):
+    """
+    Returns the PLANES x 8 x 8 uint8 planes of the current position of a ChessBoard.
+    """
+    _need_numpy()
+    return _encode([_state(board)])[0]
+
+
+class PlaneWriter:
+    """
+    Writes the planes of positions to planes-NNNNN.npy shards of shardSize rows in a directory.
+    Next to every shard index-NNNNN.npy holds the game number and ply of each row, and
+    games.txt lists the game ids, the first line being game number 0. Positions are encoded
+    chunkSize at a time. Call close() to write out the last chunk and shard.
+    """
+
+    def __init__(self, directory, shardSize=65536, chunkSize=1024):
+        _need_numpy()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.shardSize = shardSize
+        self.chunkSize = chunkSize
+        self.positions = 0
+        self.shards = 0
+        self._games = open(os.path.join(directory, "games.txt"), "w")
+        self._game = -1
+        self._gameId = None
+        self._states = []
+        self._index = []
+        self._planes = None
+        self._rows = None
+        self._filled = 0
+
+    def add(self, board, gameId, ply):
+        """
+        Adds the current position of board as the given ply of the game with the given id.
+        """
+        if gameId != self._gameId:
+            self._game += 1
+            self._gameId = gameId
+            self._games.write("%s\n" % gameId)
+        self._states.append(_state(board))
+        self._index.append((self._game, ply))
+        if len(self._states) >= self.chunkSize:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._close_shard()
+        self._games.close()
+
+    def _flush(self):
+        # encodes the pending positions and copies them into the shards
+        if not self._states:
+            return
+        planes = _encode(self._states)
+        index = numpy.array(self._index, INDEX_DTYPE)
+        self._states = []
+        self._index = []
+        done = 0
+        while done < len(planes):
+            if self._planes is None:
+                self._open_shard()
+            n = min(len(planes) - done, self.shardSize - self._filled)
+            self._planes[self._filled:self._filled + n] = planes[done:done + n]
+            self._rows[self._filled:self._filled + n] = index[done:done + n]
+            self._filled += n
+            done += n
+            self.positions += n
+            if self._filled == self.shardSize:
+                self._close_shard()
+
+    def _path(self, name):
+        return os.path.join(self.directory, "%s-%05d.npy" % (name, self.shards))
+
+    def _open_shard(self):
+        self._planes = open_memmap(self._path("planes"), "w+", numpy.uint8, (self.shardSize, PLANES, 8, 8))
+        self._rows = open_memmap(self._path("index"), "w+", INDEX_DTYPE, (self.shardSize,))
+        self._filled = 0
+
+    def _close_shard(self):
+        if self._planes is None:
+            return
+        if self._filled < self.shardSize:
+            # the last shard is cut down to the rows it got
+            for name, full in (("planes", self._planes), ("index", self._rows)):
+                path = self._path(name)
+                part = open_memmap(path + ".part", "w+", full.dtype, (self._filled,) + full.shape[1:])
+                part[:] = full[:self._filled]
+                part.flush()
+                del part
+                os.rename(path + ".part", path)
+        self._planes = None
+        self._rows = None
+        self.shards += 1
+
+
+def exportGames(jobs, directory, shardSize=65536, chunkSize=1024, errors=None):
+    """
+    Replays the (game_id, fen, movetext) jobs of Validate.readJobs on a ChessBoard and writes
+    the planes of every position, from the first one up to the first illegal move, with a
+    PlaneWriter. Games whose FEN setFEN rejects are skipped and added to the errors list as
+    (game_id, reason) if one is given. Returns (games, positions).
+    """
+    writer = PlaneWriter(directory, shardSize, chunkSize)
+    board = ChessBoard()
+    games = 0
+    try:
+        for gameId, fen, movetext in jobs:
+            board.resetBoard()
+            if fen:
+                try:
+                    board.setFEN(fen)
+                except ValueError, e:
+                    if errors is not None:
+                        errors.append((gameId, str(e)))
+                    continue
+            games += 1
+            ply = 0
+            writer.add(board, gameId, ply)
+            for move in tokenize(movetext):
+                if not board.addTextMove(move):
+                    break
+                ply += 1
+                writer.add(board, gameId, ply)
+    finally:
+        writer.close()
+    return games, writer.positions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports the positions of a set of games as feature planes.")
+    parser.add_argument("path", help="a PGN or moves.txt style file, or a directory of them")
+    parser.add_argument("directory", help="directory to write the shards to")
+    parser.add_argument("--shard-size", type=int, default=65536, help="positions per shard")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    errors = []
+    games, positions = exportGames(readJobs(findFiles(args.path)), args.directory, args.shard_size, errors=errors)
+    for gameId, reason in errors:
+        print "%s skipped: %s" % (gameId, reason)
+    elapsed = time.time() - start
+    print "%d games %d positions time %.2fs %.0f positions/s" % (
+        games, positions, elapsed, positions / elapsed if elapsed > 0 else 0.0)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+# /usr/bin/env python
+
+# ####################################################################
+# SQLite index of the positions reached in a game corpus.
+#
+# Every position of every game is stored as a 64 bit hash of the
+# placement, turn, castling and en passant fields of its FEN, against
+# the game and the ply. The positions table is clustered on the hash,
+# so finding the games that reach a position is a single index range
+# read. Games are added in batches, and games that are already in the
+# index are skipped, so an index can be built up a file at a time.
+#
+# Usage:
+#   python PositionIndex.py index.db --add games/
+#   python PositionIndex.py index.db --find "<fen>"
+#####################################################################
+
+import argparse
+import hashlib
+import sqlite3
+import struct
+import time
+
+from ChessBoard import ChessBoard
+from PGNReader import tokenize
+from Validate import findFiles, readJobs
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    plies INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    PRIMARY KEY (hash, game, ply)
+) WITHOUT ROWID;
+"""
+
+_HASH = struct.Struct("<q")
+
+
+def positionHash(fen):
+    """
+    Returns the signed 64 bit hash of the first four fields of a FEN as getFEN writes them:
+    placement, turn, castling and en passant square. The move counts are left out.
+    """
+    fields = " ".join(fen.split()[:4])
+    return _HASH.unpack(hashlib.md5(fields).digest()[:8])[0]
+
+
+class PositionIndex:
+    """
+    A position index in the SQLite database at path, which is made if it does not exist.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._board = ChessBoard()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def hasGame(self, gameId):
+        return self._db.execute("SELECT 1 FROM games WHERE name = ?", (gameId,)).fetchone() is not None
+
+    def addGames(self, jobs, batchSize=1000, errors=None):
+        """
+        Replays the (game_id, fen, movetext) jobs of Validate.readJobs and adds every position
+        of every game up to its first illegal move. Games whose id is already in the index are
+        skipped, and so are games whose FEN setFEN rejects, which are added to the errors list
+        as (game_id, reason) if one is given. The rows of batchSize games are written in one
+        transaction. Returns (games, positions) added.
+        """
+        db = self._db
+        db.execute("PRAGMA synchronous = OFF")
+        games = 0
+        positions = 0
+        batch = []
+        pending = set()
+        try:
+            for gameId, fen, movetext in jobs:
+                if gameId in pending or self.hasGame(gameId):
+                    continue
+                try:
+                    hashes = self._replay(fen, movetext)
+                except ValueError, e:
+                    if errors is not None:
+                        errors.append((gameId, str(e)))
+                    continue
+                batch.append((gameId, hashes))
+                pending.add(gameId)
+                games += 1
+                positions += len(hashes)
+                if len(batch) >= batchSize:
+                    self._write(batch)
+                    batch = []
+                    pending.clear()
+            self._write(batch)
+        finally:
+            db.execute("PRAGMA synchronous = FULL")
+        return games, positions
+
+    def findGames(self, fen, limit=None):
+        """
+        Returns a list of (game_id, ply) for every time a game reached the position of the
+        FEN, ordered by the order the games were added. The FEN is read with setFEN, so its
+        en passant square only counts if a pawn can take there.
+        """
+        self._board.setFEN(fen)
+        sql = "SELECT games.name, positions.ply FROM positions JOIN games ON games.id = positions.game " \
+              "WHERE positions.hash = ? ORDER BY positions.game, positions.ply"
+        args = (positionHash(self._board.getFEN()),)
+        if limit is not None:
+            sql += " LIMIT ?"
+            args += (limit,)
+        return self._db.execute(sql, args).fetchall()
+
+    def _replay(self, fen, movetext):
+        # the position hashes of a game, from the first position to the first illegal move
+        board = self._board
+        board.resetBoard()
+        if fen:
+            board.setFEN(fen)
+        hashes = [positionHash(board.getFEN())]
+        for move in tokenize(movetext):
+            if not board.addTextMove(move):
+                break
+            hashes.append(positionHash(board.getFEN()))
+        return hashes
+
+    def _write(self, batch):
+        if not batch:
+            return
+        db = self._db
+        with db:
+            for gameId, hashes in batch:
+                game = db.execute("INSERT INTO games (name, plies) VALUES (?, ?)",
+                                  (gameId, len(hashes) - 1)).lastrowid
+                # a position repeated in a game is stored for each ply it was reached at
+                db.executemany("INSERT INTO positions (hash, game, ply) VALUES (?, ?, ?)",
+                               [(h, game, ply) for ply, h in enumerate(hashes)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexes the positions of a game corpus.")
+    parser.add_argument("database", help="SQLite file of the index")
+    parser.add_argument("--add", default=None, help="a PGN or moves.txt style file, or a directory of them")
+    parser.add_argument("--find", default=None, help="FEN of a position to list the games of")
+    parser.add_argument("--batch-size", type=int, default=1000, help="games written per transaction")
+    args = parser.parse_args(argv)
+
+    index = PositionIndex(args.database)
+    try:
+        if args.add:
+            start = time.time()
+            errors = []
+            games, positions = index.addGames(readJobs(findFiles(args.add)), args.batch_size, errors)
+            for gameId, reason in errors:
+                print "%s skipped: %s" % (gameId, reason)
+            print "%d games %d positions added in %.2fs" % (games, positions, time.time() - start)
+        if args.find:
+            start = time.time()
+            found = index.findGames(args.find)
+            for gameId, ply in found:
+                print "%s ply %d" % (gameId, ply)
+            print "%d positions found in %.3fs" % (len(found), time.time() - start)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
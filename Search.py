@@ -0,0 +1,437 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Alpha-beta search for ChessBoard.
+#
+# Negamax alpha-beta with iterative deepening, a fixed size
+# transposition table, captures first move ordering and a quiescence
+# search over captures, stopped by a depth, a time or a node budget.
+# Moves are made with makeMove/unmakeMove, so the board is back where
+# it started when the search returns.
+#
+# Usage:
+#   python Search.py --fen "<fen>" [--depth N] [--movetime MS] [--nodes N]
+#####################################################################
+
+import argparse
+import time
+
+from ChessBoard import ChessBoard
+from Perft import moveName
+
+MATE = 100000
+# scores beyond this are mates, counted in plies from the root
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+
+DEFAULT_DEPTH = 4
+MAX_DEPTH = 64
+
+# Transposition table entry bounds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# ChessMove special move types as found in the flag bits of a move code
+_EP_CAPTURE = 2
+_PROMOTION_FLAG = 8
+
+VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0, '.': 0}
+
+# Piece square bonuses from white's side, a8 first, for the pieces that care most
+_PAWN_SQUARES = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0)
+_KNIGHT_SQUARES = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+_BISHOP_SQUARES = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+_KING_SQUARES = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+_NO_SQUARES = (0,) * 64
+
+
+def _piece_squares():
+    # the value of every piece letter on every square, positive for white
+    squares = {'p': _PAWN_SQUARES, 'n': _KNIGHT_SQUARES, 'b': _BISHOP_SQUARES, 'k': _KING_SQUARES}
+    table = {}
+    for p in "pnbrqk":
+        bonus = squares.get(p, _NO_SQUARES)
+        table[p.upper()] = tuple(VALUES[p] + bonus[sq] for sq in range(64))
+        # black reads the table upside down
+        table[p] = tuple(-VALUES[p] - bonus[(7 - (sq >> 3)) * 8 + (sq & 7)] for sq in range(64))
+    table['.'] = _NO_SQUARES
+    return table
+
+
+PIECE_SQUARES = _piece_squares()
+
+
+def evaluate(board):
+    """
+    Returns the material and piece square score of the position from the side to move.
+    """
+    table = PIECE_SQUARES
+    score = 0
+    sq = 0
+    for p in board.getBoardView().toString():
+        if p != '.':
+            score += table[p][sq]
+        sq += 1
+    if board.getTurn():
+        return -score
+    return score
+
+
+class TranspositionTable:
+    """
+    A fixed number of slots, picked by the low bits of the position key. A slot is taken
+    over by a new entry unless it holds another position searched deeper in the current
+    search, so entries of earlier searches age out.
+    """
+
+    def __init__(self, size=1 << 16):
+        self.size = 1
+        while self.size * 2 <= size:
+            self.size *= 2
+        self._mask = self.size - 1
+        self._slots = [None] * self.size
+        self._generation = 0
+
+    def newSearch(self):
+        self._generation += 1
+
+    def clear(self):
+        self._slots = [None] * self.size
+
+    def probe(self, key):
+        """
+        Returns (depth, score, bound, move) stored for the position key, or None.
+        """
+        entry = self._slots[key & self._mask]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1:5]
+
+    def store(self, key, depth, score, bound, move):
+        i = key & self._mask
+        entry = self._slots[i]
+        if entry is None or entry[0] == key or entry[5] != self._generation or depth >= entry[1]:
+            self._slots[i] = (key, depth, score, bound, move, self._generation)
+
+
+class SearchResult:
+    """
+    The outcome of a search: the best move as a 16 bit move code (None if there is no legal
+    move), its score in centipawns from the side to move, the principal variation as a list
+    of move codes, the depth of the last completed iteration and the nodes searched.
+    """
+
+    def __init__(self, move, score, pv, depth, nodes, elapsed):
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.time = elapsed
+        self.nps = 0.0
+        if elapsed > 0:
+            self.nps = nodes / elapsed
+
+    def mateIn(self):
+        """
+        Returns the number of plies to mate, negative when the side to move is mated, or None.
+        """
+        if self.score >= MATE_BOUND:
+            return MATE - self.score
+        if self.score <= -MATE_BOUND:
+            return -(MATE + self.score)
+        return None
+
+
+class _Abort(Exception):
+    pass
+
+
+def search(board, depth=None, moveTime=None, maxNodes=None, table=None, out=None):
+    """
+    Searches the position on board and returns a SearchResult. The search deepens one ply at
+    a time up to depth (DEFAULT_DEPTH when no budget is given) and stops early when moveTime
+    milliseconds or maxNodes nodes are used up, returning the last completed iteration.
+    The first iteration always completes. table is a TranspositionTable to keep between
+    searches, and out a file to write a line per iteration to.
+    """
+    if depth is None:
+        depth = MAX_DEPTH
+        if moveTime is None and maxNodes is None:
+            depth = DEFAULT_DEPTH
+    if table is None:
+        table = TranspositionTable()
+    return _Searcher(board, table, moveTime, maxNodes).run(max(1, min(depth, MAX_DEPTH)), out)
+
+
+class _Searcher:
+    def __init__(self, board, table, moveTime, maxNodes):
+        self.board = board
+        self.table = table
+        self.maxNodes = maxNodes
+        self.start = time.time()
+        self.deadline = None
+        if moveTime is not None:
+            self.deadline = self.start + moveTime / 1000.0
+        self.nodes = 0
+        self.made = 0
+        self.path = []
+        self.abortable = False
+        self.rootMove = None
+
+    def run(self, depth, out):
+        board = self.board
+        self.table.newSearch()
+        codes = board.generateLegalMoveCodes()
+        if not codes:
+            score = 0
+            if board.isCheck():
+                score = -MATE
+            return SearchResult(None, score, [], 0, 0, time.time() - self.start)
+
+        result = None
+        for d in range(1, depth + 1):
+            self.abortable = d > 1
+            try:
+                score = self._negamax(d, -INFINITY, INFINITY, 0)
+            except _Abort:
+                while self.made:
+                    board.unmakeMove()
+                    self.made -= 1
+                self.path = []
+                break
+            pv = self._principal_variation(d)
+            if not pv or pv[0] != self.rootMove:
+                pv = [self.rootMove]
+            result = SearchResult(self.rootMove, score, pv, d, self.nodes, time.time() - self.start)
+            if out is not None:
+                out.write("depth %d score %d nodes %d time %.2fs nps %.0f pv %s\n" % (
+                    d, score, result.nodes, result.time, result.nps, " ".join(moveName(m) for m in pv)))
+            if abs(score) >= MATE_BOUND:
+                break
+            # the next iteration takes longer than all the ones before it together
+            if self.deadline is not None and time.time() - self.start > (self.deadline - self.start) / 2:
+                break
+
+        result.nodes = self.nodes
+        result.time = time.time() - self.start
+        if result.time > 0:
+            result.nps = self.nodes / result.time
+        return result
+
+    def _count(self):
+        self.nodes += 1
+        if not self.abortable:
+            return
+        if self.maxNodes is not None and self.nodes >= self.maxNodes:
+            raise _Abort()
+        if self.deadline is not None and not self.nodes & 255 and time.time() >= self.deadline:
+            raise _Abort()
+
+    def _negamax(self, depth, alpha, beta, ply):
+        board = self.board
+        key = board.getPositionKey()
+        if ply and key in self.path:
+            return 0
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply)
+        self._count()
+
+        table = self.table
+        entry = table.probe(key)
+        hashMove = 0
+        if entry is not None:
+            hashMove = entry[3]
+            if ply and entry[0] >= depth:
+                score = _from_table(entry[1], ply)
+                bound = entry[2]
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score >= beta:
+                    return score
+                if bound == UPPER and score <= alpha:
+                    return score
+
+        codes = board.generateLegalMoveCodes()
+        if not codes:
+            if board.isCheck():
+                return -MATE + ply
+            return 0
+
+        start = alpha
+        best = -INFINITY
+        bestMove = 0
+        self.path.append(key)
+        for code in _order(board, codes, hashMove):
+            board.makeMove(code)
+            self.made += 1
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmakeMove()
+            self.made -= 1
+            if score > best:
+                best = score
+                bestMove = code
+                if not ply:
+                    self.rootMove = code
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        self.path.pop()
+
+        bound = EXACT
+        if best <= start:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        table.store(key, depth, _to_table(best, ply), bound, bestMove)
+        return best
+
+    def _quiesce(self, alpha, beta, ply):
+        self._count()
+        board = self.board
+        codes = board.generateLegalMoveCodes(ChessBoard.CAPTURE_MOVES)
+        if not codes and not board.hasLegalMoves():
+            if board.isCheck():
+                return -MATE + ply
+            return 0
+
+        best = evaluate(board)
+        if best >= beta:
+            return best
+        if best > alpha:
+            alpha = best
+
+        for code in _order(board, codes, 0, True):
+            board.makeMove(code)
+            self.made += 1
+            score = -self._quiesce(-beta, -alpha, ply + 1)
+            board.unmakeMove()
+            self.made -= 1
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def _principal_variation(self, depth):
+        # follows the best moves in the table from the root, as long as they are legal
+        board = self.board
+        pv = []
+        seen = set()
+        while len(pv) < depth:
+            key = board.getPositionKey()
+            entry = self.table.probe(key)
+            if entry is None or key in seen or entry[3] not in board.generateLegalMoveCodes():
+                break
+            seen.add(key)
+            pv.append(entry[3])
+            board.makeMove(entry[3])
+        for m in pv:
+            board.unmakeMove()
+        return pv
+
+
+def _order(board, codes, hashMove, capturesOnly=False):
+    # the hash move first, then captures by most valuable victim and least valuable attacker,
+    # then promotions and the quiet moves in generation order
+    squares = board.getBoardView().toString()
+    values = VALUES
+    scored = []
+    for code in codes:
+        if code == hashMove:
+            scored.append((100000, code))
+            continue
+        victim = squares[(code >> 6) & 63]
+        flag = code >> 12
+        if victim != '.':
+            order = 10000 + values[victim.lower()] * 10 - values[squares[code & 63].lower()] // 10
+        elif flag == _EP_CAPTURE:
+            order = 10000 + values['p'] * 10 - values['p'] // 10
+        elif flag >= _PROMOTION_FLAG:
+            order = 5000
+        elif capturesOnly:
+            continue
+        else:
+            order = 0
+        scored.append((order, code))
+    scored.sort(key=lambda s: -s[0])
+    return [code for order, code in scored]
+
+
+def _to_table(score, ply):
+    # mate scores are stored as distance from the position instead of from the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def main(argv=None):
+    import sys
+
+    parser = argparse.ArgumentParser(description="Searches a position for the best move.")
+    parser.add_argument("--fen", default=None, help="position to search, the start position by default")
+    parser.add_argument("--depth", type=int, default=None, help="maximum depth in plies")
+    parser.add_argument("--movetime", type=int, default=None, help="time budget in milliseconds")
+    parser.add_argument("--nodes", type=int, default=None, help="node budget")
+    args = parser.parse_args(argv)
+
+    board = ChessBoard()
+    if args.fen:
+        board.setFEN(args.fen)
+    result = search(board, args.depth, args.movetime, args.nodes, out=sys.stdout)
+    if result.move is None:
+        print "no legal moves"
+        return 1
+    print "bestmove %s score %d depth %d nodes %d nps %.0f" % (
+        moveName(result.move), result.score, result.depth, result.nodes, result.nps)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,471 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Retrograde endgame tablebases for ChessBoard.
+#
+# An endgame like KQvK (white king and queen against the black king)
+# is solved by generating the legal moves of every placement of its
+# pieces with ChessBoard, and working back from the mates: a position
+# is won if a move leads to a lost one, and lost if every move leads
+# to a won one. Captures and promotions lead into smaller endgames,
+# which are solved first.
+#
+# A table file is an 8 byte header followed by one byte per position:
+# 0 for a draw, 255 for an illegal placement, otherwise the number of
+# plies to mate plus one, odd plies meaning the side to move mates. The
+# index is the side to move, the white king reduced by symmetry, then
+# the squares of the other pieces. Castling and en passant are left
+# out, positions with either can not be probed.
+#
+# Usage:
+#   python Tablebase.py KQvK KRvK KPvK [--dir tables/]
+#   python Tablebase.py --probe "<fen>" [--dir tables/]
+#####################################################################
+
+import argparse
+import mmap
+import os
+from array import array
+
+from ChessBoard import ChessBoard
+
+MAGIC = "CBTB1\0\0\0"
+
+# Probe results, from the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+DRAW_VALUE = 0
+ILLEGAL_VALUE = 255
+# longest distance to mate a table holds, its value MAX_PLIES + 1 is the last below ILLEGAL_VALUE
+MAX_PLIES = ILLEGAL_VALUE - 2
+
+# Order of the pieces of a side in a signature, and their weight when deciding which
+# side of an endgame is the stronger one
+PIECE_ORDER = "QRBNP"
+PIECE_WEIGHTS = {'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+
+
+def _transforms():
+    # the eight symmetries of the board as square maps, a8 = 0; the first two keep ranks
+    maps = []
+    for flipx in (False, True):
+        for flipy in (False, True):
+            for swap in (False, True):
+                m = []
+                for sq in range(64):
+                    x, y = sq & 7, sq >> 3
+                    if swap:
+                        x, y = y, x
+                    if flipx:
+                        x = 7 - x
+                    if flipy:
+                        y = 7 - y
+                    m.append(y * 8 + x)
+                maps.append(tuple(m))
+    identity = maps[0]
+    mirror = maps[4]
+    return [identity, mirror] + [m for m in maps if m not in (identity, mirror)]
+
+
+TRANSFORMS = _transforms()
+# with pawns the white king stays on the files a-d, without them in the a1-d1-d4 triangle
+PAWN_KING_SQUARES = [sq for sq in range(64) if sq & 7 < 4]
+KING_SQUARES = [sq for sq in range(64) if sq & 7 < 4 and 7 - (sq >> 3) <= sq & 7]
+
+
+def signatureOf(squares):
+    """
+    Returns (signature, flipped) for a 64 character board string: the material with the
+    stronger side as white, like 'KQvK', and whether the colors had to be swapped for it.
+    """
+    white = "".join(sorted((p for p in squares if p in PIECE_ORDER), key=PIECE_ORDER.index))
+    black = "".join(sorted((p.upper() for p in squares if p.upper() in PIECE_ORDER and p.islower()),
+                           key=PIECE_ORDER.index))
+    flipped = (_weight(black), black) > (_weight(white), white)
+    if flipped:
+        white, black = black, white
+    return "K%svK%s" % (white, black), flipped
+
+
+def _weight(pieces):
+    return sum(PIECE_WEIGHTS[p] for p in pieces)
+
+
+def isTrivialDraw(signature):
+    """
+    Returns True for endgames no side can win: bare kings, or one minor piece against a bare king.
+    """
+    return signature in ("KvK", "KBvK", "KNvK")
+
+
+class _Layout:
+    # maps the placements of the pieces of an endgame to table indexes and back
+    def __init__(self, signature):
+        white, black = signature.split("v")
+        self.signature = signature
+        self.pieces = ['K', 'k'] + list(white[1:]) + [p.lower() for p in black[1:]]
+        self.pawns = 'P' in signature
+        if self.pawns:
+            self.kingSquares = PAWN_KING_SQUARES
+            self.transforms = TRANSFORMS[:2]
+        else:
+            self.kingSquares = KING_SQUARES
+            self.transforms = TRANSFORMS
+        self.kingIndex = dict((sq, i) for i, sq in enumerate(self.kingSquares))
+        self.others = len(self.pieces) - 1
+        self.size = 2 * len(self.kingSquares) * 64 ** self.others
+
+    def index(self, turn, squares):
+        # squares holds the square of every piece in the order of self.pieces
+        kingIndex = self.kingIndex
+        for t in self.transforms:
+            k = kingIndex.get(t[squares[0]])
+            if k is not None:
+                break
+        i = turn * len(self.kingSquares) + k
+        for sq in squares[1:]:
+            i = i * 64 + t[sq]
+        return i
+
+    def placement(self, i):
+        # (turn, squares) of an index
+        squares = []
+        for n in range(self.others):
+            squares.append(i & 63)
+            i >>= 6
+        squares.reverse()
+        turn, k = divmod(i, len(self.kingSquares))
+        return turn, [self.kingSquares[k]] + squares
+
+    def isLegal(self, squares):
+        # a placement without overlaps, touching kings or pawns on the first or last rank
+        if len(set(squares)) != len(squares):
+            return False
+        wk, bk = squares[0], squares[1]
+        if abs((wk & 7) - (bk & 7)) <= 1 and abs((wk >> 3) - (bk >> 3)) <= 1:
+            return False
+        for p, sq in zip(self.pieces, squares):
+            if p in "Pp" and (sq < 8 or sq >= 56):
+                return False
+        return True
+
+    def fen(self, turn, squares):
+        # the placement field written a row at a time, most rows are empty
+        rows = [[] for y in range(8)]
+        for p, sq in zip(self.pieces, squares):
+            rows[sq >> 3].append((sq & 7, p))
+        fields = []
+        for row in rows:
+            field = ""
+            x = 0
+            for px, p in sorted(row):
+                if px > x:
+                    field += str(px - x)
+                field += p
+                x = px + 1
+            if x < 8:
+                field += str(8 - x)
+            fields.append(field)
+        return "%s %s - - 0 1" % ("/".join(fields), "wb"[turn])
+
+
+def _flip_placement(turn, pieces, squares):
+    # swaps the colors of a placement, mirroring it from top to bottom
+    return (1 - turn, [p.swapcase() for p in pieces], [(7 - (sq >> 3)) * 8 + (sq & 7) for sq in squares])
+
+
+def _order_placement(layout, pieces, squares):
+    # the squares of pieces in the order of the layout of their endgame
+    remaining = list(zip(pieces, squares))
+    ordered = []
+    for p in layout.pieces:
+        for n, (q, sq) in enumerate(remaining):
+            if q == p:
+                ordered.append(sq)
+                del remaining[n]
+                break
+    return ordered
+
+
+def _decode(value):
+    # (result, plies) of a table value
+    if value == DRAW_VALUE:
+        return DRAW, 0
+    plies = value - 1
+    if plies & 1:
+        return WIN, plies
+    return LOSS, plies
+
+
+class Tablebase:
+    """
+    Probes the table files in a directory, which are memory mapped when first needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+
+    def close(self):
+        for f, data, layout in self._tables.values():
+            if data is not None:
+                data.close()
+            if f is not None:
+                f.close()
+        self._tables = {}
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + ".tb")
+
+    def has(self, signature):
+        return isTrivialDraw(signature) or os.path.exists(self.path(signature))
+
+    def _table(self, signature):
+        table = self._tables.get(signature)
+        if table is None:
+            layout = _Layout(signature)
+            f = open(self.path(signature), "rb")
+            if os.fstat(f.fileno()).st_size != len(MAGIC) + layout.size:
+                f.close()
+                raise ValueError("%s is not a %s table" % (self.path(signature), signature))
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:len(MAGIC)] != MAGIC:
+                data.close()
+                f.close()
+                raise ValueError("%s is not a table file" % self.path(signature))
+            table = self._tables[signature] = (f, data, layout)
+        return table
+
+    def value(self, turn, pieces, squares):
+        """
+        Returns the table value of a placement of pieces (letters in any order, with their
+        squares), or None if its endgame has no table.
+        """
+        board = ["."] * 64
+        for p, sq in zip(pieces, squares):
+            board[sq] = p
+        signature, flipped = signatureOf(board)
+        if isTrivialDraw(signature):
+            return DRAW_VALUE
+        if not os.path.exists(self.path(signature)):
+            return None
+        if flipped:
+            turn, pieces, squares = _flip_placement(turn, pieces, squares)
+        f, data, layout = self._table(signature)
+        return ord(data[len(MAGIC) + layout.index(turn, _order_placement(layout, pieces, squares))])
+
+    def probe(self, board):
+        """
+        Returns (result, plies) for the position of a ChessBoard: WIN, DRAW or LOSS for the side
+        to move and the number of plies to mate with best play (0 for a draw or when mated).
+        Returns None if there is no table for the position or it has castling or en passant rights.
+        """
+        if board.getEnPassantSquare() is not None or any(board.getCastlingRights()):
+            return None
+        squares = board.getBoardView().toString()
+        pieces = []
+        places = []
+        for sq, p in enumerate(squares):
+            if p != '.':
+                pieces.append(p)
+                places.append(sq)
+        if len(pieces) > 6:
+            return None
+        value = self.value(board.getTurn(), pieces, places)
+        if value is None or value == ILLEGAL_VALUE:
+            return None
+        return _decode(value)
+
+
+def generate(signature, directory, out=None):
+    """
+    Solves the endgame of a signature like 'KRvK' and writes its table to the directory, after
+    solving the endgames its captures and promotions lead to if they have no table yet.
+    Returns the number of legal positions. out is a file to write progress to.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    layout = _Layout(signature)
+    tablebase = Tablebase(directory)
+    try:
+        return _Generator(layout, tablebase, out).run()
+    finally:
+        tablebase.close()
+
+
+class _Generator:
+    def __init__(self, layout, tablebase, out):
+        self.layout = layout
+        self.tablebase = tablebase
+        self.out = out
+
+    def _external(self, turn, pieces, squares):
+        # the value of a position of another endgame, solving it first if needed
+        tablebase = self.tablebase
+        value = tablebase.value(turn, pieces, squares)
+        if value is None:
+            board = ["."] * 64
+            for p, sq in zip(pieces, squares):
+                board[sq] = p
+            generate(signatureOf(board)[0], tablebase.directory, self.out)
+            value = tablebase.value(turn, pieces, squares)
+        return value
+
+    def run(self):
+        layout = self.layout
+        size = layout.size
+        pieces = layout.pieces
+        values = bytearray([ILLEGAL_VALUE]) * size
+        board = ChessBoard()
+
+        # forward pass: the moves of every legal position, as table indexes for moves that
+        # stay in this endgame and as events at the distance of the other endgame's value
+        offsets = array('l', [0])
+        edges = array('l')
+        counts = array('l', [0]) * size
+        events = [[] for d in range(MAX_PLIES + 2)]
+        resolved = [[] for d in range(MAX_PLIES + 2)]
+        legal = 0
+
+        for i in xrange(size):
+            turn, squares = layout.placement(i)
+            if layout.isLegal(squares):
+                board.setFEN(layout.fen(turn, squares))
+                them = squares[1 - turn]
+                if not board.attackersOf((them & 7, them >> 3), turn):
+                    legal += 1
+                    values[i] = DRAW_VALUE
+                    self._moves(board, i, turn, squares, edges, counts, events, resolved, values)
+            offsets.append(len(edges))
+
+        if self.out is not None:
+            self.out.write("%s: %d legal positions, %d moves\n" % (layout.signature, legal, len(edges)))
+
+        # reverse edges
+        starts = array('l', [0]) * (size + 1)
+        for s in edges:
+            starts[s + 1] += 1
+        for i in xrange(size):
+            starts[i + 1] += starts[i]
+        fill = array('l', starts)
+        parents = array('l', [0]) * len(edges)
+        for i in xrange(size):
+            for e in xrange(offsets[i], offsets[i + 1]):
+                s = edges[e]
+                parents[fill[s]] = i
+                fill[s] += 1
+
+        # retrograde pass, one distance at a time: the parents of a position lost in d plies
+        # win in d + 1, and a position whose moves all lead to won positions loses in d + 1
+        # plies, d being the distance of the last of them. Positions at MAX_PLIES are still
+        # passed on, so that a parent further away raises instead of being left a draw
+        known = bytearray(size)
+        for d in range(MAX_PLIES + 1):
+            for i, won in events[d]:
+                self._event(i, won, d, known, counts, values, resolved)
+            n = 0
+            while n < len(resolved[d]):
+                s = resolved[d][n]
+                won = (values[s] - 1) & 1
+                for e in xrange(starts[s], starts[s + 1]):
+                    self._event(parents[e], won, d, known, counts, values, resolved)
+                n += 1
+
+        path = self.tablebase.path(layout.signature)
+        f = open(path + ".part", "wb")
+        try:
+            f.write(MAGIC)
+            f.write(values)
+        finally:
+            f.close()
+        os.rename(path + ".part", path)
+        return legal
+
+    def _moves(self, board, i, turn, squares, edges, counts, events, resolved, values):
+        layout = self.layout
+        pieces = layout.pieces
+        codes = board.generateLegalMoveCodes()
+        if not codes:
+            if board.isCheck():
+                values[i] = 1
+                resolved[0].append(i)
+            return
+
+        where = dict((sq, n) for n, sq in enumerate(squares))
+        counts[i] = len(codes)
+        for code in codes:
+            fsq = code & 63
+            tsq = (code >> 6) & 63
+            moved = where[fsq]
+            taken = where.get(tsq)
+            if taken is None and code >> 12 < 8:
+                after = list(squares)
+                after[moved] = tsq
+                edges.append(layout.index(1 - turn, after))
+                continue
+
+            # a capture or a promotion leaves this endgame
+            after_pieces = list(pieces)
+            after_squares = list(squares)
+            if code >> 12 >= 8:
+                promoted = "QRNB"[(code >> 12) - 8]
+                if turn:
+                    promoted = promoted.lower()
+                after_pieces[moved] = promoted
+            after_squares[moved] = tsq
+            if taken is not None:
+                del after_pieces[taken]
+                del after_squares[taken]
+            value = self._external(1 - turn, after_pieces, after_squares)
+            if value != DRAW_VALUE:
+                plies = value - 1
+                events[plies].append((i, plies & 1))
+
+    def _event(self, i, won, d, known, counts, values, resolved):
+        # position i has a move into a position that is won (or lost) in d plies for the side
+        # to move there
+        if known[i]:
+            return
+        if won:
+            counts[i] -= 1
+            if counts[i]:
+                return
+        if d + 1 > MAX_PLIES:
+            raise ValueError("a mate in more than %d plies does not fit in a table" % MAX_PLIES)
+        values[i] = d + 2
+        known[i] = 1
+        resolved[d + 1].append(i)
+
+
+def main(argv=None):
+    import sys
+
+    parser = argparse.ArgumentParser(description="Solves small endgames and probes the tables.")
+    parser.add_argument("signatures", nargs="*", help="endgames to solve, like KQvK")
+    parser.add_argument("--dir", default="tables", help="directory of the table files")
+    parser.add_argument("--probe", default=None, help="FEN of a position to look up")
+    args = parser.parse_args(argv)
+
+    for signature in args.signatures:
+        generate(signature, args.dir, sys.stdout)
+
+    if args.probe:
+        board = ChessBoard()
+        board.setFEN(args.probe)
+        tablebase = Tablebase(args.dir)
+        try:
+            found = tablebase.probe(board)
+        finally:
+            tablebase.close()
+        if found is None:
+            print "not in the tables"
+            return 1
+        result, plies = found
+        print "%s in %d plies" % ({WIN: "win", DRAW: "draw", LOSS: "loss"}[result], plies)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
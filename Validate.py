@@ -0,0 +1,239 @@
+# /usr/bin/env python
+
+# ####################################################################
+# Bulk game validation for ChessBoard.
+#
+# Replays every game of a set of PGN files or moves.txt style move
+# lists with addTextMove, spread over a pool of worker processes, and
+# reports for every game whether all its moves were legal.
+#
+# Usage:
+#   python Validate.py games/ [--processes N] [--chunk-size N]
+#                     [--unordered] [--checkpoint done.txt]
+#####################################################################
+
+import argparse
+import os
+import time
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+from ChessBoard import ChessBoard
+from PGNReader import PGNReader, tokenize
+
+# Game status values
+VALID = "ok"
+ILLEGAL = "illegal"
+ERROR = "error"
+
+PGN_SUFFIXES = (".pgn", ".pgn.gz")
+MOVES_SUFFIXES = (".txt",)
+
+# The board of a worker process, made by its first chunk
+_board = None
+
+
+def findFiles(path):
+    """
+    Returns the sorted list of game files under path, or [path] if path is a file.
+    """
+    if not os.path.isdir(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            if name.endswith(PGN_SUFFIXES + MOVES_SUFFIXES):
+                files.append(os.path.join(root, name))
+    files.sort()
+    return files
+
+
+def readJobs(paths):
+    """
+    Yields a (game_id, fen, movetext) job for every game in the given files. fen is None
+    for games from the start position. PGN games are identified by path:line, a moves.txt
+    style file holds a single game and is identified by its path.
+    """
+    for path in paths:
+        if path.endswith(MOVES_SUFFIXES):
+            f = open(path)
+            try:
+                yield (path, None, f.read())
+            finally:
+                f.close()
+            continue
+        for game in PGNReader(path):
+            yield ("%s:%d" % (path, game.line), game.headers.get("FEN"), game.movetext)
+
+
+def validateGame(board, fen, movetext):
+    """
+    Replays one game on board and returns (status, ply, reason, result, plies). ply is the
+    halfmove, counting from 0, of the first move addTextMove rejected and reason its
+    getReason code, or None and 0 if every move was legal. result is getGameResult after
+    the last legal move and plies the number of legal moves made.
+    """
+    board.resetBoard()
+    if fen:
+        board.setFEN(fen)
+    plies = 0
+    for move in tokenize(movetext):
+        if not board.addTextMove(move):
+            return (ILLEGAL, plies, board.getReason(), board.getGameResult(), plies)
+        plies += 1
+    return (VALID, None, 0, board.getGameResult(), plies)
+
+
+def validateChunk(jobs):
+    """
+    Validates a list of jobs and returns a list of (game_id, status, ply, reason, result, plies).
+    A game that makes the board raise gets the ERROR status with the exception text as reason.
+    """
+    global _board
+    if _board is None:
+        _board = ChessBoard()
+    results = []
+    for gameId, fen, movetext in jobs:
+        try:
+            results.append((gameId,) + validateGame(_board, fen, movetext))
+        except Exception, e:
+            _board = ChessBoard()
+            results.append((gameId, ERROR, None, "%s: %s" % (e.__class__.__name__, e), 0, 0))
+    return results
+
+
+def validate(jobs, processes=None, chunkSize=64, ordered=True, checkpoint=None):
+    """
+    Validates the jobs of readJobs in chunks of chunkSize games on a pool of processes
+    (all CPUs by default, 1 runs in this process) and yields the result of every game
+    as validateChunk gives it. Results come in job order if ordered is True, otherwise
+    as soon as their chunk is done.
+
+    If checkpoint is the path of a file, the ids of finished games are appended to it
+    and games it already lists are skipped, so a killed run can be resumed. The ids of a
+    chunk are written once all its results have been taken, so after a resume a game
+    may be reported twice but never goes missing.
+    """
+    done = set()
+    log = None
+    if checkpoint is not None:
+        done = readCheckpoint(checkpoint)
+        log = open(checkpoint, "a")
+    if done:
+        jobs = (job for job in jobs if job[0] not in done)
+
+    try:
+        for results in _run(_chunks(jobs, chunkSize), processes, ordered):
+            for r in results:
+                yield r
+            if log is not None:
+                log.write("".join(r[0] + "\n" for r in results))
+                log.flush()
+    finally:
+        if log is not None:
+            log.close()
+
+
+def readCheckpoint(path):
+    """
+    Returns the set of game ids listed in a checkpoint file, empty if there is no file.
+    """
+    if not os.path.exists(path):
+        return set()
+    f = open(path)
+    try:
+        return set(line.rstrip("\n") for line in f if line.endswith("\n"))
+    finally:
+        f.close()
+
+
+def _chunks(jobs, size):
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _run(chunks, processes, ordered):
+    # Yields the results of validateChunk for every chunk. At most a few chunks per
+    # process are queued at a time, so the jobs are read as fast as they are used.
+    if processes == 1:
+        for chunk in chunks:
+            yield validateChunk(chunk)
+        return
+
+    pool = Pool(processes)
+    window = (processes or cpu_count()) * 4
+    pending = deque()
+    try:
+        for chunk in chunks:
+            if len(pending) >= window:
+                yield _next_result(pending, ordered)
+            pending.append(pool.apply_async(validateChunk, (chunk,)))
+        while pending:
+            yield _next_result(pending, ordered)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _next_result(pending, ordered):
+    if ordered:
+        return pending.popleft().get()
+    # any chunk may finish first, so the pending results are polled. get() raises the
+    # error of a chunk that failed in the pool, which a completion callback never sees.
+    while True:
+        for i, result in enumerate(pending):
+            if result.ready():
+                del pending[i]
+                return result.get()
+        pending[0].wait(0.01)
+
+
+def main(argv=None):
+    import sys
+
+    parser = argparse.ArgumentParser(description="Checks that every move of a set of games is legal.")
+    parser.add_argument("path", help="a PGN or moves.txt style file, or a directory of them")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all CPUs by default")
+    parser.add_argument("--chunk-size", type=int, default=64, help="games sent to a worker at a time")
+    parser.add_argument("--unordered", action="store_true", help="print results as soon as they are done")
+    parser.add_argument("--checkpoint", default=None, help="file of finished games to resume from")
+    args = parser.parse_args(argv)
+
+    games = 0
+    plies = 0
+    failed = 0
+    start = time.time()
+    results = validate(readJobs(findFiles(args.path)), args.processes, args.chunk_size,
+                       not args.unordered, args.checkpoint)
+    for gameId, status, ply, reason, result, count in results:
+        games += 1
+        plies += count
+        if status == VALID:
+            print "%s %s result %d plies %d" % (gameId, status, result, count)
+        else:
+            failed += 1
+            print "%s %s ply %s reason %s result %d" % (gameId, status, ply, reason, result)
+    elapsed = time.time() - start
+
+    print "%d games %d failed %d plies time %.2fs %.0f games/s %.0f plies/s" % (
+        games, failed, plies, elapsed, perSecond(games, elapsed), perSecond(plies, elapsed))
+    return 1 if failed else 0
+
+
+def perSecond(count, elapsed):
+    if elapsed <= 0:
+        return 0.0
+    return count / elapsed
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
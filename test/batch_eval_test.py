@@ -0,0 +1,58 @@
+import unittest
+import sys
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from Search import evaluate
+import BatchEval
+from BatchEval import evaluateBatch, packPositions
+
+FENS = ['rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+        'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR b KQkq - 3 3',
+        '4k3/8/8/8/8/8/4P3/4K3 w - - 0 1',
+        '4k3/8/8/3q4/8/8/3R4/3RK3 b - - 0 1']
+
+
+@unittest.skipIf(BatchEval.numpy is None, "numpy is not installed")
+class BatchEvalTest(unittest.TestCase):
+    def test_packPositions(self):
+        board = ChessBoard()
+        board.addTextMove('e4')
+        pieces, turns = packPositions([board, FENS[2]])
+        self.assertEqual(pieces.shape, (2, 64))
+        self.assertEqual(pieces.dtype.name, 'int8')
+        self.assertEqual(list(pieces[0][:8]), [-4, -2, -3, -5, -6, -3, -2, -4])
+        self.assertEqual(pieces[0][36], 1)
+        self.assertEqual(list(turns), [1, 0])
+        self.assertEqual(pieces[1].sum(), 1)
+
+    def test_matches_search_evaluate(self):
+        boards = []
+        for fen in FENS:
+            board = ChessBoard()
+            board.setFEN(fen)
+            boards.append(board)
+        scores = evaluateBatch(FENS, tapered=False, relative=True)
+        self.assertEqual(list(scores), [evaluate(b) for b in boards])
+        self.assertEqual(list(evaluateBatch(boards)), list(evaluateBatch(FENS)))
+
+    def test_tapered(self):
+        middle = evaluateBatch(FENS, tapered=False)
+        tapered = evaluateBatch(FENS)
+        # the start position is all middlegame, a king and pawn ending all endgame
+        self.assertEqual(tapered[0], middle[0])
+        pieces, turns = packPositions(FENS[2:3])
+        self.assertEqual(BatchEval.PHASE_TABLE.take(pieces.astype(int) + 6).sum(), 0)
+        self.assertNotEqual(tapered[2], middle[2])
+
+    def test_invalid_fen(self):
+        self.assertRaises(ValueError, evaluateBatch, ['4k3/8/8 w - - 0 1'])
+        self.assertRaises(ValueError, evaluateBatch, ['4k3/8/8/8/8/8/8/4K2x w - - 0 1'])
+        self.assertRaises(ValueError, evaluateBatch, ['4k3/8/8/8/8/8/8/4K1.1 w - - 0 1'])
+        # every rank must have 8 squares, not only the board
+        self.assertRaises(ValueError, evaluateBatch, ['4k4/7/8/8/8/8/8/4K3 w - - 0 1'])
+        self.assertRaises(ValueError, evaluateBatch, ['4k3/8/8/8/8/8/8/4K3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
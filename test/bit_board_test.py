@@ -0,0 +1,50 @@
+import unittest
+import sys
+
+sys.path.append(".")
+from BitBoard import BitBoard, BITS, bishopAttacks, iterBits, rookAttacks
+from ChessBoard import ChessBoard
+
+
+def sq(name):
+    return ("87654321".index(name[1])) * 8 + "abcdefgh".index(name[0])
+
+
+class BitBoardTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+
+    def test_setBoard_round_trip(self):
+        bits = BitBoard(self.chess_board._board)
+        self.assertEqual(bits.getBoard(), self.chess_board._board)
+        self.assertEqual(bin(bits.occupied).count("1"), 32)
+        self.assertEqual(bits.kingSquare(0), sq("e1"))
+        self.assertEqual(bits.kingSquare(1), sq("e8"))
+
+    def test_rookAttacks_stops_at_blockers(self):
+        occ = BITS[sq("d6")] | BITS[sq("f4")]
+        attacks = sorted(iterBits(rookAttacks(sq("d4"), occ)))
+        expected = sorted(sq(s) for s in ["d5", "d6", "e4", "f4", "c4", "b4", "a4", "d3", "d2", "d1"])
+        self.assertEqual(attacks, expected)
+
+    def test_bishopAttacks_empty_board(self):
+        self.assertEqual(len(list(iterBits(bishopAttacks(sq("a1"), 0)))), 7)
+        self.assertEqual(len(list(iterBits(bishopAttacks(sq("d4"), 0)))), 13)
+
+    def test_bits_follow_moves(self):
+        for m in ['e4', 'e5', 'Nf3', 'Nc6', 'Bc4', 'Bc5', 'O-O', 'Nf6', 'Re1', 'O-O']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+            self.assertEqual(self.chess_board._bits.getBoard(), self.chess_board._board)
+        self.chess_board.gotoMove(3)
+        self.assertEqual(self.chess_board._bits.getBoard(), self.chess_board._board)
+
+    def test_castling(self):
+        self.chess_board.setFEN('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        self.assertTrue(self.chess_board.addTextMove('O-O'))
+        self.assertEqual(self.chess_board.getLastMoveType(), self.chess_board._cur_move.KING_CASTLE_MOVE)
+        self.assertTrue(self.chess_board.addTextMove('O-O-O'))
+        self.assertEqual(self.chess_board.getFEN(), '2kr3r/8/8/8/8/8/8/R4RK1 w - - 2 2')
+
+
+if __name__ == '__main__':
+    unittest.main()
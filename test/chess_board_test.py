@@ -3,7 +3,8 @@ import sys
 import cStringIO
 
 sys.path.append(".")
-from ChessBoard import ChessBoard, ChessMove
+from ChessBoard import ChessBoard, ChessMove, moveCode
+from Perft import moveName
 from cStringIO import StringIO
 
 
@@ -47,6 +48,70 @@ class ChessBoardTest(unittest.TestCase):
                           ['.', '.', '.', '.', 'P', '.', '.', '.'], ['.', '.', '.', '.', '.', 'N', '.', '.'],
                           ['P', 'P', 'P', 'P', '.', 'P', 'P', 'P'], ['R', 'N', 'B', 'Q', 'K', 'B', '.', 'R']])
 
+    def test_setFEN_en_passant(self):
+        fen = 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 1'
+        self.chess_board.setFEN(fen)
+        self.assertEqual(self.chess_board.getFEN(), fen)
+        self.assertTrue(self.chess_board.addTextMove('exf6'))
+        self.assertEqual(self.chess_board.getFEN(), 'rnbqkbnr/ppp1p1pp/5P2/3p4/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+
+    def test_setFEN_en_passant_edge_files(self):
+        fen = '4k3/8/8/6Pp/8/8/8/4K3 w - h6 0 1'
+        self.chess_board.setFEN(fen)
+        self.assertEqual(self.chess_board.getFEN(), fen)
+        self.chess_board.setFEN('4k3/8/8/pP5p/8/8/8/4K3 w - a6 0 1')
+        self.assertEqual(self.chess_board.getFEN(), '4k3/8/8/pP5p/8/8/8/4K3 w - a6 0 1')
+        self.chess_board.setFEN('4k3/8/8/p6P/8/8/8/4K3 w - a6 0 1')
+        self.assertEqual(self.chess_board.getFEN(), '4k3/8/8/p6P/8/8/8/4K3 w - - 0 1')
+
+    def test_setFEN_invalid(self):
+        fen = self.chess_board.getFEN()
+        for bad in ['rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',
+                    'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqqbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNP w KQkq - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkx - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e3 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e6 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 0',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w']:
+            self.assertRaises(ValueError, self.chess_board.setFEN, bad)
+            self.assertEqual(self.chess_board.getFEN(), fen)
+        self.chess_board.setFEN('4k3/8/8/8/8/8/8/4K3 b - -')
+        self.assertEqual(self.chess_board.getFEN(), '4k3/8/8/8/8/8/8/4K3 b - - 0 1')
+
+    def test_getFEN_cache(self):
+        self.chess_board.addTextMove('e4')
+        fen = self.chess_board.getFEN()
+        self.assertTrue(self.chess_board.getFEN() is fen)
+        # only the FEN of the last state asked for is kept
+        self.chess_board.undo()
+        self.chess_board.getFEN()
+        self.chess_board.redo()
+        self.assertFalse(self.chess_board.getFEN() is fen)
+        self.assertEqual(self.chess_board.getFEN(), fen)
+        fen = self.chess_board.getFEN()
+        self.chess_board.makeMove(self.chess_board.generateLegalMoveCodes()[0])
+        self.assertNotEqual(self.chess_board.getFEN(), fen)
+        self.chess_board.unmakeMove()
+        self.assertEqual(self.chess_board.getFEN(), fen)
+        self.chess_board.undo()
+        self.chess_board.addTextMove('d4')
+        self.assertEqual(self.chess_board.getFEN(), 'rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1')
+
+    def test_fensFromGame(self):
+        fens = [self.chess_board.getFEN()]
+        for m in ['e4', 'c5', 'Nf3', 'd6', 'd4']:
+            self.chess_board.addTextMove(m)
+            fens.append(self.chess_board.getFEN())
+        self.chess_board.gotoMove(2)
+        self.assertEqual(self.chess_board.fensFromGame(), fens)
+        self.assertEqual(self.chess_board.getFEN(), fens[2])
+        self.assertEqual(self.chess_board.getCurrentMove(), 5)
+
     def test_getCurrentMove(self):
         self.assertEqual(self.chess_board.getCurrentMove(), 0)
 
@@ -144,6 +209,36 @@ class ChessBoardTest(unittest.TestCase):
         self.chess_board.setPromotion(4)
         self.assertEqual(self.chess_board._promotion_value,4)
 
+    def test_getPositionKey(self):
+        start = self.chess_board.getPositionKey()
+        for m in ['Nf3', 'Nf6', 'Ng1', 'Ng8']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+        self.assertEqual(self.chess_board.getPositionKey(), start)
+        self.chess_board.undo()
+        self.assertNotEqual(self.chess_board.getPositionKey(), start)
+        self.chess_board.gotoFirst()
+        self.assertEqual(self.chess_board.getPositionKey(), start)
+
+    def test_getPositionKey_matches_setFEN(self):
+        for m in ['e4', 'd5', 'e5', 'f5']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+        key = self.chess_board.getPositionKey()
+        fen = self.chess_board.getFEN()
+        other = ChessBoard()
+        other.setFEN(fen)
+        self.assertEqual(other.getPositionKey(), key)
+        # same placement without the en passant square is a different position
+        other.setFEN(fen.replace(' f6 ', ' - '))
+        self.assertNotEqual(other.getPositionKey(), key)
+
+    def test_three_repetitions(self):
+        for m in ['Nf3', 'Nf6', 'Ng1', 'Ng8', 'Nf3', 'Nf6', 'Ng1']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+        self.assertFalse(self.chess_board.isGameOver())
+        self.assertTrue(self.chess_board.addTextMove('Ng8'))
+        self.assertTrue(self.chess_board.addTextMove('Nf3'))
+        self.assertEqual(self.chess_board.getGameResult(), self.chess_board.THREE_REPETITION_RULE)
+
     def test_getPromotion(self):
         self.chess_board.setPromotion(1)
         self.assertEqual(self.chess_board.getPromotion(),1)
@@ -155,6 +250,20 @@ class ChessBoardTest(unittest.TestCase):
         self.chess_board.setFEN('rnb1kbnr/pppp1ppp/8/4p3/5PPq/8/PPPPP2P/RNBQKBNR w KQkq - 1 3')
         self.assertTrue(self.chess_board.isCheck())
 
+    def test_isCheck_after_undo(self):
+        for m in ['e4', 'f5', 'Qh5', 'g6']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+        self.assertFalse(self.chess_board.isCheck())
+        self.chess_board.undo()
+        self.assertTrue(self.chess_board.isCheck())
+
+    def test_attackersOf(self):
+        self.chess_board.setFEN('4k3/8/8/3r4/8/2N2B2/4P3/4K3 w - - 0 1')
+        self.assertEqual(self.chess_board.attackersOf((3, 3), self.chess_board.WHITE), [(2, 5), (5, 5)])
+        self.assertEqual(self.chess_board.attackersOf((3, 4), self.chess_board.BLACK), [(3, 3)])
+        self.assertEqual(self.chess_board.attackersOf((3, 5), self.chess_board.WHITE), [(4, 6)])
+        self.assertEqual(self.chess_board.attackersOf((0, 0), self.chess_board.WHITE), [])
+
     def test_isGameOver(self):
         self.chess_board.addTextMove('f4')
         self.chess_board.addTextMove('e5')
@@ -176,6 +285,32 @@ class ChessBoardTest(unittest.TestCase):
         # assert
         self.assertTrue(len(self.chess_board.getBoard()) > 0)
 
+    def test_getBoard_is_a_copy(self):
+        board = self.chess_board.getBoard()
+        board[0][0] = '.'
+        self.assertEqual(self.chess_board.getBoard()[0][0], 'r')
+
+    def test_getBoardView(self):
+        view = self.chess_board.getBoardView()
+        self.assertEqual([list(row) for row in view], self.chess_board.getBoard())
+        self.assertEqual(view[7][4], 'K')
+        self.assertEqual(view[-1], 'RNBQKBNR')
+        self.assertEqual(view.pieceAt(4, 6), 'P')
+        self.assertEqual(view.toString()[:16], 'rnbqkbnrpppppppp')
+        self.assertEqual(len(view.toBytes()), 64)
+        self.assertTrue(view.toString() is view.toString())
+        self.assertTrue(self.chess_board.getBoardView() is view)
+
+        self.chess_board.addTextMove('e4')
+        self.assertTrue(view.isStale())
+        self.assertRaises(RuntimeError, view.pieceAt, 4, 6)
+        self.assertRaises(RuntimeError, view.toString)
+        self.assertEqual(self.chess_board.getBoardView().pieceAt(4, 4), 'P')
+
+        self.chess_board.undo()
+        self.assertFalse(view.isStale())
+        self.assertEqual(view.pieceAt(4, 6), 'P')
+
     def test_getTurn(self):
         self.chess_board._turn = self.chess_board.WHITE
         self.assertEqual(self.chess_board.getTurn(), self.chess_board.WHITE)
@@ -275,6 +410,217 @@ class ChessBoardTest(unittest.TestCase):
         # The false if x is outside range
         self.assertEqual(self.chess_board.getValidMoves((8, 1)), False)
 
+    def _chess_move(self, fromPos, toPos, promotion=None):
+        move = ChessMove()
+        move.from_pos = fromPos
+        move.to_pos = toPos
+        move.promotion = promotion
+        return move
+
+    def test_getValidMoves_pins_and_checks(self):
+        # a pinned rook may only move along the pin
+        self.chess_board.setFEN('4k3/4r3/8/8/8/8/4R3/4K3 w - - 0 1')
+        self.assertEqual(self.chess_board.getValidMoves((4, 6)), [(4, 5), (4, 4), (4, 3), (4, 2), (4, 1)])
+        # in check a piece may only block or take the checker
+        self.chess_board.setFEN('4k3/8/8/8/8/8/1B6/r3K3 w - - 0 1')
+        self.assertEqual(self.chess_board.getValidMoves((1, 6)), [(2, 7), (0, 7)])
+
+    def test_king_locations(self):
+        self.chess_board.setFEN('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        self.chess_board.addTextMove('O-O')
+        self.chess_board.addTextMove('Kd7')
+        self.assertEqual(self.chess_board._white_king_location, (6, 7))
+        self.assertEqual(self.chess_board._black_king_location, (3, 1))
+        self.chess_board.undo()
+        self.assertEqual(self.chess_board._black_king_location, (4, 0))
+        self.chess_board.gotoFirst()
+        self.assertEqual(self.chess_board._white_king_location, (4, 7))
+
+    def test_makeMove_unmakeMove(self):
+        fen = 'r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1'
+        self.chess_board.setFEN(fen)
+        board = self.chess_board.getBoard()
+        key = self.chess_board.getPositionKey()
+        moves = [((4, 3), (3, 2)), ((4, 0), (2, 0)), ((4, 7), (6, 7)), ((7, 0), (6, 0)), ((1, 1), (1, 0))]
+        for fromPos, toPos in moves:
+            self.chess_board.makeMove(self._chess_move(fromPos, toPos, 'N'))
+        self.assertEqual(self.chess_board._board[7][5:7], ['R', 'K'])
+        self.assertEqual(self.chess_board._board[0][:4], ['.', 'N', 'k', 'r'])
+        self.assertEqual(self.chess_board._board[3][3], '.')
+        self.assertEqual(self.chess_board.getTurn(), self.chess_board.BLACK)
+        while self.chess_board.unmakeMove():
+            pass
+        self.assertEqual(self.chess_board.getBoard(), board)
+        self.assertEqual(self.chess_board.getPositionKey(), key)
+        self.assertEqual(self.chess_board.getTurn(), self.chess_board.WHITE)
+        self.assertEqual(self.chess_board._ep, [3, 3])
+        self.assertFalse(self.chess_board.unmakeMove())
+
+    def test_makeMove_then_addMove(self):
+        board = self.chess_board
+        board.addTextMove('e4')
+        fen = board.getFEN()
+        board.makeMove(moveCode((0, 1), (0, 2)))
+        self.assertRaises(RuntimeError, board.addTextMove, 'e4')
+        self.assertRaises(RuntimeError, board.addMove, (3, 6), (3, 4))
+        self.assertEqual(board.getAllTextMoves(), ['e4'])
+        board.unmakeMove()
+        self.assertTrue(board.addTextMove('e5'))
+        self.assertEqual(board.getAllTextMoves(), ['e4', 'e5'])
+        # navigation drops moves that were not taken back
+        board.makeMove(moveCode((6, 7), (5, 5)))
+        board.undo()
+        self.assertEqual(board.getFEN(), fen)
+        board.redo()
+        self.assertEqual(board.getFEN(), 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2')
+        self.assertTrue(board.addTextMove('Nf3'))
+
+    def test_generateLegalMoves(self):
+        moves = self.chess_board.generateLegalMoves()
+        self.assertEqual(len(moves), 20)
+        self.assertEqual([(m.from_pos, m.to_pos) for m in moves if m.piece == 'N'],
+                         [((1, 7), (2, 5)), ((1, 7), (0, 5)), ((6, 7), (7, 5)), ((6, 7), (5, 5))])
+        self.chess_board.setFEN('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        moves = self.chess_board.generateLegalMoves()
+        self.assertEqual(len(moves), 48)
+        specials = [m.special_move_type for m in moves]
+        self.assertEqual(specials.count(ChessMove.KING_CASTLE_MOVE), 1)
+        self.assertEqual(specials.count(ChessMove.QUEEN_CASTLE_MOVE), 1)
+
+    def test_generateLegalMoves_promotion_and_check(self):
+        self.chess_board.setFEN('4k3/1P6/8/8/8/8/8/4K3 w - - 0 1')
+        promotions = [m.promotion for m in self.chess_board.generateLegalMoves() if m.piece == 'P']
+        self.assertEqual(promotions, ['Q', 'R', 'N', 'B'])
+        # double check, only the king may move
+        self.chess_board.setFEN('4k3/8/8/8/1b6/8/4r3/R3K2R w KQ - 0 1')
+        moves = self.chess_board.generateLegalMoves()
+        self.assertEqual(set(m.piece for m in moves), set(['K']))
+        self.assertEqual(sorted(m.to_pos for m in moves), [(3, 7), (4, 6), (5, 7)])
+        # en passant that would uncover the king is not allowed
+        self.chess_board.setFEN('8/8/8/KPp4r/8/8/8/7k w - c6 0 1')
+        self.assertEqual([m.to_pos for m in self.chess_board.generateLegalMoves() if m.piece == 'P'], [(1, 2)])
+
+    def test_generation_modes(self):
+        board = self.chess_board
+        board.setFEN('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        codes = list(board.generateLegalMoveCodes())
+        captures = list(board.generateLegalMoveCodes(ChessBoard.CAPTURE_MOVES))
+        quiets = list(board.generateLegalMoveCodes(ChessBoard.QUIET_MOVES))
+        self.assertEqual(len(captures), 8)
+        self.assertEqual(captures, [c for c in codes if c in captures])
+        self.assertEqual(sorted(captures + quiets), sorted(codes))
+        self.assertEqual(list(board.iterLegalMoveCodes()), captures + quiets)
+        self.assertEqual(list(board.iterLegalMoveCodes(ChessBoard.EVASION_MOVES)), [])
+        # promotions go with the captures, en passant too
+        board.setFEN('4k3/1P6/8/3pP3/8/8/8/4K3 w - d6 0 1')
+        self.assertEqual([moveName(c) for c in board.generateLegalMoveCodes(ChessBoard.CAPTURE_MOVES)],
+                         ['b7b8q', 'b7b8r', 'b7b8n', 'b7b8b', 'e5d6'])
+        # out of check: the king, then taking the checker, then blocking
+        board.setFEN('4k3/8/8/8/8/5n2/8/R3K1N1 w - - 0 1')
+        evasions = [moveName(c) for c in board.iterLegalMoveCodes(ChessBoard.EVASION_MOVES)]
+        self.assertEqual(evasions, ['e1f1', 'e1d1', 'e1e2', 'e1f2', 'g1f3'])
+        board.setFEN('4k3/8/8/b7/8/8/7R/R3K1N1 w - - 0 1')
+        evasions = [moveName(c) for c in board.iterLegalMoveCodes(ChessBoard.EVASION_MOVES)]
+        self.assertEqual(evasions, ['e1f1', 'e1d1', 'e1e2', 'e1f2', 'a1a5', 'h2d2'])
+        self.assertRaises(ValueError, list, board.iterLegalMoveCodes(9))
+
+    def test_hasLegalMoves(self):
+        self.assertTrue(self.chess_board.hasLegalMoves())
+        self.chess_board.setFEN('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1')
+        self.assertFalse(self.chess_board.hasLegalMoves())
+        self.chess_board.resetBoard()
+        for move in ['f3', 'e5', 'g4', 'Qh4']:
+            self.chess_board.addTextMove(move)
+        self.assertTrue(self.chess_board.isGameOver())
+        self.assertFalse(self.chess_board.hasLegalMoves())
+
+    def test_isLegalMove(self):
+        board = self.chess_board
+        self.assertTrue(board.isLegalMove((4, 6), (4, 4)))
+        self.assertTrue(board.isLegalMove((6, 7), (5, 5)))
+        self.assertFalse(board.isLegalMove((4, 6), (4, 3)))
+        self.assertFalse(board.isLegalMove((5, 7), (2, 4)))
+        self.assertFalse(board.isLegalMove((4, 1), (4, 3)))
+        self.assertFalse(board.isLegalMove((4, 6), (4, 8)))
+        # pins, castling through check and en passant uncovering the king
+        board.setFEN('4k3/4r3/8/8/b7/8/4N3/R3K2R w KQ - 0 1')
+        self.assertFalse(board.isLegalMove((4, 6), (2, 5)))
+        self.assertFalse(board.isLegalMove((4, 7), (2, 7)))
+        self.assertTrue(board.isLegalMove((4, 7), (6, 7)))
+        self.assertFalse(board.isLegalMove((4, 7), (3, 7)))
+        self.assertTrue(board.isLegalMove((0, 7), (0, 4)))
+        self.assertFalse(board.isLegalMove((0, 7), (0, 3)))
+        board.setFEN('8/8/8/KPp4r/8/8/8/7k w - c6 0 1')
+        self.assertFalse(board.isLegalMove((1, 3), (2, 2)))
+        self.assertTrue(board.isLegalMove((1, 3), (1, 2)))
+        board.setFEN('4k3/8/8/1Pp5/8/8/8/4K3 w - c6 0 1')
+        self.assertTrue(board.isLegalMove((1, 3), (2, 2)))
+        self.assertFalse(board.isLegalMove((1, 3), (0, 2)))
+        # addMove goes through it and keeps its reasons
+        self.assertTrue(board.addMove((1, 3), (2, 2)))
+        self.assertEqual(board.getLastMoveType(), ChessMove.EP_CAPTURE_MOVE)
+        self.assertFalse(board.addMove((4, 0), (4, 2)))
+        self.assertEqual(board.getReason(), ChessBoard.INVALID_MOVE)
+
+    def test_getNormalizedKey(self):
+        self.chess_board.addTextMove('e4')
+        board = ChessBoard()
+        board.setFEN(self.chess_board.getFEN())
+        self.assertNotEqual(board.getPositionKey(), self.chess_board.getPositionKey())
+        self.assertEqual(board.getNormalizedKey(), self.chess_board.getNormalizedKey())
+        # a pawn that can take keeps the en passant file in the key
+        for move in ['a6', 'e5', 'd5']:
+            self.chess_board.addTextMove(move)
+        self.assertEqual(self.chess_board.getNormalizedKey(), self.chess_board.getPositionKey())
+        board.setFEN(self.chess_board.getFEN())
+        self.assertEqual(board.getNormalizedKey(), self.chess_board.getNormalizedKey())
+
+    def test_move_codes(self):
+        self.chess_board.setFEN('4k3/1P6/8/8/8/8/8/4K2R w K - 0 1')
+        codes = self.chess_board.generateLegalMoveCodes()
+        moves = self.chess_board.generateLegalMoves()
+        self.assertEqual(codes.typecode, 'H')
+        self.assertEqual(list(codes), [m.getCode() for m in moves])
+        promotion = ChessMove.fromCode(moveCode((1, 1), (1, 0), ChessMove.PROMOTION_MOVE, 'n'), ChessBoard.BLACK)
+        self.assertEqual((promotion.from_pos, promotion.to_pos), ((1, 1), (1, 0)))
+        self.assertEqual((promotion.special_move_type, promotion.promotion), (ChessMove.PROMOTION_MOVE, 'n'))
+        castle = ChessMove.fromCode(moveCode((4, 7), (6, 7), ChessMove.KING_CASTLE_MOVE))
+        self.assertEqual(castle.special_move_type, ChessMove.KING_CASTLE_MOVE)
+        self.chess_board.makeMove(castle.getCode())
+        self.assertEqual(self.chess_board._board[7][5], 'R')
+        self.assertRaises(AttributeError, setattr, castle, 'spare', 1)
+
+    def test_getAllTextMoves_disambiguation(self):
+        for m in ['Nf3', 'd5', 'd3', 'e5', 'Nbd2', 'Nc6', 'Nb3', 'Nge7', 'Nbd4', 'exd4', 'Nxd4']:
+            self.assertTrue(self.chess_board.addTextMove(m))
+        self.assertEqual(self.chess_board.getAllTextMoves()[4::2], ['Nbd2', 'Nb3', 'Nbd4', 'Nxd4'])
+        self.assertEqual(self.chess_board.getAllTextMoves()[7], 'Nge7')
+        self.assertEqual(self.chess_board.getAllTextMoves(2)[-1], 'Nf3xd4')
+        self.chess_board.gotoMove(4)
+        self.assertEqual(self.chess_board.getLastTextMove(), 'e5')
+        self.assertEqual(len(self.chess_board.getAllTextMoves()), 11)
+        # the texts are cached per move
+        self.assertEqual(self.chess_board._state_stack.text(5, ChessBoard.SAN), 'Nbd2')
+
+    def test_addTextMove_text_index(self):
+        self.chess_board.setFEN('4k3/1P6/8/8/8/8/8/1N2K2R w K - 0 1')
+        index = self.chess_board._text_index()
+        self.assertEqual(index['Nd2'], ((1, 7), (3, 6), 0))
+        self.assertEqual(index['b8=N'], ((1, 1), (1, 0), 3))
+        self.assertEqual(index['O-O'], ((4, 7), (6, 7), 0))
+        self.assertEqual(index['Nb1-c3'], ((1, 7), (2, 5), 0))
+        self.assertEqual(index['b1c3'], ((1, 7), (2, 5), 0))
+        self.assertTrue(self.chess_board.addTextMove('b8=R+'))
+        self.assertEqual(self.chess_board.getPromotion(), 2)
+        self.assertEqual(self.chess_board._board[0][1], 'R')
+        # ambiguous and unusual texts still go through the parser
+        self.chess_board.setFEN('4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1')
+        self.assertFalse('Nd2' in self.chess_board._text_index())
+        self.assertFalse(self.chess_board.addTextMove('Nd2'))
+        self.assertEqual(self.chess_board.getReason(), ChessBoard.AMBIGUOUS_MOVE)
+        self.assertTrue(self.chess_board.addTextMove('Nfxd2'))
+        self.assertEqual(self.chess_board.getLastMove(), ((5, 7), (3, 6)))
+
     def test_getReason(self):
         # testing 3 of the 7 possible reasons
         self.chess_board.addTextMove('i9')
@@ -0,0 +1,81 @@
+import unittest
+import sys
+
+sys.path.append(".")
+from ChessBoard import ChessBoard, ChessMove
+from GameHistory import BYTES_PER_PLY, KEYFRAME_INTERVAL, GameHistory, packMove, unpackMove
+
+# 60 halfmoves, long enough to cross a few keyframes
+GAME = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O', 'Be7', 'Re1', 'b5', 'Bb3', 'd6', 'c3', 'O-O',
+        'h3', 'Nb8', 'd4', 'Nbd7', 'c4', 'c6', 'cxb5', 'axb5', 'Nc3', 'Bb7', 'Bg5', 'b4', 'Nb1', 'h6', 'Bh4', 'c5',
+        'dxe5', 'Nxe4', 'Bxe7', 'Qxe7', 'exd6', 'Qf6', 'Nbd2', 'Nxd6', 'Nc4', 'Nxc4', 'Bxc4', 'Nb6', 'Ne5', 'Rae8',
+        'Bxf7+', 'Rxf7', 'Nxf7', 'Rxe1+', 'Qxe1', 'Kxf7', 'Qe3', 'Qg5', 'Qxg5', 'hxg5', 'b3', 'Ke6', 'a3', 'Kd6']
+
+
+class GameHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+
+    def test_packMove_round_trip(self):
+        move = ChessMove()
+        move.piece = 'P'
+        move.from_pos = (3, 1)
+        move.to_pos = (2, 0)
+        move.take = True
+        move.promotion = 'n'
+        move.check = '#'
+        move.special_move_type = ChessMove.PROMOTION_MOVE
+        word = packMove(move, ChessBoard.BLACK, ChessBoard.BLACK_WIN)
+        self.assertEqual(unpackMove(word), ('P', (3, 1), (2, 0), True, 'n', '#', ChessMove.PROMOTION_MOVE, 1))
+
+    def test_frame_round_trip(self):
+        history = GameHistory()
+        board = self.chess_board.getBoard()
+        history.append(12345, 0, board, 1, (1, 0, 0, 1), [4, 3], 17)
+        self.assertEqual(history.frame(0), (0, board, 1, (1, 0, 0, 1), [4, 3], 17))
+        self.assertEqual(history.key(0), 12345)
+
+    def test_gotoMove_across_keyframes(self):
+        fens = [self.chess_board.getFEN()]
+        for m in GAME:
+            self.assertTrue(self.chess_board.addTextMove(m))
+            fens.append(self.chess_board.getFEN())
+        self.assertTrue(len(GAME) > 3 * KEYFRAME_INTERVAL)
+        for k in (0, 1, KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 1, len(GAME) - 1, len(GAME)):
+            self.chess_board.gotoMove(k)
+            self.assertEqual(self.chess_board.getFEN(), fens[k])
+        self.chess_board.gotoFirst()
+        for k in range(1, len(GAME) + 1):
+            self.chess_board.redo()
+            self.assertEqual(self.chess_board.getFEN(), fens[k])
+
+    def test_truncate_after_undo(self):
+        for m in GAME[:KEYFRAME_INTERVAL + 2]:
+            self.chess_board.addTextMove(m)
+        self.chess_board.gotoMove(KEYFRAME_INTERVAL - 2)
+        self.assertTrue(self.chess_board.addTextMove('a4'))
+        self.assertTrue(self.chess_board.addTextMove('O-O'))
+        self.assertEqual(self.chess_board.getMoveCount(), KEYFRAME_INTERVAL)
+        self.assertEqual(self.chess_board.getAllTextMoves()[-2:], ['a4', 'O-O'])
+        self.chess_board.undo()
+        self.assertEqual(self.chess_board.getLastMove(), ((0, 6), (0, 4)))
+        self.chess_board.redo()
+        self.assertEqual(self.chess_board.getLastMove(), ((4, 0), (6, 0)))
+        self.assertEqual(self.chess_board._board[0][5], 'r')
+
+    def test_bytes_per_ply(self):
+        for m in GAME:
+            self.chess_board.addTextMove(m)
+        history = self.chess_board._state_stack
+        plies = len(history)
+        self.assertEqual(plies, len(GAME) + 1)
+        self.assertTrue(float(history.nbytes()) / plies <= BYTES_PER_PLY + 1)
+        self.assertEqual(history.nbytes(), history.recordBytes())
+        self.assertTrue(BYTES_PER_PLY < 16)
+        # cached move texts are counted once they are made
+        self.chess_board.getAllTextMoves()
+        self.assertTrue(history.nbytes() > history.recordBytes() + 50 * (plies - 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import sys
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from MoveCache import ENTRY_OVERHEAD, MoveCache
+
+
+class MoveCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+        self.cache = MoveCache()
+        self.chess_board.setMoveCache(self.cache)
+
+    def test_hits_and_misses(self):
+        moves = self.chess_board.getValidMoves((6, 7))
+        self.assertEqual(moves, [(7, 5), (5, 5)])
+        moves.append((0, 0))
+        self.assertEqual(self.chess_board.getValidMoves((6, 7)), [(7, 5), (5, 5)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.hitRate(), 0.5)
+
+    def test_invalidated_by_moves_and_navigation(self):
+        self.assertEqual(self.chess_board.getValidMoves((5, 7)), [])
+        self.chess_board.addTextMove('e4')
+        self.chess_board.addTextMove('e5')
+        self.assertEqual(self.chess_board.getValidMoves((5, 7)), [(4, 6), (3, 5), (2, 4), (1, 3), (0, 2)])
+        self.chess_board.gotoFirst()
+        self.assertEqual(self.chess_board.getValidMoves((5, 7)), [])
+        self.chess_board.gotoLast()
+        self.assertEqual(self.chess_board.getValidMoves((5, 7)), [(4, 6), (3, 5), (2, 4), (1, 3), (0, 2)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+        self.chess_board.setFEN('4k3/8/8/8/8/8/8/4KB2 w - - 0 1')
+        self.assertEqual(self.chess_board.getValidMoves((5, 7)), [(6, 6), (7, 5), (4, 6), (3, 5), (2, 4), (1, 3),
+                                                                   (0, 2)])
+
+    def test_shared_between_boards(self):
+        other = ChessBoard()
+        other.setMoveCache(self.cache)
+        self.chess_board.addTextMove('Nf3')
+        other.addTextMove('Nf3')
+        self.assertEqual(other.getValidMoves((6, 0)), self.chess_board.getValidMoves((6, 0)))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_entry_bound(self):
+        cache = MoveCache(maxEntries=2)
+        cache.put(1, ())
+        cache.put(2, ())
+        cache.get(1)
+        cache.put(3, ())
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(2), None)
+        self.assertEqual(cache.get(1), ())
+        self.assertEqual(cache.evictions, 1)
+
+    def test_byte_bound(self):
+        cache = MoveCache(maxEntries=None, maxBytes=3 * (ENTRY_OVERHEAD + sys.getsizeof(((0, 0),))))
+        for i in range(10):
+            cache.put(i, ((0, 0),))
+        self.assertEqual(len(cache), 3)
+        self.assertTrue(cache.nbytes <= cache.maxBytes)
+        self.assertEqual(cache.get(9), ((0, 0),))
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes, cache.hits), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
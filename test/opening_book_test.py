@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from OpeningBook import MAGIC, RECORD, BookReader, buildBook, gameResult
+
+JOBS = [("a", None, "1. e4 e5 2. Nf3 Nc6 1-0"),
+        ("b", None, "1. e4 c5 2. Nf3 d6 0-1"),
+        ("c", None, "1. d4 d5 2. c4 e6 1/2-1/2"),
+        ("d", None, "1. e4 e5 2. Bc4 Nf6 1-0"),
+        ("e", None, "1. e4 e5 *")]
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "book.bin")
+        self.chess_board = ChessBoard()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_gameResult(self):
+        self.assertEqual(gameResult("1. e4 e5 1/2-1/2"), "1/2-1/2")
+        self.assertEqual(gameResult("1. e4 e5 *"), None)
+        self.assertEqual(gameResult(""), None)
+
+    def test_build_and_probe(self):
+        self.assertEqual(buildBook(JOBS, self.path, plies=3), (4, 9))
+        self.assertEqual(os.path.getsize(self.path), len(MAGIC) + 9 * RECORD.size)
+        reader = BookReader(self.path)
+        try:
+            moves = reader.moves(self.chess_board)
+            self.assertEqual([m.code for m in moves], [self._code('e4'), self._code('d4')])
+            self.assertEqual((moves[0].wins, moves[0].draws, moves[0].losses), (2, 0, 1))
+            self.assertEqual(moves[1].score(), 0.5)
+
+            self.chess_board.addTextMove('e4')
+            moves = reader.moves(self.chess_board)
+            self.assertEqual([(m.code, m.wins, m.losses) for m in moves],
+                             [(self._code('e5'), 0, 2), (self._code('c5'), 1, 0)])
+            self.assertEqual(reader.bestMove(self.chess_board.getNormalizedKey()), self._code('e5'))
+
+            self.chess_board.addTextMove('e5')
+            self.assertEqual(sorted(m.code for m in reader.moves(self.chess_board)),
+                             sorted([self._code('Nf3'), self._code('Bc4')]))
+            self.chess_board.addTextMove('Nf3')
+            # only the first three plies are in the book
+            self.assertEqual(reader.moves(self.chess_board), [])
+            self.assertEqual(reader.bestMove(self.chess_board), None)
+        finally:
+            reader.close()
+
+    def test_probe_from_fen(self):
+        # positions after a double push are found again when loaded from their FEN
+        buildBook(JOBS, self.path, plies=3)
+        reader = BookReader(self.path)
+        try:
+            for move in ['e4', 'e5']:
+                self.chess_board.addTextMove(move)
+                moves = [m.code for m in reader.moves(self.chess_board)]
+                self.assertTrue(moves)
+                board = ChessBoard()
+                board.setFEN(self.chess_board.getFEN())
+                self.assertEqual([m.code for m in reader.moves(board)], moves)
+                self.assertEqual(board.getNormalizedKey(), self.chess_board.getNormalizedKey())
+        finally:
+            reader.close()
+
+    def test_minGames(self):
+        self.assertEqual(buildBook(JOBS, self.path, plies=4, minGames=2), (4, 2))
+        reader = BookReader(self.path)
+        self.assertEqual(reader.records, 2)
+        reader.close()
+
+    def test_bad_fen(self):
+        errors = []
+        jobs = [("x", "8/8/8/8/8/8/8/8 w - - 0 1", "1. e4 1-0")] + JOBS[:1]
+        self.assertEqual(buildBook(jobs, self.path, plies=1, errors=errors), (1, 1))
+        self.assertEqual([gameId for gameId, reason in errors], ["x"])
+
+    def test_invalid_file(self):
+        f = open(self.path, "wb")
+        f.write("not a book at all")
+        f.close()
+        self.assertRaises(ValueError, BookReader, self.path)
+
+    def _code(self, move):
+        # the code of a text move in the current position
+        self.chess_board.addTextMove(move)
+        code = self.chess_board.getLastMoveCode()
+        self.chess_board.undo()
+        return code
+
+
+if __name__ == '__main__':
+    unittest.main()
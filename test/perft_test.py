@@ -0,0 +1,41 @@
+import unittest
+import sys
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from Perft import SUITE, divide, perft, runSuite
+
+
+class PerftTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+
+    def test_suite_shallow(self):
+        self.assertEqual(runSuite(maxDepth=2), [])
+
+    def test_suite_small_trees(self):
+        self.assertEqual(runSuite(maxDepth=4, maxNodes=15000), [])
+
+    def test_perft_start(self):
+        self.assertEqual(perft(self.chess_board, 3), 8902)
+        # the board is left as it was
+        self.assertEqual(self.chess_board.getFEN(), 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+
+    def test_divide(self):
+        self.chess_board.setFEN(SUITE[1][1])
+        result = dict(divide(self.chess_board, 2))
+        self.assertEqual(len(result), 48)
+        self.assertEqual(sum(result.values()), 2039)
+        self.assertEqual(result['e1g1'], 43)
+        self.assertEqual(result['d5e6'], 46)
+
+    def test_hash_gives_same_count(self):
+        self.chess_board.setFEN(SUITE[2][1])
+        cache = {}
+        self.assertEqual(perft(self.chess_board, 4, cache), 43238)
+        self.assertTrue(len(cache) > 0)
+        self.assertEqual(perft(self.chess_board, 4, cache), 43238)
+
+
+if __name__ == '__main__':
+    unittest.main()
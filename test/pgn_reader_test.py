@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import gzip
+import tempfile
+from StringIO import StringIO
+
+sys.path.append(".")
+from PGNReader import PGNReader, tokenize
+
+PGN = """[Event "Test \\"one\\""]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 {best by test
+[not a tag] } e5 2. Nf3 $1 (2. f4 exf4) Nc6 3. Bb5!? a6 ; Ruy Lopez
+4. Ba4 1-0
+
+[Event "Two"]
+[FEN "4k3/8/8/8/8/8/8/4K2R w K - 0 1"]
+[Result "*"]
+
+1. 0-0 Kd7 2. Rf7+ Kd6 3. Rf9 *
+"""
+
+
+class PGNReaderTest(unittest.TestCase):
+    def test_headers(self):
+        games = list(PGNReader(StringIO(PGN)))
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0].headers.keys(), ['Event', 'White', 'Black', 'Result'])
+        self.assertEqual(games[0].headers['Event'], 'Test "one"')
+        self.assertEqual(games[1].headers['Result'], '*')
+        self.assertEqual(games[0].line, 1)
+        self.assertEqual(games[1].line, 10)
+
+    def test_game_without_moves(self):
+        games = list(PGNReader(StringIO('[Event "a"]\n\n[Event "b"]\n\n1. e4 e5 *\n')))
+        self.assertEqual([g.headers["Event"] for g in games], ["a", "b"])
+        self.assertEqual([g.moves() for g in games], [[], ["e4", "e5"]])
+        self.assertEqual([g.line for g in games], [1, 3])
+
+    def test_tokenize(self):
+        game = list(PGNReader(StringIO(PGN)))[0]
+        self.assertEqual(game.moves(), ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'])
+        tokens = list(tokenize(game.movetext, comments=True, variations=True))
+        self.assertEqual(tokens[1], '{best by test\n[not a tag] }')
+        self.assertEqual(tokens[4:8], ['(', 'f4', 'exf4', ')'])
+        self.assertEqual(tokens[-2], '; Ruy Lopez')
+
+    def test_replay(self):
+        games = list(PGNReader(StringIO(PGN)))
+        board = games[0].replay()
+        self.assertEqual(games[0].error, None)
+        self.assertEqual(board.getAllTextMoves(), ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4'])
+
+        board = games[1].replay(board)
+        self.assertEqual(games[1].error, (4, board.INVALID_MOVE))
+        self.assertEqual(board.getAllTextMoves(), ['O-O', 'Kd7', 'Rf7+', 'Kd6'])
+
+    def test_gzip(self):
+        fd, path = tempfile.mkstemp(suffix=".pgn.gz")
+        os.close(fd)
+        try:
+            f = gzip.open(path, "wb")
+            f.write(PGN)
+            f.close()
+            games = [g.headers['Event'] for g in PGNReader(path)]
+            self.assertEqual(games, ['Test "one"', 'Two'])
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+import PlaneEncoder
+from PlaneEncoder import CASTLING_PLANES, EP_PLANE, FIFTY_PLANE, PIECE_PLANES, PLANES, TURN_PLANE, \
+    encodeBoard, exportGames
+
+
+@unittest.skipIf(PlaneEncoder.numpy is None, "numpy is not installed")
+class PlaneEncoderTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_encodeBoard(self):
+        planes = encodeBoard(self.chess_board)
+        self.assertEqual(planes.shape, (PLANES, 8, 8))
+        self.assertEqual(planes[PIECE_PLANES.index('K')][7][4], 1)
+        self.assertEqual(planes[PIECE_PLANES.index('p')].sum(), 8)
+        self.assertEqual(planes[:12].sum(), 32)
+        self.assertEqual(planes[TURN_PLANE].sum(), 64)
+        self.assertEqual(planes[CASTLING_PLANES:CASTLING_PLANES + 4].sum(), 4 * 64)
+        self.assertEqual(planes[EP_PLANE].sum(), 0)
+
+        self.chess_board.setFEN('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w Kq f6 3 1')
+        planes = encodeBoard(self.chess_board)
+        self.assertEqual(planes[EP_PLANE][2][5], 1)
+        self.assertEqual(planes[EP_PLANE].sum(), 1)
+        self.assertEqual(list(planes[CASTLING_PLANES:CASTLING_PLANES + 4, 0, 0]), [1, 0, 0, 1])
+        self.assertEqual(planes[FIFTY_PLANE][3][3], 3)
+
+        self.chess_board.setFEN('4k3/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(encodeBoard(self.chess_board)[TURN_PLANE].sum(), 0)
+
+    def test_exportGames(self):
+        jobs = [("a", None, "e4 e5 Nf3"), ("b", "4k3/8/8/8/8/8/8/4K2R w K - 0 1", "O-O Kd7 Kh9")]
+        games, positions = exportGames(jobs, self.dir, shardSize=3, chunkSize=2)
+        self.assertEqual((games, positions), (2, 7))
+        names = sorted(os.listdir(self.dir))
+        self.assertEqual(names, ['games.txt', 'index-00000.npy', 'index-00001.npy', 'index-00002.npy',
+                                 'planes-00000.npy', 'planes-00001.npy', 'planes-00002.npy'])
+        planes = PlaneEncoder.numpy.load(os.path.join(self.dir, 'planes-00002.npy'), mmap_mode='r')
+        index = PlaneEncoder.numpy.load(os.path.join(self.dir, 'index-00002.npy'))
+        self.assertEqual(planes.shape, (1, PLANES, 8, 8))
+        self.assertEqual(index.tolist(), [(1, 2)])
+        self.assertEqual(planes[0][PIECE_PLANES.index('k')][1][3], 1)
+        index = PlaneEncoder.numpy.load(os.path.join(self.dir, 'index-00001.npy'))
+        self.assertEqual(index.tolist(), [(0, 3), (1, 0), (1, 1)])
+        self.assertEqual(open(os.path.join(self.dir, 'games.txt')).read(), "a\nb\n")
+
+    def test_exportGames_bad_fen(self):
+        errors = []
+        jobs = [("x", "4k3/8/8/8/8/8/8/8 w - - 0 1", "Kd7"), ("a", None, "e4 e5")]
+        self.assertEqual(exportGames(jobs, self.dir, errors=errors), (1, 3))
+        self.assertEqual([gameId for gameId, reason in errors], ["x"])
+        self.assertEqual(open(os.path.join(self.dir, 'games.txt')).read(), "a\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(".")
+from PositionIndex import PositionIndex, positionHash
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+JOBS = [("a", None, "1. e4 e5 2. Nf3 Nc6"),
+        ("b", None, "1. Nf3 Nc6 2. e4 e5 3. Ng1 Nb8 4. Nf3 Nc6"),
+        ("c", None, "1. d4 d5 2. Kd9")]
+
+
+class PositionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "index.db")
+        self.index = PositionIndex(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir)
+
+    def test_positionHash(self):
+        self.assertEqual(positionHash(START), positionHash(START.replace(' 0 1', ' 7 30')))
+        self.assertNotEqual(positionHash(START), positionHash(START.replace(' w ', ' b ')))
+
+    def test_findGames(self):
+        self.assertEqual(self.index.addGames(JOBS, batchSize=2), (3, 17))
+        self.assertEqual(len(self.index), 3)
+        fen = 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3'
+        # transpositions and repetitions are all found
+        self.assertEqual(self.index.findGames(fen), [("a", 4), ("b", 4), ("b", 8)])
+        self.assertEqual(self.index.findGames(fen, limit=1), [("a", 4)])
+        # the illegal move ends the game
+        self.assertEqual(self.index.findGames('rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq d6 0 2'),
+                         [("c", 2)])
+        # an en passant square no pawn can take on is the same position as none
+        self.assertEqual(self.index.findGames('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'),
+                         [("a", 1)])
+        self.assertEqual(self.index.findGames('4k3/8/8/8/8/8/8/4K3 w - - 0 1'), [])
+
+    def test_incremental(self):
+        self.assertEqual(self.index.addGames(JOBS[:1]), (1, 5))
+        self.index.close()
+        self.index = PositionIndex(self.path)
+        self.assertEqual(self.index.addGames(JOBS + JOBS), (2, 12))
+        self.assertEqual(len(self.index.findGames(START)), 3)
+
+    def test_bad_fen(self):
+        errors = []
+        jobs = [("x", "8/8/8/8/8/8/8/8 w - - 0 1", "1. e4 *")] + JOBS[:1]
+        self.assertEqual(self.index.addGames(jobs, errors=errors), (1, 5))
+        self.assertEqual([gameId for gameId, reason in errors], ["x"])
+        self.assertFalse(self.index.hasGame("x"))
+        self.assertTrue(self.index.hasGame("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
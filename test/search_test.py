@@ -0,0 +1,78 @@
+import unittest
+import sys
+import time
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from Perft import moveName
+from Search import EXACT, LOWER, MATE, TranspositionTable, evaluate, search
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.chess_board = ChessBoard()
+
+    def test_evaluate_is_symmetric(self):
+        self.assertEqual(evaluate(self.chess_board), 0)
+        self.chess_board.setFEN('4k3/8/8/8/8/8/8/3QK3 w - - 0 1')
+        white = evaluate(self.chess_board)
+        self.chess_board.setFEN('3qk3/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(evaluate(self.chess_board), white)
+        self.assertTrue(white > 800)
+
+    def test_mate_in_one(self):
+        self.chess_board.setFEN('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        result = search(self.chess_board, 3)
+        self.assertEqual(moveName(result.move), 'a1a8')
+        self.assertEqual(result.score, MATE - 1)
+        self.assertEqual(result.mateIn(), 1)
+
+    def test_mate_in_two(self):
+        self.chess_board.setFEN('k7/8/2K5/8/8/8/8/6R1 w - - 0 1')
+        result = search(self.chess_board, 4)
+        self.assertEqual(result.mateIn(), 3)
+        self.assertEqual(len(result.pv), 3)
+
+    def test_takes_hanging_piece(self):
+        fen = '4k3/8/8/3q4/8/8/3R4/3RK3 w - - 0 1'
+        self.chess_board.setFEN(fen)
+        result = search(self.chess_board, 2)
+        self.assertEqual(moveName(result.move), 'd2d5')
+        self.assertTrue(result.score > 500)
+        self.assertEqual(self.chess_board.getFEN(), fen)
+
+    def test_no_legal_moves(self):
+        self.chess_board.setFEN('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1')
+        result = search(self.chess_board)
+        self.assertEqual(result.move, None)
+        self.assertEqual(result.score, -MATE)
+
+    def test_budgets(self):
+        fen = self.chess_board.getFEN()
+        result = search(self.chess_board, maxNodes=500)
+        self.assertTrue(result.depth >= 1)
+        self.assertTrue(result.move in self.chess_board.generateLegalMoveCodes())
+        self.assertEqual(self.chess_board.getFEN(), fen)
+
+        start = time.time()
+        result = search(self.chess_board, moveTime=200)
+        self.assertTrue(time.time() - start < 1.0)
+        self.assertEqual(result.pv[0], result.move)
+        self.assertEqual(self.chess_board.getFEN(), fen)
+
+    def test_transposition_table(self):
+        table = TranspositionTable(1000)
+        self.assertEqual(table.size, 512)
+        table.store(513, 3, 10, EXACT, 7)
+        self.assertEqual(table.probe(513), (3, 10, EXACT, 7))
+        self.assertEqual(table.probe(1), None)
+        # a shallower entry for another position does not replace it in the same search
+        table.store(1, 1, 20, LOWER, 8)
+        self.assertEqual(table.probe(1), None)
+        table.newSearch()
+        table.store(1, 1, 20, LOWER, 8)
+        self.assertEqual(table.probe(1), (1, 20, LOWER, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+import Tablebase
+from Tablebase import Tablebase as Tables, generate, signatureOf, WIN, DRAW, LOSS, MAX_PLIES
+
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.legal = generate("KQvK", cls.directory)
+        cls.tables = Tables(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tables.close()
+        shutil.rmtree(cls.directory)
+
+    def probe(self, fen):
+        board = ChessBoard()
+        board.setFEN(fen)
+        return self.tables.probe(board)
+
+    def test_layout(self):
+        layout = Tablebase._Layout("KQvK")
+        self.assertEqual(layout.size, 2 * 10 * 64 * 64)
+        self.assertEqual(layout.placement(layout.index(1, [59, 4, 20])), (1, [59, 4, 20]))
+        # the white king on h8 is turned into the triangle
+        turn, squares = layout.placement(layout.index(0, [7, 20, 30]))
+        self.assertTrue(squares[0] in Tablebase.KING_SQUARES)
+        self.assertEqual(len(Tablebase._Layout("KPvK").kingSquares), 32)
+
+    def test_signature(self):
+        self.assertEqual(signatureOf("k" + "." * 62 + "K"), ("KvK", False))
+        self.assertEqual(signatureOf("kq" + "." * 61 + "K"), ("KQvK", True))
+        self.assertEqual(signatureOf("kp" + "." * 60 + "RK"), ("KRvKP", False))
+
+    def test_probe(self):
+        self.assertEqual(self.probe('k7/7Q/1K6/8/8/8/8/8 w - - 0 1'), (WIN, 1))
+        self.assertEqual(self.probe('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1'), (LOSS, 0))
+        self.assertEqual(self.probe('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1'), (DRAW, 0))
+        # the queen is lost
+        self.assertEqual(self.probe('8/8/8/8/8/8/1k6/Q6K b - - 0 1'), (DRAW, 0))
+        # a king and queen mate in at most ten moves
+        data = open(self.tables.path("KQvK"), "rb").read()[len(Tablebase.MAGIC):]
+        self.assertEqual(max(ord(v) for v in data if ord(v) != Tablebase.ILLEGAL_VALUE), 21)
+        self.assertEqual(sum(ord(v) != Tablebase.ILLEGAL_VALUE for v in data), self.legal)
+
+    def test_max_plies(self):
+        self.assertTrue(MAX_PLIES + 1 < Tablebase.ILLEGAL_VALUE)
+        self.assertEqual(Tablebase._decode(MAX_PLIES + 1), (WIN, MAX_PLIES))
+        # a position lost in MAX_PLIES - 1 plies makes its parent a win at the longest distance
+        generator = Tablebase._Generator(Tablebase._Layout("KQvK"), self.tables, None)
+        known = bytearray(1)
+        counts = [1]
+        values = bytearray([Tablebase.ILLEGAL_VALUE])
+        resolved = [[] for d in range(MAX_PLIES + 2)]
+        generator._event(0, 0, MAX_PLIES - 1, known, counts, values, resolved)
+        self.assertEqual(values[0], MAX_PLIES + 1)
+        self.assertEqual(resolved[MAX_PLIES], [0])
+        # one ply further does not fit
+        known[0] = 0
+        self.assertRaises(ValueError, generator._event, 0, 1, MAX_PLIES, known, counts, values, resolved)
+        self.assertEqual(values[0], MAX_PLIES + 1)
+
+    def test_symmetry(self):
+        white = self.probe('8/8/8/3k4/8/8/2Q5/1K6 w - - 0 1')
+        self.assertEqual(white[0], WIN)
+        self.assertEqual(self.probe('6K1/5Q2/8/8/4k3/8/8/8 w - - 0 1'), white)
+        self.assertEqual(self.probe('1k6/2q5/8/8/3K4/8/8/8 b - - 0 1'), white)
+
+    def test_consistent(self):
+        # a position is worth the best of the positions its moves lead to
+        board = ChessBoard()
+        layout = Tablebase._Layout("KQvK")
+        rng = random.Random(1)
+        checked = 0
+        while checked < 200:
+            turn, squares = layout.placement(rng.randrange(layout.size))
+            if not layout.isLegal(squares):
+                continue
+            board.setFEN(layout.fen(turn, squares))
+            found = self.tables.probe(board)
+            if found is None:
+                continue
+            checked += 1
+            after = []
+            for code in board.generateLegalMoveCodes():
+                board.makeMove(code)
+                after.append(self.tables.probe(board))
+                board.unmakeMove()
+            if not after:
+                expected = (LOSS, 0) if board.isCheck() else (DRAW, 0)
+            elif any(result == LOSS for result, plies in after):
+                expected = (WIN, min(plies for result, plies in after if result == LOSS) + 1)
+            elif all(result == WIN for result, plies in after):
+                expected = (LOSS, max(plies for result, plies in after) + 1)
+            else:
+                expected = (DRAW, 0)
+            self.assertEqual(found, expected)
+
+    def test_not_covered(self):
+        board = ChessBoard()
+        self.assertEqual(self.tables.probe(board), None)
+        self.assertEqual(self.probe('4k3/8/8/8/8/8/8/R3K3 w Q - 0 1'), None)
+        # the side not to move is in check
+        self.assertEqual(self.probe('4k3/8/8/8/8/8/8/4QK2 w - - 0 1'), None)
+
+    def test_bad_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            f = open(os.path.join(directory, "KRvK.tb"), "wb")
+            f.write("not a table")
+            f.close()
+            board = ChessBoard()
+            board.setFEN('4k3/8/8/8/8/8/8/R3K3 w - - 0 1')
+            tables = Tables(directory)
+            self.assertRaises(ValueError, tables.probe, board)
+            tables.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
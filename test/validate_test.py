@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(".")
+from ChessBoard import ChessBoard
+from Validate import ILLEGAL, VALID, findFiles, readJobs, validate
+
+PGN = """[Event "mate"]
+
+1. f3 e5 2. g4 Qh4# 0-1
+
+[Event "illegal"]
+
+1. e4 e5 2. Ke3 *
+
+[Event "from a position"]
+[FEN "4k3/8/8/8/8/8/8/4K2R w K - 0 1"]
+
+1. O-O Kd7 *
+"""
+
+
+class ValidateTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        f = open(os.path.join(self.dir, "games.pgn"), "w")
+        f.write(PGN)
+        f.close()
+        shutil.copy("moves.txt", self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_results(self):
+        files = findFiles(self.dir)
+        self.assertEqual([os.path.basename(f) for f in files], ["games.pgn", "moves.txt"])
+        results = list(validate(readJobs(files), processes=1))
+        self.assertEqual([r[1:] for r in results], [
+            (VALID, None, 0, ChessBoard.BLACK_WIN, 4),
+            (ILLEGAL, 2, ChessBoard.INVALID_MOVE, ChessBoard.NO_RESULT, 2),
+            (VALID, None, 0, ChessBoard.NO_RESULT, 2),
+            (ILLEGAL, 21, ChessBoard.INVALID_MOVE, ChessBoard.NO_RESULT, 21)])
+        self.assertEqual(results[1][0], os.path.join(self.dir, "games.pgn") + ":5")
+
+    def test_pool(self):
+        jobs = list(readJobs(findFiles(self.dir)))
+        expected = list(validate(jobs, processes=1))
+        self.assertEqual(list(validate(jobs, processes=2, chunkSize=1)), expected)
+        unordered = list(validate(jobs, processes=2, chunkSize=1, ordered=False))
+        self.assertEqual(sorted(unordered), sorted(expected))
+
+    def test_failed_chunk(self):
+        # a chunk that can not be sent to a worker raises instead of being waited for forever
+        jobs = [("a", None, "e4 e5"), ("b", None, lambda: "e4")]
+        for ordered in (True, False):
+            self.assertRaises(Exception, list, validate(jobs, processes=2, chunkSize=1, ordered=ordered))
+
+    def test_checkpoint(self):
+        checkpoint = os.path.join(self.dir, "done.txt")
+        jobs = list(readJobs(findFiles(self.dir)))
+        results = validate(jobs, processes=1, chunkSize=2, checkpoint=checkpoint)
+        first = [results.next() for i in range(3)]
+        results.close()
+        # the third game was taken but its chunk was not finished, so it comes again
+        rest = list(validate(jobs, processes=1, chunkSize=2, checkpoint=checkpoint))
+        self.assertEqual([r[0] for r in first[:2] + rest], [j[0] for j in jobs])
+        self.assertEqual(list(validate(jobs, processes=1, checkpoint=checkpoint)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()